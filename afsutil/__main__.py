@@ -137,6 +137,8 @@ def package(**args):
     argument('--realm', help='realm name'),
     argument('--csdb', help='path to CellServDB.dist file for client'),
     argument('--force', help='overwrite existing files', action='store_true'),
+    argument('--cache-profile', help='cache manager tuning profile',
+                                choices=['auto', 'small', 'large', 'hpc', 'none'], default='auto'),
     argument('-o', '--options', help="command line args: <name>=<value>",
                                 action='append', nargs='+', default=[]),
     argument('--pre', help='pre-install command', dest='pre_install'),
@@ -156,6 +158,7 @@ def install(**args):
                              choices=['client', 'server'],
                              default=['client', 'server']),
     argument('--purge', help='remove config and data too', action='store_true'),
+    argument('--workers', help='number of threads to purge files', type=int, default=8),
     argument('--pre', help='pre-remove command', dest='pre_remove'),
     argument('--post', help='post-remove command', dest='post_remove'),
     requires_root=True,
@@ -247,7 +250,11 @@ def ktlogin(**args):
     argument('--admin', help="admin username", default='admin'),
     argument('--db', help="cell database hosts", nargs='+', default=[]),
     argument('--fs', help="cell fileserver hosts", nargs='+', default=[]),
-    argument('-o', '--options', help="command line args: <[hostname:]name>=<value>",
+    argument('--workers', help="maximum number of hosts to setup concurrently", type=int, default=8),
+    argument('--journal', help="progress journal, to resume a failed setup",
+                          default='/var/tmp/afsutil-newcell.journal'),
+    argument('--fresh', help="ignore the progress journal of a previous run", action='store_true'),
+    argument('-o', '--options', help="command line args: <[hostname.]name>=<value>",
                                 nargs='+', action='append', default=[]),
     argument('-p', '--paths', help="command paths: <cmd>=<path-to-cmd>",
                                 nargs='+', action='append', default=[]),
@@ -264,8 +271,17 @@ def newcell(**args):
     argument('--akimpersonate', help="print a ticket for admin user", action='store_true'),
     argument('--keytab', help="keytab file", default="/tmp/afs.keytab"),
     argument('--admin', help="admin username", default='admin'),
+    argument('--db', help="cell database hosts; default is from the client CellServDB",
+                     nargs='+', default=[]),
     argument('--fs', help="cell fileserver hosts", nargs='+', default=[]),
     argument('--top', help="top level volumes", nargs='+', default=[]),
+    argument('--workers', help="maximum number of volumes to setup concurrently", type=int, default=8),
+    argument('--per-server', help="maximum number of concurrent volume operations per fileserver",
+                             type=int, default=2),
+    argument('--placement', help="how to choose the fileserver and partition of new volumes",
+                            choices=['most-free', 'fewest-volumes', 'round-robin'], default='most-free'),
+    argument('--replicas', help="number of read-only sites of each volume, on distinct fileservers",
+                           type=int, default=1),
     argument('--aklog', help="path to aklog program"),
     argument('--kinit', help="path to kinit program"),
     argument('-o', '--options', help="command line args: <name>=<value>",
@@ -279,7 +295,9 @@ def mtroot(**args):
     return mtroot(**args)
 
 @subcommand(
-    argument('hostname', help="fileserver hostname"),
+    argument('hostnames', help="fileserver hostnames", metavar='<hostname>', nargs='*', default=[]),
+    argument('--file', help="file containing fileserver hostnames", metavar='<path>'),
+    argument('--workers', help="maximum number of fileservers to add concurrently", type=int, default=8),
     argument('--keytab', help="keytab file", default="/tmp/afs.keytab"),
     argument('-o', '--options', help="command line args; <name>=<value>",
                                 nargs='+', action='append', default=[]),
@@ -288,10 +306,112 @@ def mtroot(**args):
     requires_root=True,
     )
 def addfs(**args):
-    "Add a new fileserver to a cell"
+    "Add new fileservers to a cell"
     from afsutil.cell import addfs
     return addfs(**args)
 
+@subcommand(
+    argument('hostnames', help="new database server hostnames", metavar='<hostname>', nargs='+'),
+    argument('--fs', help="fileserver hosts to be given the new cell hosts", nargs='+', default=[]),
+    argument('--workers', help="maximum number of hosts to update concurrently", type=int, default=8),
+    argument('-o', '--options', help="command line args: <[hostname.]name>=<value>",
+                                nargs='+', action='append', default=[]),
+    argument('-p', '--paths', help="command paths: <cmd>=<path-to-cmd>",
+                                nargs='+', action='append', default=[]),
+    requires_root=True,
+    )
+def adddb(**args):
+    "Add database servers to a running cell"
+    from afsutil.cell import adddb
+    return adddb(**args)
+
+@subcommand(
+    argument('spec', help="cell spec file", metavar='<spec>'),
+    argument('--plan', help="show the changes needed, but do not make them", action='store_true'),
+    argument('--snapshot', help="file to keep the cell state between runs", metavar='<path>'),
+    argument('--max-age', help="seconds to reuse the cell state file", type=int, default=60),
+    argument('--keytab', help="keytab file"),
+    argument('--workers', help="maximum number of hosts or volumes to setup concurrently", type=int, default=8),
+    argument('-o', '--options', help="command line args: <[hostname.]name>=<value>",
+                                nargs='+', action='append', default=[]),
+    argument('-p', '--paths', help="command paths: <cmd>=<path-to-cmd>",
+                                nargs='+', action='append', default=[]),
+    requires_root=True,
+    )
+def reconcile(**args):
+    "Bring a cell to the state given in a spec file"
+    from afsutil.reconcile import reconcile
+    return reconcile(**args)
+
+@subcommand(
+    argument('--db', help="inventory database file", metavar='<path>', default='afs-inventory.db'),
+    argument('--server', help="fileservers to refresh; default is all", nargs='+', default=[]),
+    argument('--max-age', help="seconds before a source is refreshed again", type=int),
+    argument('--no-refresh', help="query the inventory without refreshing it", action='store_true'),
+    argument('--query', help="named query to run", metavar='<name>', action='append', default=[]),
+    argument('--list-queries', help="show the named queries", action='store_true'),
+    argument('--workers', help="maximum number of fileservers to read concurrently", type=int, default=8),
+    )
+def inventory(**args):
+    "Export the volumes and partitions of a cell to sqlite"
+    from afsutil.inventory import inventory
+    return inventory(**args)
+
+@subcommand(
+    argument('file', help="CSV or JSON lines file of users, groups and members; - for stdin", metavar='<file>'),
+    argument('--format', help="input format; default is to guess from the file name", choices=['csv', 'json']),
+    argument('--dryrun', help="show the pts commands, but do not run them", action='store_true'),
+    argument('--workers', help="maximum number of pts commands to run concurrently", type=int, default=8),
+    )
+def provision(**args):
+    "Create pts users, groups and memberships in bulk"
+    from afsutil.provision import provision
+    return provision(**args)
+
+@subcommand(
+    argument('specs', help="cell spec files, one per cell", metavar='<spec>', nargs='+'),
+    argument('--workers', help="maximum number of cells to setup concurrently", type=int),
+    argument('-n', '--dry-run', help="show the commands, but do not run them", action='store_true'),
+    )
+def farm(**args):
+    "Setup several independent cells concurrently"
+    from afsutil.farm import farm
+    return farm(**args)
+
+@subcommand(
+    argument('action', help="save or restore", choices=['save', 'restore']),
+    argument('path', help="snapshot file", metavar='<path>'),
+    argument('--cell', help="new cell name (restore only)"),
+    argument('--hostname', help="new host name (restore only)"),
+    argument('--address', help="new host address; default is to resolve the host name (restore only)"),
+    argument('--rename-host', help="change the host to the local host name (restore only)", action='store_true'),
+    argument('--start', help="start the servers and client after restoring", action='store_true'),
+    requires_root=True,
+    )
+def cellsnap(**args):
+    "Save or restore a snapshot of a test cell"
+    from afsutil.cellsnap import cellsnap
+    return cellsnap(**args)
+
+@subcommand(
+    argument('--dist', help='distribution type',
+                       choices=['transarc', 'rpm', 'yum'], default='transarc'),
+    argument('--components', help='components to teardown',
+                             metavar='<name>', nargs='+',
+                             choices=['client', 'server'],
+                             default=['client', 'server']),
+    argument('--no-purge', help='keep the config and data', action='store_true'),
+    argument('--workers', help='number of threads to purge files', type=int, default=8),
+    argument('--timeout', help='seconds to wait for the processes to exit', type=int, default=120),
+    argument('--pre', help='pre-remove command', dest='pre_remove'),
+    argument('--post', help='post-remove command', dest='post_remove'),
+    requires_root=True,
+    )
+def teardown(**args):
+    "Stop services, remove binaries and purge data in one pass"
+    from afsutil.teardown import teardown
+    return teardown(**args)
+
 def main():
     return dispatch()
 
@@ -29,6 +29,7 @@ import glob
 
 from afsutil.system import sh, CommandFailed, tar, mkdirp
 from afsutil.misc import lists2dict, flatten
+from afsutil.context import current
 
 logger = logging.getLogger(__name__)
 
@@ -86,32 +87,32 @@ def _detect_solariscc():
             return paths[0]
     return None
 
-def _setenv_solaris():
+def _setenv_solaris(context):
     need = [
         '/usr/perl5/bin',   # for pod2man
     ]
     # Update the path to the solaris studio cc.
-    if not 'SOLARISCC' in os.environ:
+    if context.getenv('SOLARISCC') is None:
         ccpath = _detect_solariscc()
         if ccpath:
             need.append(ccpath)
             solariscc = os.path.join(ccpath, 'cc')
             logger.info("Setting SOLARISCC to '%s'", solariscc)
-            os.environ['SOLARISCC'] = solariscc
+            context.setenv('SOLARISCC', solariscc)
         else:
             logger.warning("Failed to find path to solaris cc!")
     # Update the PATH.
-    paths = os.getenv('PATH', '').split(':')
+    paths = context.getenv('PATH', '').split(':')
     for path in need:
         if not path in paths:
             logger.info("Adding '%s' to PATH." % (path))
             paths.append(path)
-    os.environ['PATH'] = ':'.join(paths)
+    context.setenv('PATH', ':'.join(paths))
 
-def _setenv():
+def _setenv(context):
     system = platform.system()
     if system == 'SunOS':
-        _setenv_solaris()
+        _setenv_solaris(context)
 
 def _create_tarball(tarball=None, program=None):
     sysname = _detect_sysname()
@@ -134,21 +135,21 @@ def _cfadd(cf, option):
         cf.append(option)
 
 
-def regen(srcdir='.', force=False):
+def regen(srcdir='.', force=False, context=None):
     if not force and os.path.exists('%s/configure' % srcdir):
         logger.warning("Skipping regen.sh; configure already exists")
         return 0
-    sh('/bin/sh', '-c', 'cd %s && ./regen.sh' % srcdir, output=False)
+    (context or current()).sh('/bin/sh', '-c', 'cd %s && ./regen.sh' % srcdir, output=False)
 
-def configure(options=None, srcdir='.', force=False):
+def configure(options=None, srcdir='.', force=False, context=None):
     if options is None:
         options = []
     if not force and os.path.exists('config.status'):
         logger.warning("Skipping configure; config.status already exists")
         return 0
-    sh('%s/configure' % srcdir, *options, output=False)
+    (context or current()).sh('%s/configure' % srcdir, *options, output=False)
 
-def make(jobs=1, target='all', program='make'):
+def make(jobs=1, target='all', program='make', context=None):
     args = [program]
     if jobs > 1:
         # Requires a `make` whichsupports the -j option. If your `make` does
@@ -156,7 +157,7 @@ def make(jobs=1, target='all', program='make'):
         args.append('-j')
         args.append('{0}'.format(jobs))
     args.append(target)
-    sh(*args, output=False)
+    (context or current()).sh(*args, output=False)
 
 def build(**kwargs):
     """Build the OpenAFS binaries.
@@ -210,10 +211,12 @@ def build(**kwargs):
             args.append(log)
         sh(*args, output=False)
 
-    _setenv()
-    regen(srcdir=srcdir)
-    configure(options=cf, srcdir=srcdir)
-    make(jobs=jobs, target=target, program=_make)
+    # The build environment is kept in a context, not in os.environ.
+    context = current().copy()
+    _setenv(context)
+    regen(srcdir=srcdir, context=context)
+    configure(options=cf, srcdir=srcdir, context=context)
+    make(jobs=jobs, target=target, program=_make, context=context)
 
     if target == 'dest':
         _create_tarball(tarball, program=_tar)
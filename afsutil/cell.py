@@ -28,18 +28,32 @@ to mount the volumes and set the ACLs of the top level volumes. The client may
 be running on a separate host than the server.
 """
 
-import time
 import logging
 import os
 import re
 import socket
+import threading
+import weakref
 
 import afsutil.system
 import afsutil.keytab
-from afsutil.cmd import bos, vos, pts, fs, udebug, rxdebug
+import afsutil.cellservdb
+import afsutil.volumes
+from afsutil.cmd import bos, vos, pts, fs, rxdebug
 from afsutil.system import CommandFailed, afs_mountpoint
-from afsutil.transarc import AFS_SRV_LIBEXEC_DIR
+from afsutil.transarc import AFS_SRV_LIBEXEC_DIR, AFS_CONF_DIR, AFS_DATA_DIR
 from afsutil.misc import lists2dict, uniq
+from afsutil.resolver import resolve_all
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+from afsutil.scheduler import Scheduler
+from afsutil.journal import Journal
+from afsutil.ubik import WriteGate, ubik_status
+from afsutil.vldb import VLDB
+from afsutil.snapshot import CellSnapshot, bos_status, bos_listhosts, bos_listusers
+from afsutil.poll import wait_until, StatusPoller
+from afsutil.context import current, contextual
+from afsutil.placement import Placement, DEFAULT_POLICY
+from afsutil.tuning import FileserverTuning, FILESERVER_PROGRAMS
 
 logger = logging.getLogger(__name__)
 
@@ -52,20 +66,42 @@ PORT = {
     'bosserver':  '7007',
 }
 
+# One poller per context, shared by all of the hosts waited on in that
+# context, so concurrent waits on the same host share a single bos status
+# query per poll.
+_pollers = weakref.WeakKeyDictionary()
+_pollers_lock = threading.Lock()
+
+def status_poller(context=None):
+    """Return the status poller of a context; default is the active context."""
+    if context is None:
+        context = current()
+    with _pollers_lock:
+        poller = _pollers.get(context)
+        if poller is None:
+            poller = _pollers[context] = StatusPoller(bos_status)
+        return poller
+
 class Host(object):
     """Helper to configure an OpenAFS server using the bos command."""
 
-    def __init__(self, hostname='localhost', options=None, **kwargs):
+    def __init__(self, hostname='localhost', options=None, cell=None, **kwargs):
         """Initialize the afs host object.
 
         hostname: hostname
         options:  dict of server options
+        cell:     optional Cell object; the host state is read from the
+                  snapshot of the cell instead of querying bos each time
+
+        The 'fsprofile' option (or '<hostname>.fsprofile' for a single host)
+        names the fileserver tuning profile: small, large, huge, or auto.
         """
         if hostname is None or hostname == 'localhost':
             hostname = socket.gethostname()
         hostname = hostname.strip()
         self.hostname = hostname
         # The following are retrieved with bos as needed.
+        self._cell = cell
         self.cellname = None
         self.cellhosts = None
         self.users = None
@@ -79,13 +115,13 @@ class Host(object):
         self.dafs = None
         if self.dafs is None:
             for program in ('dafileserver', 'davolserver', 'salvageserver', 'dasalvager'):
-                flags = options.get(hostname + ":" + program, None)
+                flags = options.get(hostname + "." + program, None)
                 if not flags is None:
                     self.dafs = True
                     break
         if self.dafs is None:
             for program in ('fileserver', 'volserver' 'salvager'):
-                flags = options.get(hostname + ":" + program, None)
+                flags = options.get(hostname + "." + program, None)
                 if not flags is None:
                     self.dafs = False
                     break
@@ -103,6 +139,14 @@ class Host(object):
                     break
         if self.dafs is None:
             self.dafs = True
+        # Fileserver tuning profile, if one. The profile options are recorded
+        # by program name when the bos create -cmd arguments are generated.
+        self.fsprofile = options.get(hostname + ".fsprofile", options.get('fsprofile', None))
+        self.fileserver_tuning = None
+        self.tuned = {}
+
+    def __str__(self):
+        return self.hostname
 
     def cmd(self, program):
         """Get the bos create -cmd argument."""
@@ -111,6 +155,13 @@ class Host(object):
         flags = self.options.get(self.hostname + "." + program, None)
         if flags is None:
             flags = self.options.get(program, None)
+        if program in FILESERVER_PROGRAMS and self.fsprofile and self.fsprofile != 'none':
+            if self.fileserver_tuning is None:
+                self.fileserver_tuning = FileserverTuning(self.fsprofile, hostname=self.hostname)
+                self.fileserver_tuning.log()
+            flags = self.fileserver_tuning.merge(flags)
+            logger.info("Using %s options '%s' on host %s.", program, flags, self.hostname)
+            self.tuned[program] = flags
         if flags:
             cmd += ' ' + flags
         return cmd
@@ -124,60 +175,45 @@ class Host(object):
             success = True
         return success
 
+    def _state(self):
+        """Return the HostState of this host from the cell snapshot."""
+        state = self._cell.snapshot(databases=False).host(self.hostname)
+        if state.error is not None:
+            if isinstance(state.error, Exception):
+                raise state.error
+            raise AssertionError("Unable to query host %s: %s" % (self.hostname, state.error))
+        return state
+
+    def _changed(self):
+        """Note the configuration of this host was changed."""
+        if self._cell is not None:
+            self._cell.invalidate(self.hostname)
+
     def cellinfo(self):
         """Retrieve the cell info."""
-        if self.cellname is None or self.cellhosts is None:
-            output = bos('listhosts', '-server', self.hostname)
-            self.cellhosts = set()
-            for line in output.splitlines():
-                match = re.match(r'Cell name is (\S+)', line)
-                if match:
-                    self.cellname = match.group(1)
-                match = re.match(r'\s+Host \S+ is (\S+)', line)
-                if match:
-                    self.cellhosts.add(match.group(1))
+        if self._cell is not None:
+            state = self._state()
+            self.cellname, self.cellhosts = state.cellname, set(state.cellhosts)
+        elif self.cellname is None or self.cellhosts is None:
+            self.cellname, self.cellhosts = bos_listhosts(self.hostname)
         return (self.cellname, tuple(self.cellhosts))
 
     def services(self):
         """Retrieve service names and current status."""
-        output = bos('status', '-server', self.hostname, '-long')
-        services = {}
-        bnode = None
-        bstatus = None
-        for line in output.splitlines():
-            match = re.match(r'Instance ([^,]+),', line)
-            if match:
-                bnode = match.group(1)
-                match = re.search(r'currently (\w+)', line)
-                if match:
-                    bstatus = match.group(1)
-                else:
-                    bstatus = 'unknown'
-                services[bnode] = {'status':bstatus}
-                bnode = None
-                bstatus = None
-        return services
+        if self._cell is not None:
+            statuses = self._state().statuses
+        else:
+            statuses = bos_status(self.hostname)
+        return dict((bnode, {'status':bstatus}) for bnode,bstatus in statuses.items())
 
     def getservice(self, name):
         """Return the status information by name."""
         return self.services().get(name, None)
 
-    def wait_for_status(self, name, target='running', attempts=30, delay=5):
-        """Wait for service to reach running state."""
-        status = 'unknown'
-        logger.info("Waiting for service %s to reach %s on host %s.", name, target, self.hostname)
-        for attempt in xrange(0, attempts+1):
-            service = self.getservice(name)
-            if service is None:
-                time.sleep(delay)
-                continue
-            if service['status'] == target:
-                logger.info("Service %s is running on host %s.", name, self.hostname)
-                return
-            time.sleep(delay)
-        if status is None:
-            status = 'unknown'
-        raise AssertionError("Service %s failed to start on %s; status=%s" % (name, self.hostname, status))
+    def wait_for_status(self, name, target='running', timeout=150):
+        """Wait for service to reach the target state."""
+        status_poller().wait([(self.hostname, name, target)], timeout=timeout,
+            description="service %s to reach %s on host %s" % (name, target, self.hostname))
 
     def getcellname(self):
         """Get the configured cell name for this host (ThisCell)."""
@@ -192,6 +228,7 @@ class Host(object):
     def setcellname(self, name):
         """Set the configured cell name for this host (ThisCell)."""
         bos('setcellname', '-server', self.hostname, '-name', name)
+        self._changed()
         if self.getcellname() != name:
             raise AssertionError("Failed to update cell name!")
 
@@ -221,6 +258,7 @@ class Host(object):
                 bos('addhost', '-server', self.hostname, '-host', newhost)
             for oldhost in oldhosts:
                 bos('removehost', '-server', self.hostname, '-host', oldhost)
+            self._changed()
             self.cellname = None
             self.cellhosts = None
             self.cellinfo()
@@ -228,14 +266,16 @@ class Host(object):
                 raise AssertionError("Failed to update cell hosts!")
 
     def listusers(self):
-        output = bos('listusers', '-server', self.hostname)
-        return output.replace('SUsers are:', '').split()
+        if self._cell is not None:
+            return self._state().users
+        return bos_listusers(self.hostname)
 
     def adduser(self, name):
         users = self.listusers()
         if name not in users:
             logger.info("Adding %s to the superuser list on %s.", name, self.hostname)
             bos('adduser', '-server', self.hostname, '-user', name)
+            self._changed()
 
     def create_database(self, name):
         """Start the database server."""
@@ -255,10 +295,12 @@ class Host(object):
         bos('create', '-server', self.hostname,
             '-instance', name, '-type', 'simple',
             '-cmd', self.cmd(name))
+        self._changed()
 
     def shutdown(self, name):
         """Shutdown the service name."""
         bos('shutdown', '-server', self.hostname, '-instance', name, '-wait')
+        self._changed()
 
     def shutdown_all(self):
         """Shutdown all running services."""
@@ -268,30 +310,19 @@ class Host(object):
 
     def restart(self, name):
         bos('restart', '-server', self.hostname, '-instance', name)
+        self._changed()
 
-    def is_recovered_sync_site(self, name):
+    def is_recovered_sync_site(self, name, retry=10):
         """Returns true if this is the db sync site and the recovery state is good."""
-        port = PORT[name]
-        try:
-            output = udebug('-server', self.hostname, '-port', port, retry=10)
-        except CommandFailed:
-            return False
-        logger.debug("udebug for %s: %s", self.hostname, output)
-        if re.search(r'clock may be bad', output):
+        status = ubik_status(self.hostname, name, retry=retry)
+        if status.clock_bad:
             logger.info("Clock may be bad on host %s.", self.hostname)
-        if re.search(r'I am not sync site', output):
-            return False
-        if re.search(r'I am sync site', output):
-             match = re.search(r'Recovery state (\S+)', output)
-             if match:
-                 recovery_state = match.group(1)
-             else:
-                 recovery_state = '??'
-             if recovery_state == '1f' or recovery_state == 'f':
-                 logger.info("Database quorum reached for %s; sync site is %s; recovery state is %s.",
-                             name, self.hostname, recovery_state)
-                 return True
-             logger.debug("Host %s is sync site with recovery state %s", self.hostname, recovery_state)
+        if status.recovered:
+            logger.info("Database quorum reached for %s; sync site is %s; recovery state is %s.",
+                        name, self.hostname, status.recovery)
+            return True
+        if status.is_sync:
+            logger.debug("Host %s is sync site with recovery state %s", self.hostname, status.recovery)
         return False
 
     def create_fileserver(self):
@@ -323,6 +354,7 @@ class Host(object):
                 '-cmd', self.cmd('fileserver'),
                 '-cmd', self.cmd('volserver'),
                 '-cmd', self.cmd('salvager'))
+        self._changed()
 
         ok = self.rxping(service='fileserver', retry=60)
         if not ok:
@@ -331,21 +363,74 @@ class Host(object):
         if not ok:
             raise AssertionError("Unable to contact volume server at %s." % (self.hostname))
 
-    def _check_volume(self, name):
-        try:
-            vos('listvldb', '-name', name, '-quiet', '-noresolve', '-nosort')
-        except CommandFailed:
-            return False
-        else:
-            return True
-
-    def create_volume(self, name, partition="a"):
-        """Create volume if it does not exist."""
-        if self._check_volume(name):
-            logger.info("Skipping create volume '%s'; already exists.", name)
-        else:
-            logger.info("Creating volume %s on host %s, partition %s.", name, self.hostname, partition)
-            vos('create', '-server', self.hostname, '-partition', partition, '-name', name, retry=60, wait=10)
+    def create_volume(self, name, partition=None, gate=None, placement=None):
+        """Create volume if it does not exist.
+
+        If a partition is not given, it is chosen by the placement, e.g.,
+        the cell placement, which has the partition usage of the
+        fileservers already. The partition with the most free space is used
+        if neither is given."""
+        if partition is None:
+            if placement is None:
+                placement = Placement([self.hostname])
+            partition = placement.choose(servers=[self.hostname])[1]
+        afsutil.volumes.create_volume(name, self.hostname, partition, gate=gate)
+
+class MountBatch(object):
+    """Mount points and acls to be created by the client in one batch.
+
+    The mount points are created level by level, so a mount point may be
+    made inside one created earlier in the same batch. The existing entries
+    of each parent directory are read once, and the mount points and acls
+    of a level are set concurrently since they are in distinct directories.
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.mounts = [] # (path, volume, opts)
+        self.acls = [] # (path, name, rights)
+
+    def mount(self, path, volume, *opts):
+        if path not in [m[0] for m in self.mounts]:
+            self.mounts.append((path, volume, opts))
+
+    def setacl(self, path, name, rights):
+        if (path, name, rights) not in self.acls:
+            self.acls.append((path, name, rights))
+
+    def _mkmount(self, mount):
+        path, volume, opts = mount
+        msg = ' as read-write' if '-rw' in opts else ''
+        logger.info("Mounting '%s' on path '%s'%s.", volume, path, msg)
+        fs('mkmount', '-dir', path, '-vol', volume, *opts)
+
+    def _setacl(self, acl):
+        path, name, rights = acl
+        fs('setacl', '-dir', path, '-acl', name, rights)
+
+    def run(self):
+        """Create the missing mount points, then set the acls.
+
+        returns: list of the paths mounted
+        """
+        levels = {}
+        for mount in self.mounts:
+            depth = len(os.path.normpath(mount[0]).split(os.sep))
+            levels.setdefault(depth, []).append(mount)
+        mounted = []
+        for depth in sorted(levels):
+            entries = {}
+            for parent in uniq([os.path.dirname(m[0]) for m in levels[depth]]):
+                try:
+                    entries[parent] = set(os.listdir(parent))
+                except OSError:
+                    entries[parent] = set()
+            todo = [m for m in levels[depth]
+                    if os.path.basename(m[0]) not in entries[os.path.dirname(m[0])]]
+            parallel(self._mkmount, todo, workers=self.workers)
+            mounted.extend(m[0] for m in todo)
+        parallel(self._setacl, self.acls, workers=self.workers)
+        return mounted
 
 class Cell(object):
 
@@ -353,12 +438,29 @@ class Cell(object):
                  admins=None, admin='admin',
                  options=None, paths=None,
                  keytab='/tmp/afs.keytab', realm=None, akimpersonate=False,
+                 workers=DEFAULT_WORKERS, per_server=afsutil.volumes.DEFAULT_PER_SERVER,
+                 placement=DEFAULT_POLICY, replicas=1, journal=None,
+                 snapshot=None, max_age=60, context=None, gate=True,
                  **kwargs):
         """Initialize the cell object.
 
         The first list element of the db list will be the first db server
         created. The first element of the fs list will be the first fileserver,
-        which will house the rw root volumes.
+        which will house the rw root volumes. The workers argument limits the
+        number of hosts or volumes setup concurrently, and per_server limits
+        the number of concurrent volume operations on each fileserver. The
+        placement argument is the policy used to choose the fileserver and
+        partition of new volumes, see afsutil.placement. The replicas argument
+        is the number of read-only sites of each replicated volume; the sites
+        are placed on distinct fileservers. The journal argument is the path
+        of the newcell progress journal, or None to not keep one. The snapshot
+        argument is the path of a file to keep the cell state between runs;
+        it is reused while it is less than max_age seconds old. The context
+        argument is the afsutil.context.Context used to run the commands of
+        this cell; the default is the active context. The cell keeps a copy,
+        so the paths given are not seen outside of this cell. The gate
+        argument holds the database writes until the sync site is stable;
+        it should be false when the database servers are not known.
         """
         # Some sanity checking.
         assert cell is not None and isinstance(cell, basestring)  # expect a string
@@ -389,6 +491,19 @@ class Cell(object):
             self.realm = realm
         self.options = lists2dict(options)
         self.paths = lists2dict(paths)
+        self.workers = int(workers)
+        self.per_server = int(per_server)
+        self.placement_policy = placement
+        self._placement = None
+        self.replicas = int(replicas)
+        self.journal = journal
+        self.gate = gate
+        self._write_gate = None
+        self.snapshot_path = snapshot
+        self.max_age = max_age
+        self._snapshot = None
+        self._snapshot_lock = threading.RLock()
+        self._vldb = None
 
         # Super users for this cell. Convert k5 style names to k4 style for AFS.
         self.admins = [name.replace('/', '.') for name in admins]
@@ -399,24 +514,38 @@ class Cell(object):
         # servers for the cell setup.
         hosts = {} # tmp dict to setup db and fs lists.
         for name in uniq(db + fs):
-            hosts[name] = Host(name, options=self.options)
+            hosts[name] = Host(name, options=self.options, cell=self)
         self.hosts = hosts.values() # list of Host objects for db and/or fs
         self.db = [hosts[name] for name in uniq(db)]
         self.fs = [hosts[name] for name in uniq(fs)]
 
         # Set the programs to be used by login().
         self.akimpersonate = akimpersonate
+        self.context = (context or current()).copy()
         for cmd in self.paths:
-            afsutil.cmd.setpath(cmd, self.paths[cmd])
+            self.context.setpath(cmd, self.paths[cmd])
 
     @classmethod
     def current(cls, **kwargs):
-        """Create a cell object from the existing cell."""
+        """Create a cell object from the existing cell.
+
+        The cell name and database hosts are read from the local server
+        configuration if present, otherwise they are retrieved with bos."""
         host = Host()
-        cell = kwargs.pop('cell', host.getcellname())
-        db = kwargs.pop('db', host.getcellhosts())
+        thiscell = os.path.join(AFS_CONF_DIR, 'ThisCell')
+        cellservdb = os.path.join(AFS_CONF_DIR, 'CellServDB')
+        if 'cell' not in kwargs or 'db' not in kwargs:
+            if os.path.exists(thiscell) and os.path.exists(cellservdb):
+                with open(thiscell, 'r') as f:
+                    name = f.read().strip()
+                entry = afsutil.cellservdb.load(cellservdb).lookup(name)
+                if entry is not None:
+                    kwargs.setdefault('cell', name)
+                    kwargs.setdefault('db', entry.hostnames())
+        cell = kwargs.pop('cell', None) or host.getcellname()
+        db = kwargs.pop('db', None) or host.getcellhosts()
         fs = kwargs.pop('fs', ['localhost']) # get list from vos listaddrs?
-        admins = kwargs.pop('admins', host.listusers())
+        admins = kwargs.pop('admins', None) or host.listusers()
         return cls(cell=cell, db=db, fs=fs, admins=admins, **kwargs)
 
     def _akimpersonate(self, user):
@@ -435,29 +564,66 @@ class Cell(object):
         for line in output.splitlines():
             logger.info(line)
 
-    def _wait_for_quorum(self, name, hosts, attempts=60, delay=10):
-        for attempt in xrange(0, attempts+1):
-            logger.info("Waiting for %s database quorum; attempt %d of %d.", name, (attempt+1), attempts)
-            num_sync_sites = 0
-            for host in hosts:
-                if host.is_recovered_sync_site(name):
-                    num_sync_sites += 1
-            if num_sync_sites == 1:
-                logger.debug("Database quorum reached for %s.", name)
-                return
-            time.sleep(delay)
-        raise AssertionError("Failed to reach database quorum for %s." % (name))
+    @contextual
+    def wait_for_status(self, conditions, timeout=150):
+        """Wait for a set of services to reach their target states.
+
+        conditions: sequence of (host, name, target) tuples
+
+        The status of each host is fetched once per poll, regardless of the
+        number of services waited on, and is shared with any other threads
+        waiting on the same host.
+        """
+        conditions = [(str(host), name, target) for host,name,target in conditions]
+        status_poller(self.context).wait(conditions, timeout=timeout)
+
+    def _wait_for_quorum(self, name, hosts, timeout=600):
+        """Wait until exactly one of the hosts is a recovered sync site."""
+        def _quorum():
+            sync_sites = [h for h in hosts if h.is_recovered_sync_site(name, retry=0)]
+            return len(sync_sites) == 1
+        wait_until(_quorum, "%s database quorum" % (name), timeout=timeout, maximum=5.0)
+
+    def _wait_for_ptserver(self, timeout=120):
+        """Wait until the ptserver answers queries."""
+        def _answering():
+            try:
+                pts('listentries', quiet=True)
+            except CommandFailed:
+                return False
+            return True
+        wait_until(_answering, "ptserver to answer", timeout=timeout)
+
+    def _wait_for_vlserver(self, timeout=120):
+        """Wait until the vlserver answers queries."""
+        def _answering():
+            try:
+                vos('listvldb', quiet=True)
+            except CommandFailed:
+                return False
+            return True
+        wait_until(_answering, "vlserver to answer", timeout=timeout)
 
-    def _create_admin(self, admin):
+    def _create_admin(self, admin, timeout=120):
         logger.info("Creating the admin user %s.", admin)
         # Due to a bug in some versions of OpenAFS, the db drops quorum the
-        # first time we write to it after the first election. Wait at least
-        # ubik BIGTIME and retry.
-        try:
-            pts('createuser', '-name', admin, retry=1, wait=80)
-        except CommandFailed as e:
-            if not "Entry for name already exists" in e.out:
-                raise
+        # first time we write to it after the first election. Hold the write
+        # until the ptserver sync site is stable, and wait for it to be stable
+        # again if the write fails.
+        gate = self.write_gate
+        def _created():
+            gate.wait('ptserver')
+            try:
+                pts('createuser', '-name', admin)
+            except CommandFailed as e:
+                if "Entry for name already exists" in e.out:
+                    return True
+                logger.info("Failed to create user %s; will retry.", admin)
+                gate.invalidate('ptserver')
+                return False
+            return True
+        wait_until(_created, "creation of user %s" % (admin), timeout=timeout, initial=1.0)
+        gate.wait('ptserver')
         try:
             pts('adduser', '-user', admin, '-group', 'system:administrators')
         except CommandFailed as e:
@@ -474,50 +640,104 @@ class Cell(object):
         logger.info("Cell is %s", self.cell)
         return cell
 
-    def _mount(self, path, volume, *opts):
-        if not os.path.exists(path):
-            msg = ' as read-write' if '-rw' in opts else ''
-            logger.info("Mounting '%s' on path '%s'%s.", volume, path, msg)
-            fs('mkmount', '-dir', path, '-vol', volume, *opts)
-
     def _create_replica(self, name):
-        output = vos('listvldb', '-name', name, '-quiet')
-        if re.findall(r'^\s+server \S+ partition \S+ RO Site', output, re.M):
-            logger.info("Skipping replication of %s; already have a read only site", name)
-            return
-        server,partition = re.findall(r'^\s+server (\S+) partition (\S+) RW Site', output, re.M)[0]
-        # Due to a bug in some versions of OpenAFS, the db drops quorum the
-        # first time we write to it after the first election. vos fails with a
-        # uquorum error and and the volume is left locked. Use this closure to
-        # unlock the the volume before retrying the vos command.
-        def _unlocker(name):
-            def _unlock():
-                try:
-                    vos('unlock', '-id', name)
-                except:
-                    pass
-            return _unlock
-        vos('addsite', '-server', server, '-partition', partition, '-id', name,
-            retry=20, wait=80, cleanup=_unlocker(name))
-        vos('release', '-id', name,
-            retry=20, wait=80, cleanup=_unlocker(name))
+        afsutil.volumes.replicate(name, replicas=self.replicas, placement=self.placement,
+                                  gate=self.write_gate, vldb=self.vldb)
+
+    @contextual
+    def snapshot(self, databases=True, refresh=False):
+        """Return the state of the cell, gathered in one pass.
+
+        The state is gathered once and reused, unless refresh is true. The
+        vldb and pts queries are skipped if databases is false, e.g. when
+        the db servers may not be running yet. The hosts changed since
+        the state was gathered are queried again when they are looked up;
+        see invalidate().
+        """
+        with self._snapshot_lock:
+            snap = self._snapshot
+            hostnames = [host.hostname for host in self.hosts]
+            if refresh:
+                snap = None
+            if snap is None and self.snapshot_path and not refresh:
+                snap = CellSnapshot.load(self.snapshot_path, cell=self.cell,
+                                         hostnames=hostnames, max_age=self.max_age)
+            if snap is None:
+                snap = CellSnapshot(self.cell, hostnames).gather(databases=databases, workers=self.workers)
+            elif databases and not snap.databases:
+                snap.gather_databases()
+            if self.snapshot_path and snap is not self._snapshot:
+                snap.save(self.snapshot_path)
+            self._snapshot = snap
+            return snap
+
+    def invalidate(self, hostname=None):
+        """Mark the snapshot state of a host, or of the whole cell, out of date."""
+        with self._snapshot_lock:
+            if self._snapshot is not None:
+                self._snapshot.invalidate(hostname)
+
+    @property
+    def vldb(self):
+        """The index of the volume location database, read when first used."""
+        if self._vldb is None:
+            self.load_vldb()
+        return self._vldb
+
+    @contextual
+    def load_vldb(self):
+        """Read the whole volume location database into the index."""
+        self._vldb = VLDB().load()
+        return self._vldb
+
+    @property
+    def write_gate(self):
+        """Holds database writes until the sync site is stable; None if disabled."""
+        if not self.gate:
+            return None
+        hostnames = [host.hostname for host in self.db]
+        if self._write_gate is None or self._write_gate.hostnames != hostnames:
+            self._write_gate = WriteGate(hostnames)
+        return self._write_gate
+
+    @property
+    def placement(self):
+        """The volume placement for the fileservers in this cell."""
+        if self._placement is None:
+            servers = [host.hostname for host in self.fs]
+            self._placement = Placement(servers, policy=self.placement_policy, workers=self.workers)
+        return self._placement
+
+    @contextual
+    def resolve_hosts(self):
+        """Verify the host names resolve, looking up all of them at once."""
+        names = [host.hostname for host in self.hosts]
+        resolved = resolve_all(names, raise_errors=False)
+        failed = [name for name in names if not resolved[name]]
+        if failed:
+            s = 's' if len(failed) > 1 else ''
+            f = ', '.join(failed)
+            raise AssertionError("Failed to resolve host name%s %s" % (s, f))
+        for name in names:
+            if all([a.startswith('127.') for a in resolved[name]]):
+                logger.warning("Host name %s resolves to a loopback address.", name)
+        return resolved
 
+    @contextual
     def ping_hosts(self):
         """Verify hosts are reachable and bosserver is running."""
-        failed = []
-        for host in self.hosts:
-            ok = host.rxping(service='bosserver', retry=0)
-            if not ok:
-                failed.append(host.hostname)
+        self.resolve_hosts()
+        results = parallel(lambda h: h.rxping(service='bosserver', retry=0),
+                           self.hosts, workers=self.workers)
+        failed = [r.item.hostname for r in results if not r.value]
         if failed:
             s = 's' if len(failed) > 1 else ''
             f = ', '.join(failed)
             raise AssertionError("Failed to reach bosserver on host%s %s" % (s, f))
 
-    def _shutdown_hosts(self):
-        """Shutdown the services on all the hosts."""
-        for host in self.hosts:
-            host.shutdown_all()
+    def _shutdown_host(self, host):
+        """Shutdown the services on a host."""
+        host.shutdown_all()
 
     def _setup_first_db_server(self):
         """Setup the initial database server and db files."""
@@ -530,65 +750,167 @@ class Cell(object):
         db.setcellhosts([self.db[0]])
         for dbname in DBNAMES:
             db.create_database(dbname)
-            db.wait_for_status(dbname, target='running')
+        self.wait_for_status([(db, dbname, 'running') for dbname in DBNAMES])
 
-        logger.info("Waiting for quorum.")
-        time.sleep(2) # Give the servers a chance to start
         for dbname in DBNAMES:
             self._wait_for_quorum(dbname, [db])
 
         # The database servers create emtpy prdb and vldb databases as
         # side-effect of these queries, including the creation of the initial
         # ubik database versions.
-        pts('listentries', retry=10)
-        vos('listvldb', retry=10)
+        self._wait_for_ptserver()
+        self._wait_for_vlserver()
 
         # Create the superusers and add them to this first server's userlist.
         for admin in self.admins:
             self._create_admin(admin)
             db.adduser(admin)
 
-    def _add_db_servers(self):
-        """Setup the remaining database servers."""
-        logger.info("Setting up additional database servers.")
-
-        # Shutdown the primary server since we are changing the
-        # cell hosts on it.
+    def _shutdown_first_db_server(self):
+        """Shutdown the primary server since we are changing the cell hosts on it."""
         for dbname in DBNAMES:
             self.db[0].shutdown(dbname)
-            self.db[0].wait_for_status(dbname, target='shutdown')
-        time.sleep(1)
+        self.wait_for_status([(self.db[0], dbname, 'shutdown') for dbname in DBNAMES])
 
-        # Set the cell hosts on all the db servers, including the primary.
+    def _set_db_cellhosts(self, host):
+        """Set the cell hosts on a db server, including the primary."""
         # Be sure keep the order of the hosts consistent, since that is
         # the normal setup.
-        for host in self.db:
-            host.setcellname(self.cell)
-            host.setcellhosts([self.db[0]])
-            host.setcellhosts(self.db)
+        host.setcellname(self.cell)
+        host.setcellhosts([self.db[0]])
+        host.setcellhosts(self.db)
+        if host != self.db[0]:
+            for admin in self.admins:
+                host.adduser(admin)
 
-        # Restart the primary and create the other database hosts.
-        # Use udebug to verify quorum is established.
+    def _restart_first_db_server(self):
+        """Restart the primary database server."""
         for dbname in DBNAMES:
             self.db[0].restart(dbname)
-            self.db[0].wait_for_status(dbname, target='running')
-            for host in self.db:
-                if host != self.db[0]:
-                    for admin in self.admins:
-                        host.adduser(admin)
-                    host.create_database(dbname)
-                    host.wait_for_status(dbname, target='running')
-
-        logger.info("Waiting for quorum.")
-        time.sleep(15)
+        self.wait_for_status([(self.db[0], dbname, 'running') for dbname in DBNAMES])
+
+    def _create_databases(self, host):
+        """Create the database servers on one of the other db hosts."""
+        for dbname in DBNAMES:
+            host.create_database(dbname)
+        self.wait_for_status([(host, dbname, 'running') for dbname in DBNAMES])
+
+    def _wait_for_db_quorum(self):
+        """Use udebug to verify quorum is established."""
         for dbname in DBNAMES:
             self._wait_for_quorum(dbname, self.db)
 
-    def _add_fs_servers(self):
-        """Add remaining file servers."""
-        for server in self.fs:
-            if server != self.fs[0]:
-                self.addfs(server)
+    def _has_instances(self, host, names, status=None):
+        """Return true if the bnode instances exist, and have the status if given."""
+        statuses = self.snapshot(databases=False).statuses(host.hostname)
+        return all(n in statuses and (status is None or statuses[n] == status) for n in names)
+
+    def _fs_bnode(self, host):
+        return 'dafs' if host.dafs else 'fs'
+
+    def _verify_first_db_server(self):
+        return self._has_instances(self.db[0], DBNAMES, status='running')
+
+    def _verify_first_fs_server(self):
+        return self._has_instances(self.fs[0], [self._fs_bnode(self.fs[0])], status='running')
+
+    def _verify_db_cellhosts(self, host):
+        state = self.snapshot(databases=False).host(host.hostname)
+        return state.cellname == self.cell and \
+               state.cellhosts == set(h.hostname for h in self.db)
+
+    def _verify_databases(self, host):
+        return self._has_instances(host, DBNAMES, status='running')
+
+    def _verify_fileserver(self, host):
+        return self._has_instances(host, [self._fs_bnode(host)], status='running')
+
+    def _add_db_servers(self, scheduler):
+        """Schedule the setup of the remaining database servers."""
+        scheduler.add("shutdown first db server", self._shutdown_first_db_server,
+                      checkpoint=False)
+        scheduler.add("set db server cell hosts", self._set_db_cellhosts, self.db,
+                      verify=self._verify_db_cellhosts)
+        scheduler.add("restart first db server", self._restart_first_db_server,
+                      checkpoint=False)
+        scheduler.add("create db servers", self._create_databases, self.db[1:],
+                      verify=self._verify_databases)
+        scheduler.add("wait for db quorum", self._wait_for_db_quorum, checkpoint=False)
+
+    def _sync_sites(self, hosts):
+        """Return the set of hosts which are currently a db sync site."""
+        sites = set()
+        for dbname in DBNAMES:
+            for host in hosts:
+                if host.is_recovered_sync_site(dbname, retry=0):
+                    sites.add(host)
+        return sites
+
+    @contextual
+    def rolling_restart(self, hosts, members=None):
+        """Restart the database servers on hosts one at a time, keeping quorum.
+
+        The sync sites are restarted last, so there is only one election,
+        and quorum is verified with udebug after each host is restarted
+        before the next one is touched.
+
+        hosts:   Host objects to be restarted
+        members: all of the database server hosts; default is self.db
+        """
+        if members is None:
+            members = self.db
+        sync = self._sync_sites(hosts)
+        order = [h for h in hosts if h not in sync] + [h for h in hosts if h in sync]
+        for host in order:
+            logger.info("Restarting the database servers on %s.", host)
+            for dbname in DBNAMES:
+                host.restart(dbname)
+            self.wait_for_status([(host, dbname, 'running') for dbname in DBNAMES])
+            for dbname in DBNAMES:
+                self._wait_for_quorum(dbname, members)
+
+    @contextual
+    def adddb(self, hosts, fileservers=None):
+        """Add database servers to a running cell without an outage.
+
+        The new servers are added one at a time. The new server is configured
+        with the new membership and started, the membership is updated on the
+        existing servers, then the existing servers are restarted one at a
+        time so the database stays available. A cell with a single database
+        server will have a short election when its only site is restarted.
+
+        hosts:       hostnames or Host objects of the new database servers
+        fileservers: optional fileserver hosts to be given the new cell hosts
+        """
+        hosts = [Host(h, options=self.options, cell=self) if isinstance(h, basestring) else h for h in hosts]
+        for dbname in DBNAMES:
+            self._wait_for_quorum(dbname, self.db)
+        for host in hosts:
+            if host.hostname in [h.hostname for h in self.db]:
+                logger.info("Skipping %s; already a database server.", host)
+                continue
+            logger.info("Adding database server %s.", host)
+            existing = list(self.db)
+            members = existing + [host]
+            host.setcellname(self.cell)
+            host.setcellhosts(members)
+            for admin in self.admins:
+                host.adduser(admin)
+            parallel(lambda h: h.setcellhosts(members), existing, workers=self.workers)
+            self._create_databases(host)
+            self.rolling_restart(existing, members)
+            self.db.append(host)
+            if host.hostname not in [h.hostname for h in self.hosts]:
+                self.hosts.append(host)
+        if fileservers:
+            fileservers = [Host(h, options=self.options, cell=self) if isinstance(h, basestring) else h for h in fileservers]
+            fileservers = [h for h in fileservers if h.hostname not in [d.hostname for d in self.db]]
+            parallel(lambda h: h.setcellhosts(self.db), fileservers, workers=self.workers)
+
+    def _add_fs_servers(self, scheduler):
+        """Schedule the setup of the remaining file servers."""
+        scheduler.add("add fs servers", self.addfs, self.fs[1:],
+                      verify=self._verify_fileserver)
 
     def _setup_first_fs_server(self):
         """Startup the file server processes and create the root volumes if needed."""
@@ -604,9 +926,10 @@ class Cell(object):
         fs.wait_for_status(bnode, target='running')
 
         # Note: root.afs must exist before non-dynroot clients are started.
-        fs.create_volume('root.afs')
-        fs.create_volume('root.cell')
+        fs.create_volume('root.afs', gate=self.write_gate, placement=self.placement)
+        fs.create_volume('root.cell', gate=self.write_gate, placement=self.placement)
 
+    @contextual
     def login(self, user):
         """Obtain a token for this cell.
 
@@ -618,6 +941,7 @@ class Cell(object):
         else:
             self._kinit_aklog(user)
 
+    @contextual
     def newcell(self):
         """Setup a new OpenAFS cell.
 
@@ -644,17 +968,46 @@ class Cell(object):
         1. The database servers are configured and running.
         2. The fileservers are configured and running.
         3. A set of admin and regular users are created.
+
+        The setup is run in phases. Within a phase, the per-host steps are run
+        concurrently, so the setup time grows with the number of phases, not
+        the number of hosts. If a journal path was given, the completed phases
+        and hosts are recorded, and a rerun after a failure skips the phases
+        which are verified to be still done. Only phases with a verify check
+        are recorded, and the hosts are not shutdown again when resuming. The journal is removed once the setup is complete, so
+        a later setup of the same cell starts from the beginning.
         """
         logger.info("Setting up new cell.")
-        self.ping_hosts()      # bosserver must be running on each
-        self._shutdown_hosts() # before the CellServDBs are changed
-        self._setup_first_db_server()
-        self._setup_first_fs_server()
+        journal = None
+        if self.journal:
+            key = {'cell': self.cell,
+                   'db': [h.hostname for h in self.db],
+                   'fs': [h.hostname for h in self.fs]}
+            journal = Journal(self.journal, key)
+        scheduler = Scheduler(workers=self.workers, journal=journal, changed=self.invalidate)
+        scheduler.add("check hosts", self.ping_hosts, checkpoint=False) # bosserver must be running on each
+        if journal is not None and journal.completed("setup first db server"):
+            # Resuming; the servers were started by the previous run.
+            logger.info("Skipping shutdown of the hosts; resuming a previous setup.")
+        else:
+            scheduler.add("shutdown hosts", self._shutdown_host, self.hosts, # before the CellServDBs are changed
+                          checkpoint=False)
+        scheduler.add("setup first db server", self._setup_first_db_server,
+                      verify=self._verify_first_db_server)
+        scheduler.add("setup first fs server", self._setup_first_fs_server,
+                      verify=self._verify_first_fs_server)
         if len(self.db) > 1:
-            self._add_db_servers()
+            self._add_db_servers(scheduler)
         if len(self.fs) > 1:
-            self._add_fs_servers()
-
+            self._add_fs_servers(scheduler)
+        scheduler.run()
+        if journal is not None:
+            journal.clear()
+        for name, elapsed in scheduler.durations():
+            logger.info("%-28s %6.1f seconds", name, elapsed)
+        return scheduler
+
+    @contextual
     def addfs(self, host):
         """Add a fileserver to this cell.
 
@@ -664,7 +1017,7 @@ class Cell(object):
         and then create the bosserver configuration to run the fileserver.
         """
         if isinstance(host, basestring):
-            host = Host(host, options=self.options)
+            host = Host(host, options=self.options, cell=self)
         logger.info("Adding fileserver %s", host.hostname)
         host.setcellname(self.cell)
         host.setcellhosts(self.db)
@@ -672,6 +1025,26 @@ class Cell(object):
             host.adduser(admin)
         host.create_fileserver()
 
+    @contextual
+    def addfs_hosts(self, hosts):
+        """Add a set of fileservers to this cell concurrently.
+
+        At most self.workers hosts are setup at the same time. A failure
+        to add one host does not stop the others from being added.
+
+        returns: list of parallel.Result objects, one per host
+        """
+        hostname = socket.gethostname()
+        hosts = [hostname if h == 'localhost' else h for h in hosts]
+        hosts = [Host(h, options=self.options, cell=self) if isinstance(h, basestring) else h for h in uniq(hosts)]
+        logger.info("Adding %d fileservers, %d at a time.", len(hosts), min(self.workers, len(hosts)))
+        results = parallel(self.addfs, hosts, workers=self.workers, raise_errors=False)
+        for r in results:
+            if not r.ok:
+                logger.error("Failed to add fileserver %s: %s", r.item, r.error)
+        return results
+
+    @contextual
     def mtroot(self, volumes):
         """Mount, setup acls, and replicate the root.afs and root.cell volumes.
 
@@ -724,53 +1097,160 @@ class Cell(object):
         self.login(user)
 
         # Replicate our root volumes.
-        self._create_replica('root.afs')
-        self._create_replica('root.cell')
+        parallel(self._create_replica, ['root.afs', 'root.cell'])
 
-        # Mount the root volumes.
+        # The mount points and acls are collected into one batch, run after
+        # the top level volumes are created, then root.cell is released and
+        # the client is told to check the volumes once.
+        mounts = MountBatch(workers=min(self.workers, 4))
         afsd_options = self.options.get('afsd', '')
         dynroot = '-dynroot' in afsd_options
         if not dynroot:
-            self._mount("%(afs)s/%(cell)s" % locals(), 'root.cell', '-cell', cell)
-            self._mount("%(afs)s/.%(cell)s" % locals(), 'root.cell', '-cell', cell, '-rw')
-            self._mount("%(afs)s/.%(cell)s/.afs" % locals(), 'root.afs', '-rw') # for dynroot clients
+            mounts.mount("%(afs)s/%(cell)s" % locals(), 'root.cell', '-cell', cell)
+            mounts.mount("%(afs)s/.%(cell)s" % locals(), 'root.cell', '-cell', cell, '-rw')
+            mounts.mount("%(afs)s/.%(cell)s/.afs" % locals(), 'root.afs', '-rw') # for dynroot clients
         else:
-            self._mount("%(afs)s/.%(cell)s/.afs" % locals(), 'root.afs', '-rw')
-            self._mount("%(afs)s/.%(cell)s/.afs/%(cell)s" % locals(), 'root.cell', '-cell', cell)
-            self._mount("%(afs)s/.%(cell)s/.afs/.%(cell)s" % locals(), 'root.cell', '-cell', cell, '-rw')
-        fs('checkvolumes')
+            mounts.mount("%(afs)s/.%(cell)s/.afs" % locals(), 'root.afs', '-rw')
+            mounts.mount("%(afs)s/.%(cell)s/.afs/%(cell)s" % locals(), 'root.cell', '-cell', cell)
+            mounts.mount("%(afs)s/.%(cell)s/.afs/.%(cell)s" % locals(), 'root.cell', '-cell', cell, '-rw')
 
         # Grant global read and list rights to the root /afs and /afs/<cell> paths.
         if not dynroot:
-            fs('setacl', '-dir', "%(afs)s" % locals(), '-acl', 'system:anyuser', 'read')
-            fs('setacl', '-dir', "%(afs)s/.%(cell)s" % locals(), '-acl', 'system:anyuser', 'read')
+            mounts.setacl("%(afs)s" % locals(), 'system:anyuser', 'read')
+            mounts.setacl("%(afs)s/.%(cell)s" % locals(), 'system:anyuser', 'read')
         else:
-            fs('setacl', '-dir', "%(afs)s/.%(cell)s/.afs" % locals(), '-acl', 'system:anyuser', 'read')
-            fs('setacl', '-dir', "%(afs)s/.%(cell)s" % locals(), '-acl', 'system:anyuser', 'read')
+            mounts.setacl("%(afs)s/.%(cell)s/.afs" % locals(), 'system:anyuser', 'read')
+            mounts.setacl("%(afs)s/.%(cell)s" % locals(), 'system:anyuser', 'read')
+
+        # Spread the top level volumes over the fileservers with the placement
+        # policy. The volumes are created and replicated concurrently, then
+        # mounted in the batch.
+        specs = []
+        vldb = self.load_vldb()
+        for name in uniq(volumes):
+            if vldb.exists(name):
+                specs.append((name, None, None)) # Already placed.
+            else:
+                server, partition = self.placement.choose()
+                specs.append((name, server, partition))
+        bulk = afsutil.volumes.BulkVolumes(workers=self.workers, per_server=self.per_server,
+                                           replicas=self.replicas, placement=self.placement,
+                                           gate=self.write_gate, vldb=vldb)
+        results = bulk.run(specs)
+        self._mount_volumes(mounts, afs, [r.item[0] for r in results if r.ok])
+        mounts.run()
+        vos('release', '-id', 'root.cell')
+        fs('checkvolumes')
+        failed = [r.item[0] for r in results if not r.ok]
+        if failed:
+            s = 's' if len(failed) > 1 else ''
+            raise AssertionError("Failed to setup volume%s %s" % (s, ', '.join(failed)))
 
-        # Place top level volumes on the same fileserver as the root volumes.
+    def _mount_volumes(self, mounts, afs, volumes):
+        """Add the mount points and acls of top level volumes to a batch."""
+        cell = self.cell
         for name in volumes:
-            self.fs[0].create_volume(name)
-            self._create_replica(name)
-            self._mount("%(afs)s/.%(cell)s/%(name)s" % locals(), name, '-cell', cell)
-            self._mount("%(afs)s/.%(cell)s/.%(name)s" % locals(), name, '-cell', cell, '-rw')
-            fs('setacl', '-dir', "%(afs)s/.%(cell)s/.%(name)s" % locals(), '-acl', 'system:anyuser', 'read')
+            mounts.mount("%(afs)s/.%(cell)s/%(name)s" % locals(), name, '-cell', cell)
+            mounts.mount("%(afs)s/.%(cell)s/.%(name)s" % locals(), name, '-cell', cell, '-rw')
+            mounts.setacl("%(afs)s/.%(cell)s/.%(name)s" % locals(), 'system:anyuser', 'read')
+
+    @contextual
+    def mount_volumes(self, volumes):
+        """Mount top level volumes which have already been created.
+
+        This is the mount step of mtroot() alone. The root volumes must
+        already be mounted. The mount points and acls are made in one batch,
+        then root.cell is released and the client is told to check the
+        volumes once.
+        """
+        afs = afs_mountpoint()
+        if afs is None:
+            raise AssertionError("Unable to mount volumes; afs is not mounted!")
+        if self._wscell() != self.cell:
+            raise AssertionError("Client side ThisCell file does not match the cell name!")
+        self.login(self.admins[0])
+        mounts = MountBatch(workers=min(self.workers, 4))
+        self._mount_volumes(mounts, afs, uniq(volumes))
+        mounts.run()
         vos('release', '-id', 'root.cell')
         fs('checkvolumes')
 
 def newcell(**kwargs):
+    fresh = kwargs.pop('fresh', False)
     cell = Cell(**kwargs)
+    if fresh and cell.journal and os.path.exists(cell.journal):
+        logger.info("Removing journal %s.", cell.journal)
+        os.remove(cell.journal)
     cell.newcell()
 
+def adddb(**kwargs):
+    hostnames = kwargs.pop('hostnames')
+    fileservers = kwargs.pop('fs', [])
+    cell = Cell.current(**kwargs)
+    cell.adddb(hostnames, fileservers=fileservers)
+
+def client_cellhosts(cell):
+    """Return the database servers of a cell from the client CellServDB."""
+    path = os.path.join(AFS_DATA_DIR, 'CellServDB')
+    if not os.path.exists(path):
+        return []
+    entry = afsutil.cellservdb.load(path).lookup(cell)
+    if entry is None:
+        return []
+    return entry.hostnames()
+
 def mtroot(**kwargs):
     top = kwargs.pop('top', [])
+    if not kwargs.get('db'):
+        # Check the database servers known to the client, since mtroot may
+        # be run on a host which is not the sync site, or is a client only.
+        kwargs['db'] = client_cellhosts(kwargs.get('cell', 'localcell'))
+        if not kwargs['db']:
+            logger.info("Database servers of cell %s are not known; not waiting for the sync site.",
+                        kwargs.get('cell', 'localcell'))
+            kwargs['gate'] = False
     cell = Cell(**kwargs)
     cell.mtroot(top)
 
+def read_hostnames(path):
+    """Read a list of hostnames from a file.
+
+    Hostnames are separated by whitespace. Blank lines and text following a
+    '#' are ignored."""
+    hostnames = []
+    with open(path, 'r') as f:
+        for line in f:
+            hostnames.extend(line.split('#', 1)[0].split())
+    return hostnames
+
+def format_results(results):
+    """Format a table of per-host results."""
+    width = max([len('host')] + [len(str(r.item)) for r in results])
+    lines = ["%-*s  %-6s  %8s  %s" % (width, 'host', 'status', 'seconds', 'error')]
+    for r in results:
+        if r.ok:
+            status, error = 'ok', ''
+        else:
+            status, error = 'failed', (str(r.error).splitlines() or [r.error.__class__.__name__])[0]
+        lines.append("%-*s  %-6s  %8.1f  %s" % (width, r.item, status, r.elapsed, error))
+    return "\n".join(lines)
+
 def addfs(**kwargs):
-    hostname = kwargs.pop('hostname', socket.gethostname())
+    hostnames = list(kwargs.pop('hostnames', None) or [])
+    filename = kwargs.pop('file', None)
+    if filename:
+        hostnames.extend(read_hostnames(filename))
+    if not hostnames:
+        hostnames = [socket.gethostname()]
     cell = Cell(**kwargs)
-    cell.addfs(hostname)
+    results = cell.addfs_hosts(hostnames)
+    for line in format_results(results).splitlines():
+        logger.info(line)
+    failed = [r for r in results if not r.ok]
+    if failed:
+        logger.error("Failed to add %d of %d fileservers.", len(failed), len(results))
+        return 1
+    return 0
 
 def login(**kwargs):
     if os.geteuid() == 0:
@@ -0,0 +1,222 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Read, merge, and write CellServDB files.
+
+A CellServDB file lists the database servers of one or more cells:
+
+    >example.com        #Example Cell
+    192.0.2.10          #afs1.example.com
+    192.0.2.11          #afs2.example.com
+
+The file is parsed in a single pass into an index of cell names to host
+entries, and an index of addresses to cell names, so lookups do not rescan
+the file. Files are written to a temporary file which is renamed over the
+destination, so readers never see a partially written file.
+"""
+
+import logging
+import os
+import re
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+class CellServDBError(Exception):
+    """Invalid CellServDB file contents."""
+
+class CellEntry(object):
+    """The database servers of a cell."""
+
+    def __init__(self, name, comment='', hosts=None):
+        """
+        name:    cell name
+        comment: cell description
+        hosts:   list of (address, hostname) tuples
+        """
+        self.name = name
+        self.comment = comment
+        self.hosts = list(hosts or [])
+
+    def addresses(self):
+        return [addr for addr,_ in self.hosts]
+
+    def hostnames(self):
+        """Return the host names, or the addresses of hosts without names."""
+        return [name or addr for addr,name in self.hosts]
+
+    def __eq__(self, other):
+        return sorted(self.addresses()) == sorted(other.addresses())
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return "CellEntry(%r, %r, %r)" % (self.name, self.comment, self.hosts)
+
+class CellServDB(object):
+    """Indexed CellServDB contents."""
+
+    def __init__(self):
+        self._cells = {}    # name -> CellEntry
+        self._order = []    # cell names, in file order
+        self._addrs = {}    # address -> set of cell names
+
+    @classmethod
+    def load(cls, path):
+        """Read a CellServDB file."""
+        csdb = cls()
+        with open(path, 'r') as f:
+            csdb.parse(f, source=path)
+        return csdb
+
+    def parse(self, lines, source='<input>'):
+        """Add the cells from an iterable of CellServDB lines."""
+        entry = None
+        for lineno,line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('>'):
+                fields = line[1:].split('#', 1)
+                name = fields[0].strip()
+                if not name or len(name.split()) != 1:
+                    raise CellServDBError("Invalid cell name on line %d of %s." % (lineno, source))
+                comment = fields[1].strip() if len(fields) > 1 else ''
+                if name in self._cells:
+                    logger.warning("Duplicate cell %s on line %d of %s.", name, lineno, source)
+                    entry = self._cells[name]
+                else:
+                    entry = self.add(name, comment=comment)
+                continue
+            fields = line.split('#', 1)
+            addr = fields[0].strip().strip('[]') # Clone servers are in brackets.
+            if not addr:
+                continue # comment line
+            if entry is None:
+                raise CellServDBError("Host entry before first cell on line %d of %s." % (lineno, source))
+            if not re.match(r'^\d+\.\d+\.\d+\.\d+$', addr):
+                raise CellServDBError("Invalid address '%s' on line %d of %s." % (addr, lineno, source))
+            hostname = fields[1].strip() if len(fields) > 1 else ''
+            self.add_host(entry.name, addr, hostname)
+        return self
+
+    def add(self, name, comment='', hosts=None):
+        """Add or replace a cell entry."""
+        if name in self._cells:
+            self.remove(name)
+        entry = CellEntry(name, comment)
+        self._cells[name] = entry
+        self._order.append(name)
+        for addr,hostname in hosts or []:
+            self.add_host(name, addr, hostname)
+        return entry
+
+    def add_host(self, name, addr, hostname=''):
+        """Add a host to a cell entry, ignoring duplicate addresses."""
+        entry = self._cells[name]
+        if addr in entry.addresses():
+            return
+        entry.hosts.append((addr, hostname))
+        self._addrs.setdefault(addr, set()).add(name)
+
+    def remove(self, name):
+        """Remove a cell entry."""
+        entry = self._cells.pop(name)
+        self._order.remove(name)
+        for addr in entry.addresses():
+            self._addrs[addr].discard(name)
+            if not self._addrs[addr]:
+                del self._addrs[addr]
+
+    def lookup(self, name):
+        """Return the CellEntry of a cell, or None if not found."""
+        return self._cells.get(name)
+
+    def hosts(self, name):
+        """Return the list of (address, hostname) tuples of a cell."""
+        entry = self._cells.get(name)
+        if entry is None:
+            return []
+        return list(entry.hosts)
+
+    def cells_for_address(self, addr):
+        """Return the names of the cells served by an address."""
+        return sorted(self._addrs.get(addr, []))
+
+    def cells(self):
+        """Return the cell names in file order."""
+        return list(self._order)
+
+    def __contains__(self, name):
+        return name in self._cells
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __iter__(self):
+        for name in self._order:
+            yield self._cells[name]
+
+    def lines(self):
+        """Generate the lines of the CellServDB file."""
+        for entry in self:
+            if entry.comment:
+                yield ">%s    #%s\n" % (entry.name, entry.comment)
+            else:
+                yield ">%s\n" % (entry.name)
+            for addr,hostname in entry.hosts:
+                yield "%s         #%s\n" % (addr, hostname)
+
+    def write(self, path, mode=0644):
+        """Write the CellServDB file atomically."""
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd,tmp = tempfile.mkstemp(prefix='.CellServDB.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(self.lines())
+            os.chmod(tmp, mode)
+            os.rename(tmp, path)
+        except:
+            os.remove(tmp)
+            raise
+
+def merge(local, dist):
+    """Merge two CellServDBs; the local entries take precedence.
+
+    Returns the merged CellServDB and the list of names of the cells which are
+    in both with different hosts."""
+    merged = CellServDB()
+    conflicts = []
+    for entry in local:
+        merged.add(entry.name, entry.comment, entry.hosts)
+    for entry in dist:
+        other = merged.lookup(entry.name)
+        if other is None:
+            merged.add(entry.name, entry.comment, entry.hosts)
+        elif other != entry:
+            conflicts.append(entry.name)
+            logger.warning("Cell %s hosts differ in the local and dist CellServDB; using local hosts.",
+                           entry.name)
+    return merged, conflicts
+
+def load(path):
+    """Read a CellServDB file."""
+    return CellServDB.load(path)
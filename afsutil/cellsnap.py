@@ -0,0 +1,285 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Save and restore the state of a single host test cell.
+
+A cell snapshot is a compressed tar file of the server configuration, the
+ubik databases, the BosConfig, the vice partitions and the client
+configuration of a cell which has already been setup, for example with
+newcell and mtroot. Restoring a snapshot replaces the setup steps and their
+quorum waits, so a fresh test cell is ready as soon as the servers start.
+The OpenAFS binaries must already be installed.
+
+Files with the same contents are stored once; the copies are written as
+tar hard links to the first file and are copied back as separate files on
+restore, so the restored volumes do not share data. Files which are
+actually hard linked, such as the namei clones, stay linked.
+
+The cell and the host may be renamed on restore. The fileserver registers
+its new addresses in the vldb when it starts, but the service key is not
+changed, so a cell which is renamed needs a new key (see ktsetkey).
+"""
+
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import stat
+import tarfile
+import time
+
+from afsutil.system import is_running, mkdirp
+from afsutil.transarc import AFS_CONF_DIR, AFS_DB_DIR, AFS_LOCAL_DIR, AFS_DATA_DIR
+from afsutil.cellservdb import CellServDB
+from afsutil.resolver import resolve
+from afsutil.purge import Purger
+from afsutil.parallel import DEFAULT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'cellsnap.json'
+LOCAL_FILES = ('BosConfig', 'sysid')
+CLIENT_FILES = ('ThisCell', 'CellServDB', 'CellServDB.local', 'CellServDB.dist', 'cacheinfo')
+
+def _join(root, path):
+    return os.path.join(root, path.lstrip('/'))
+
+def _walk(path):
+    """Generate the directory and its contents, parents first."""
+    yield path
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in dirnames + sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+def sources(root='/'):
+    """Return the paths to be saved, relative to root."""
+    paths = []
+    for d in (AFS_CONF_DIR, AFS_DB_DIR):
+        if os.path.isdir(_join(root, d)):
+            paths.extend(_walk(_join(root, d)))
+    for d, names in ((AFS_LOCAL_DIR, LOCAL_FILES), (AFS_DATA_DIR, CLIENT_FILES)):
+        for name in names:
+            path = _join(root, os.path.join(d, name))
+            if os.path.isfile(path):
+                paths.append(path)
+    for part in sorted(glob.glob(_join(root, '/vicep*'))):
+        if os.path.isdir(part):
+            paths.extend(_walk(part))
+    return [os.path.relpath(p, root) for p in paths]
+
+def _digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def duplicates(root, names):
+    """Find the files with the same contents.
+
+    Only the files with the same size are read. Files which are already hard
+    links to each other are left to tarfile.
+
+    returns: dict of name: name of the first file with the same contents
+    """
+    by_size = {}
+    inodes = set()
+    for name in names:
+        st = os.lstat(os.path.join(root, name))
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+            continue
+        if st.st_nlink > 1:
+            if (st.st_dev, st.st_ino) in inodes:
+                continue
+            inodes.add((st.st_dev, st.st_ino))
+        by_size.setdefault(st.st_size, []).append(name)
+    dups = {}
+    for names in by_size.values():
+        if len(names) < 2:
+            continue
+        first = {}
+        for name in names:
+            digest = _digest(os.path.join(root, name))
+            if digest in first:
+                dups[name] = first[digest]
+            else:
+                first[digest] = name
+    return dups
+
+def _thiscell(root):
+    path = _join(root, os.path.join(AFS_CONF_DIR, 'ThisCell'))
+    if not os.path.isfile(path):
+        raise AssertionError("Server ThisCell file %s not found." % path)
+    with open(path) as f:
+        return f.read().strip()
+
+def _servers_running(root):
+    return root == '/' and is_running('bosserver')
+
+def save(path, root='/'):
+    """Write a snapshot of the cell to a compressed tar file.
+
+    returns: the manifest dict
+    """
+    if _servers_running(root):
+        raise AssertionError("The servers are running; run 'afsutil stop server' before saving.")
+    start = time.time()
+    cell = _thiscell(root)
+    csdb = _join(root, os.path.join(AFS_CONF_DIR, 'CellServDB'))
+    hosts = CellServDB.load(csdb).hosts(cell) if os.path.isfile(csdb) else []
+    names = sources(root)
+    dups = duplicates(root, names)
+    manifest = {
+        'version': 1,
+        'cell': cell,
+        'hosts': hosts,
+        'created': time.time(),
+        'partitions': sorted(n for n in names if os.path.dirname(n) == '' and n.startswith('vicep')),
+        'files': len(names),
+        'duplicates': dups,
+    }
+    tmp = "%s.tmp" % path
+    tar = tarfile.open(tmp, 'w:gz', compresslevel=6)
+    try:
+        data = json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8')
+        info = tarfile.TarInfo(MANIFEST)
+        info.size = len(data)
+        info.mtime = int(manifest['created'])
+        tar.addfile(info, io.BytesIO(data))
+        for name in names:
+            if name in dups:
+                info = tar.gettarinfo(os.path.join(root, name), name)
+                info.type = tarfile.LNKTYPE
+                info.linkname = dups[name]
+                info.size = 0
+                tar.addfile(info)
+            else:
+                tar.add(os.path.join(root, name), name, recursive=False)
+    finally:
+        tar.close()
+    os.rename(tmp, path)
+    logger.info("Saved %d files of cell %s to %s in %.1f seconds; %d duplicate files stored once.",
+                len(names), cell, path, time.time() - start, len(dups))
+    return manifest
+
+def _clear(root, manifest):
+    """Remove the current databases and volumes before restoring."""
+    dirs = [_join(root, d) for d in [AFS_DB_DIR] + ['/' + p for p in manifest['partitions']]]
+    dirs = [d for d in dirs if os.path.isdir(d)]
+    if dirs:
+        Purger(workers=DEFAULT_WORKERS).purge(dirs, keep=True)
+
+def _rename(root, manifest, cell=None, hostname=None, address=None):
+    """Change the cell name and the host in the restored configuration."""
+    if not cell and not hostname:
+        return
+    old = manifest['cell']
+    new = cell or old
+    old_hosts = [tuple(h) for h in manifest['hosts']]
+    if hostname:
+        if address is None:
+            address = resolve(hostname)[0]
+        new_hosts = [(address, hostname)]
+    else:
+        new_hosts = old_hosts
+    for d in (AFS_CONF_DIR, AFS_DATA_DIR):
+        if cell:
+            path = _join(root, os.path.join(d, 'ThisCell'))
+            if os.path.isfile(path):
+                with open(path, 'w') as f:
+                    f.write("%s\n" % new)
+        for name in ('CellServDB', 'CellServDB.local'):
+            path = _join(root, os.path.join(d, name))
+            if not os.path.isfile(path) or os.path.islink(path):
+                continue
+            csdb = CellServDB.load(path)
+            entry = csdb.lookup(old)
+            if entry is None:
+                continue
+            csdb.remove(old)
+            csdb.add(new, comment=entry.comment, hosts=new_hosts)
+            csdb.write(path)
+    if cell and cell != old:
+        logger.warning("Renamed cell %s to %s; set a service key for the new cell with ktsetkey.", old, new)
+    if hostname:
+        logger.info("Changed the cell hosts to %s.", ", ".join("%s (%s)" % (n, a) for a, n in new_hosts))
+
+def restore(path, root='/', cell=None, hostname=None, address=None):
+    """Restore a cell snapshot.
+
+    path:     snapshot file written by save()
+    root:     directory to restore into
+    cell:     new cell name
+    hostname: new host name
+    address:  new host address; default is to resolve the hostname
+
+    returns: the manifest dict
+    """
+    if _servers_running(root):
+        raise AssertionError("The servers are running; run 'afsutil stop server' before restoring.")
+    start = time.time()
+    tar = tarfile.open(path, 'r|gz') # Stream; the members are read in order.
+    try:
+        member = tar.next()
+        if member is None or member.name != MANIFEST:
+            raise AssertionError("%s is not a cell snapshot." % path)
+        manifest = json.loads(tar.extractfile(member).read().decode('utf-8'))
+        _clear(root, manifest)
+        dups = manifest['duplicates']
+        while True:
+            member = tar.next()
+            if member is None:
+                break
+            if member.name in dups:
+                target = os.path.join(root, member.name)
+                mkdirp(os.path.dirname(target))
+                shutil.copy2(os.path.join(root, dups[member.name]), target)
+                if os.geteuid() == 0:
+                    os.lchown(target, member.uid, member.gid)
+            else:
+                tar.extract(member, root)
+    finally:
+        tar.close()
+    _rename(root, manifest, cell=cell, hostname=hostname, address=address)
+    logger.info("Restored %d files of cell %s from %s in %.1f seconds.",
+                manifest['files'], cell or manifest['cell'], path, time.time() - start)
+    return manifest
+
+def cellsnap(**kwargs):
+    action = kwargs['action']
+    path = kwargs['path']
+    if action == 'save':
+        save(path)
+    elif action == 'restore':
+        hostname = kwargs.get('hostname')
+        if kwargs.get('rename_host') and not hostname:
+            hostname = socket.gethostname()
+        restore(path, cell=kwargs.get('cell'), hostname=hostname, address=kwargs.get('address'))
+        if kwargs.get('start'):
+            from afsutil.service import start
+            start(components=['server', 'client'])
+    else:
+        raise ValueError("Unknown action '%s'." % action)
+    return 0
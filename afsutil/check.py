@@ -25,6 +25,7 @@ import re
 import socket
 import sys
 from afsutil.system import network_interfaces
+from afsutil.resolver import resolve
 
 logger = logging.getLogger(__name__)
 
@@ -68,7 +69,7 @@ def fix_hosts_file():
 def check_host_address():
     """Verify our hostname resolves to a useable address."""
     hostname = socket.gethostname()
-    ip = socket.gethostbyname(hostname)
+    ip = resolve(hostname)[0]
     ips = network_interfaces()
     if len(ips) == 0:
         sys.stderr.write("Warning: Unable to detect any non-loopback network interfaces.\n")
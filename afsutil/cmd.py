@@ -20,69 +20,46 @@
 
 """Wrappers to invoke AFS command line tools."""
 
-import os
 import logging
-import time
 
-from afsutil.system import sh, which, CommandFailed
-from afsutil.transarc import AFS_SRV_BIN_DIR, AFS_SRV_SBIN_DIR, AFS_WS_DIR
+from afsutil.context import current, DEFAULT
 
 logger = logging.getLogger(__name__)
 
-# Common hidding places.
-PATHS = [
-    '/usr/bin',
-    '/usr/sbin',
-    AFS_SRV_BIN_DIR,
-    AFS_SRV_SBIN_DIR,
-    os.path.join(AFS_WS_DIR, 'bin'),
-    os.path.join(AFS_WS_DIR, 'etc'),
-    '/usr/kerberos/bin',
-    '/usr/heimdal/bin',
-]
-
-_cmdpath = {
-}
+# The command paths of the default context.
+_cmdpath = DEFAULT.paths
 
 def setpath(cmd, path):
-    _cmdpath[cmd] = path
+    """Set the path of a command in the active context."""
+    current().setpath(cmd, path)
 
-def _run(cmd, args=None, quiet=False, retry=0, wait=1, cleanup=None):
+def _run(cmd, args=None, quiet=False, retry=None, wait=None, cleanup=None, context=None):
     """Execute a command and return the output as a string.
 
     cmd:     command to be executed
     args:    list of command line arguments
     quiet:   do not log command and output
-    retry:   number of retry attempts, 0 for none
-    wait:    delay between retry attempts
+    retry:   number of retry attempts, 0 for none; default from the context
+    wait:    delay between retry attempts; default from the context
     cleanup: cleanup function to run before retry
+    context: context to run the command; default is the active context
 
     returns: command output as a string
 
     Raises a CommandFailed exception if the command exits with
     a non-zero exit code."""
-    count = 0 # retry counter
-    if args is None:
-        args = []
-    elif not isinstance(args, list):
-        args = list(args)
-    cmd = _cmdpath.get(cmd, cmd)
-    args.insert(0, which(cmd, raise_errors=True, extra_paths=PATHS))
-    while True:
-        try:
-            lines = sh(*args, quite=quiet)
-            break
-        except CommandFailed as cf:
-            if count < retry:
-                count += 1
-                logger.info("Retrying %s command in %d seconds; retry %d of %d.",
-                    cmd, wait, count, retry)
-                time.sleep(wait)
-                if cleanup:
-                    cleanup()  # Try to cleanup the mess from the last failure.
-            else:
-                raise cf
-    return "\n".join(lines)
+    if context is None:
+        context = current()
+    return context.run(cmd, *(args or []), quiet=quiet, retry=retry, wait=wait, cleanup=cleanup)
+
+def stream(cmd, *args, **kwargs):
+    """Execute a command and generate the output lines as they are read.
+
+    The -localauth option is added to bos, vos, and pts commands when
+    running as root. Raises a CommandFailed exception after the last line
+    if the command exits with a non-zero code."""
+    context = kwargs.pop('context', None) or current()
+    return context.stream(cmd, *args, **kwargs)
 
 def asetkey(*args, **kwargs):
     return _run('asetkey', args=args, **kwargs)
@@ -94,21 +71,12 @@ def aklog(*args, **kwargs):
     return _run('aklog', args=args, **kwargs)
 
 def bos(*args, **kwargs):
-    if os.geteuid() == 0:
-        args = list(args)
-        args.append('-localauth')
     return _run('bos', args=args, **kwargs)
 
 def vos(*args, **kwargs):
-    if os.geteuid() == 0:
-        args = list(args)
-        args.append('-localauth')
     return _run('vos', args=args, **kwargs)
 
 def pts(*args, **kwargs):
-    if os.geteuid() == 0:
-        args = list(args)
-        args.append('-localauth')
     return _run('pts', args=args, **kwargs)
 
 def fs(*args, **kwargs):
@@ -0,0 +1,221 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""The settings used to run commands.
+
+A Context holds the command paths, environment, working directory, retry
+and timeout policy, and an optional tracer used to run the AFS commands and
+other programs. Nothing is changed in the process, so several contexts may
+be used concurrently in one process.
+
+The module level functions in afsutil.cmd run the commands with the active
+context of the calling thread, which is the default context unless another
+has been activated with a with statement:
+
+    context = Context(paths={'vos': '/opt/afs/bin/vos'}, timeout=600)
+    with context:
+        vos('listvldb')
+
+The threads started by afsutil.parallel.parallel() run with the context
+of the caller.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from afsutil.system import sh, sh_lines, which, CommandFailed
+
+logger = logging.getLogger(__name__)
+
+def search_paths():
+    """Return the common hiding places of the afs programs."""
+    # Imported here since afsutil.transarc imports modules which use contexts.
+    from afsutil.transarc import AFS_SRV_BIN_DIR, AFS_SRV_SBIN_DIR, AFS_WS_DIR
+    return [
+        '/usr/bin',
+        '/usr/sbin',
+        AFS_SRV_BIN_DIR,
+        AFS_SRV_SBIN_DIR,
+        os.path.join(AFS_WS_DIR, 'bin'),
+        os.path.join(AFS_WS_DIR, 'etc'),
+        '/usr/kerberos/bin',
+        '/usr/heimdal/bin',
+    ]
+
+# Commands which accept the -localauth option.
+LOCALAUTH_COMMANDS = ('bos', 'vos', 'pts')
+
+class Context(object):
+    """Command paths, environment and policy for running commands."""
+
+    def __init__(self, paths=None, env=None, cwd=None, localauth=None,
+                 retry=0, wait=1, timeout=None, tracer=None, extra_paths=None):
+        """
+        paths:       dict of command names to program paths
+        env:         dict of environment variables; default is os.environ
+        cwd:         working directory of commands; default is the current directory
+        localauth:   add -localauth to bos, vos and pts; default is when running as root
+        retry:       default number of retry attempts of afs commands
+        wait:        default delay between retry attempts
+        timeout:     seconds before a command is killed; default is no limit
+        tracer:      function called with (cmdline, code, elapsed) after each command
+        extra_paths: directories searched for programs after the PATH;
+                     default is search_paths()
+        """
+        self.paths = dict(paths or {})
+        self.env = None if env is None else dict(env)
+        self.cwd = cwd
+        self.localauth = localauth
+        self.retry = retry
+        self.wait = wait
+        self.timeout = timeout
+        self.tracer = tracer
+        self.extra_paths = None if extra_paths is None else list(extra_paths)
+
+    def copy(self, **changes):
+        """Return a new context with the same settings, except the changes given."""
+        settings = dict(paths=self.paths, env=self.env, cwd=self.cwd, localauth=self.localauth,
+                        retry=self.retry, wait=self.wait, timeout=self.timeout,
+                        tracer=self.tracer, extra_paths=self.extra_paths)
+        settings.update(changes)
+        return Context(**settings)
+
+    def setpath(self, cmd, path):
+        self.paths[cmd] = path
+
+    def getenv(self, name, default=None):
+        env = os.environ if self.env is None else self.env
+        return env.get(name, default)
+
+    def setenv(self, name, value):
+        """Set an environment variable for the commands run in this context."""
+        if self.env is None:
+            self.env = dict(os.environ)
+        self.env[name] = value
+
+    def use_localauth(self):
+        if self.localauth is None:
+            return os.geteuid() == 0
+        return self.localauth
+
+    def which(self, cmd):
+        """Return the full path of a command."""
+        extra_paths = self.extra_paths
+        if extra_paths is None:
+            extra_paths = search_paths()
+        return which(self.paths.get(cmd, cmd), raise_errors=True,
+                     extra_paths=extra_paths, env=self.env)
+
+    def _kwargs(self, kwargs):
+        kwargs.setdefault('env', self.env)
+        kwargs.setdefault('cwd', self.cwd)
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('tracer', self.tracer)
+        return kwargs
+
+    def sh(self, *args, **kwargs):
+        """Run a program in this context; see afsutil.system.sh()."""
+        return sh(*args, **self._kwargs(kwargs))
+
+    def sh_lines(self, *args, **kwargs):
+        """Run a program in this context; see afsutil.system.sh_lines()."""
+        return sh_lines(*args, **self._kwargs(kwargs))
+
+    def _args(self, cmd, args):
+        args = [self.which(cmd)] + list(args)
+        if cmd in LOCALAUTH_COMMANDS and self.use_localauth():
+            args.append('-localauth')
+        return args
+
+    def run(self, cmd, *args, **kwargs):
+        """Execute a command and return the output as a string.
+
+        cmd:     command to be executed
+        args:    command line arguments
+        quiet:   do not log command and output
+        retry:   number of retry attempts; default is the context retry
+        wait:    delay between retry attempts; default is the context wait
+        cleanup: cleanup function to run before retry
+
+        Raises a CommandFailed exception if the command exits with
+        a non-zero exit code."""
+        quiet = kwargs.get('quiet', False)
+        retry = kwargs.get('retry')
+        wait = kwargs.get('wait')
+        cleanup = kwargs.get('cleanup')
+        if retry is None:
+            retry = self.retry
+        if wait is None:
+            wait = self.wait
+        count = 0 # retry counter
+        args = self._args(cmd, args)
+        while True:
+            try:
+                lines = self.sh(*args, quiet=quiet)
+                break
+            except CommandFailed as cf:
+                if count < retry:
+                    count += 1
+                    logger.info("Retrying %s command in %d seconds; retry %d of %d.",
+                        cmd, wait, count, retry)
+                    time.sleep(wait)
+                    if cleanup:
+                        cleanup()  # Try to cleanup the mess from the last failure.
+                else:
+                    raise cf
+        return "\n".join(lines)
+
+    def stream(self, cmd, *args, **kwargs):
+        """Execute a command and generate the output lines as they are read."""
+        return self.sh_lines(*self._args(cmd, args), quiet=kwargs.get('quiet', False))
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _stack().pop()
+        return False
+
+DEFAULT = Context()
+_local = threading.local()
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+def current():
+    """Return the active context of the calling thread."""
+    stack = _stack()
+    if stack:
+        return stack[-1]
+    return DEFAULT
+
+def contextual(method):
+    """Run a method with the context of its object active."""
+    def wrapper(self, *args, **kwargs):
+        with self.context:
+            return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
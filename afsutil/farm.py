@@ -0,0 +1,189 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Setup several independent test cells concurrently.
+
+Each cell is described by a cell spec file (see afsutil.reconcile) with an
+optional farm section which gives how to run afsutil for that cell and the
+extra arguments of the setup steps:
+
+    [farm]
+    command = ssh -o BatchMode=yes afs01 sudo -n afsutil
+    keytab = /tmp/afsutil/example.keytab
+    install = --dist transarc --force
+    paths = fs=/usr/afs/bin/fs vos=/usr/afs/bin/vos
+    steps = install ktcreate ktsetkey start-server newcell start-client mtroot
+
+The steps of a cell are run one after another, the same as the
+examples/afsutil-setup.sh script, while the cells are setup concurrently.
+Each step is a separate afsutil process, so the command paths, options and
+other module state of one cell are never seen by another. The output of
+each cell is logged with the cell name as a prefix.
+"""
+
+import logging
+import shlex
+import sys
+import time
+
+try:
+    from configparser import ConfigParser # python3
+except ImportError:
+    from ConfigParser import ConfigParser # python2
+
+from afsutil.system import sh
+from afsutil.parallel import parallel
+from afsutil.reconcile import load_spec
+
+logger = logging.getLogger(__name__)
+
+STEPS = ('install', 'ktcreate', 'ktsetkey', 'start-server', 'newcell', 'start-client', 'mtroot')
+
+def _options(options, names=None, exclude=()):
+    args = []
+    for name, value in sorted(options.items()):
+        if (names is None or name in names) and name not in exclude:
+            args.extend(['-o', "%s=%s" % (name, value)])
+    return args
+
+class FarmCell(object):
+    """The setup steps of one cell of a farm."""
+
+    def __init__(self, path):
+        self.path = path
+        self.cell, self.volumes = load_spec(path)
+        self.name = self.cell['cell']
+        parser = ConfigParser()
+        parser.read(path)
+        def get(option, default=''):
+            if parser.has_option('farm', option):
+                return parser.get('farm', option)
+            return default
+        self.command = shlex.split(get('command', 'afsutil'))
+        self.keytab = get('keytab', '/tmp/afsutil/%s.keytab' % self.name)
+        self.extra = dict((s, shlex.split(get(s))) for s in STEPS)
+        self.paths = get('paths').split()
+        self.steps = get('steps').split() or list(STEPS)
+        for step in self.steps:
+            if step not in STEPS:
+                raise AssertionError("Unknown step '%s' in %s." % (step, path))
+
+    def args(self, step):
+        """Return the afsutil command line arguments of a step."""
+        cell = self.cell
+        realm = cell.get('realm', cell['cell'].upper())
+        admin = cell.get('admin', (cell.get('admins') or ['admin'])[0])
+        db = cell.get('db', [])
+        fs = cell.get('fs', [])
+        options = cell.get('options', {})
+        paths = []
+        for path in self.paths:
+            paths.extend(['-p', path])
+        if step == 'install':
+            args = ['install', '--components', 'server', 'client',
+                    '--cell', cell['cell'], '--realm', realm, '--hosts'] + db + \
+                    _options(options, names=('afsd', 'bosserver'))
+        elif step == 'ktcreate':
+            args = ['ktcreate', '--cell', cell['cell'], '--realm', realm, '--keytab', self.keytab]
+        elif step == 'ktsetkey':
+            args = ['ktsetkey', '--cell', cell['cell'], '--realm', realm, '--keytab', self.keytab,
+                    '--format', 'detect'] + paths
+        elif step == 'start-server':
+            args = ['start', 'server']
+        elif step == 'start-client':
+            args = ['start', 'client']
+        elif step == 'newcell':
+            args = ['newcell', '--cell', cell['cell'], '--realm', realm, '--admin', admin,
+                    '--db'] + db + ['--fs'] + fs + _options(options, exclude=('afsd',)) + paths
+        elif step == 'mtroot':
+            args = ['mtroot', '--cell', cell['cell'], '--realm', realm, '--admin', admin,
+                    '--akimpersonate', '--keytab', self.keytab, '--fs'] + fs
+            if self.volumes:
+                args += ['--top'] + self.volumes
+            if 'replicas' in cell:
+                args += ['--replicas', str(cell['replicas'])]
+            if 'placement' in cell:
+                args += ['--placement', cell['placement']]
+            args += _options(options, names=('afsd',)) + paths
+        return args + self.extra[step]
+
+    def setup(self):
+        """Run the steps of this cell in order.
+
+        returns: list of (step, seconds) for the steps completed
+        """
+        timings = []
+        for step in self.steps:
+            logger.info("%s: starting %s.", self.name, step)
+            start = time.time()
+            sh(*(self.command + self.args(step)), output=False, prefix=self.name)
+            timings.append((step, time.time() - start))
+        return timings
+
+class Farm(object):
+    """Independent cells to be setup concurrently."""
+
+    def __init__(self, paths, workers=None):
+        self.cells = [FarmCell(path) for path in paths]
+        names = [c.name for c in self.cells]
+        duplicates = sorted(set(n for n in names if names.count(n) > 1))
+        if duplicates:
+            raise AssertionError("Duplicate cells in farm: %s" % ", ".join(duplicates))
+        self.workers = workers or max(1, len(self.cells))
+
+    def setup(self):
+        """Setup the cells concurrently.
+
+        A failed cell does not stop the others.
+
+        returns: list of parallel.Result objects, one per FarmCell
+        """
+        return parallel(lambda c: c.setup(), self.cells, workers=self.workers, raise_errors=False)
+
+def format_timings(results):
+    """Format a table of the step timings of each cell."""
+    lines = []
+    width = max([len('cell')] + [len(r.item.name) for r in results])
+    steps = [s for s in STEPS if any(s in r.item.steps for r in results)]
+    lines.append("%-*s  %s  %8s  %s" % (width, 'cell', "  ".join("%12s" % s for s in steps), 'total', 'status'))
+    for r in results:
+        timings = dict(r.value or [])
+        cols = ["%12s" % ("%.1f" % timings[s] if s in timings else '-') for s in steps]
+        status = 'ok' if r.ok else 'failed: %s' % (str(r.error).splitlines() or [''])[0]
+        lines.append("%-*s  %s  %8.1f  %s" % (width, r.item.name, "  ".join(cols), r.elapsed, status))
+    return "\n".join(lines)
+
+def farm(**kwargs):
+    f = Farm(kwargs['specs'], workers=kwargs.get('workers'))
+    if kwargs.get('dry_run'):
+        for cell in f.cells:
+            for step in cell.steps:
+                sys.stdout.write("%s: %s\n" % (cell.name, " ".join(cell.command + cell.args(step))))
+        return 0
+    start = time.time()
+    results = f.setup()
+    for line in format_timings(results).splitlines():
+        logger.info(line)
+    logger.info("Setup %d cells in %.1f seconds.", len(results), time.time() - start)
+    failed = [r for r in results if not r.ok]
+    if failed:
+        logger.error("Failed to setup %d of %d cells.", len(failed), len(results))
+        return 1
+    return 0
@@ -24,7 +24,6 @@ import logging
 import os
 import re
 import shutil
-import socket
 import glob
 import pprint
 import shlex
@@ -33,9 +32,15 @@ from afsutil.system import file_should_exist, \
                            directory_should_exist, \
                            directory_should_not_exist, \
                            network_interfaces, \
-                           mkdirp, touch, cat, sh
+                           mkdirp, touch
 
+from afsutil.cellservdb import CellServDB, merge, load as load_csdb
 from afsutil.misc import lists2dict
+from afsutil.parallel import DEFAULT_WORKERS
+from afsutil.context import current
+from afsutil.purge import purge, scan, stashed
+from afsutil.resolver import resolve, resolve_all
+from afsutil.tuning import CacheTuning, LEGACY_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +110,9 @@ class Installer(object):
                  post_install=None,
                  pre_remove=None,
                  post_remove=None,
+                 workers=DEFAULT_WORKERS,
+                 cache_profile='auto',
+                 context=None,
                  **kwargs):
         """
         dirs: directories for pre/post installation/removal
@@ -121,6 +129,9 @@ class Installer(object):
         post_install: an optional command to run after installation
         pre_remove: an optional command to run before removal
         post_remove: an optional command to run after removal
+        workers: maximum number of threads to purge files
+        cache_profile: cache manager tuning profile name, 'auto', or 'none'
+        context: the afsutil.context.Context to run commands; default is the active context
         """
         if dirs is None: # Default to transarc-style.
             dirs = {
@@ -145,6 +156,10 @@ class Installer(object):
         self.hostnames = hosts
         self.cellhosts = None # Defer to pre-install.
         self.options = lists2dict(options)
+        self.workers = int(workers)
+        self.cache_profile = cache_profile
+        self.cache_tuning = None # Defer to pre-install.
+        self.context = context or current()
         self.scripts = {
             'pre_install': pre_install,
             'post_install': post_install,
@@ -167,13 +182,16 @@ class Installer(object):
         cellhosts = set()
         # Use the addresses from the DNS lookup of the given hostnames.
         # We do not want loopback addresses in the CellServDB file.
-        for name in hostnames: # hosts is a list of names or quad-dot-address strings.
-            logger.info("Looking up ip address of hostname %s." % (name))
-            addr = socket.gethostbyname(name)
-            if addr.startswith('127.'):
+        logger.info("Looking up ip addresses of hostnames %s." % (", ".join(hostnames)))
+        resolved = resolve_all(hostnames) # hosts is a list of names or quad-dot-address strings.
+        for name in hostnames:
+            addrs = [a for a in resolved[name] if not a.startswith('127.')]
+            if not addrs:
                 raise AssertionError("Loopback address %s given for hostname %s."
-                                     " Please check your /etc/hosts file." % (addr,name))
-            cellhosts.add((addr, name))
+                                     " Please check your /etc/hosts file." % (",".join(resolved[name]), name))
+            if len(addrs) > 1:
+                logger.info("Hostname %s has addresses %s; using %s.", name, ",".join(addrs), addrs[0])
+            cellhosts.add((addrs[0], name))
         return list(cellhosts)
 
     def _detect_cellhosts(self):
@@ -186,7 +204,7 @@ class Installer(object):
         name = os.uname()[1]
         logger.info("Trying to detect cellhosts.")
         logger.info("Looking up ip address of hostname %s." % (name))
-        addr = socket.gethostbyname(name)
+        addr = resolve(name)[0]
         if addr.startswith('127.'):
             logger.info("Looking up ip address from network interfaces.")
             addrs = network_interfaces()  # should return non-loopback ip addresses.
@@ -225,10 +243,9 @@ class Installer(object):
             os.remove(cellservdb)
         if os.path.islink(thiscell):
             os.remove(thiscell)
-        with open(cellservdb, 'w') as f:
-            f.write(">%s    #Cell name\n" % (cell))
-            for addr,name in hosts:
-                f.write("%s         #%s\n"  % (addr,name))
+        csdb = CellServDB()
+        csdb.add(cell, "Cell name", hosts)
+        csdb.write(cellservdb)
         with open(thiscell, 'w') as f:
             f.write(cell)
 
@@ -244,29 +261,66 @@ class Installer(object):
         with open(dst, 'w') as f:
             f.write("%s:%s:%d\n" % (root, cache, size))
 
-    def _purge_volumes(self):
+    def _volume_paths(self):
+        """Return the volume data to be purged."""
+        paths = []
         for part in glob.glob('/vicep*'):
             if re.match(r'/vicep([a-z]|[a-h][a-z]|i[a-v])$', part):
                 if not os.path.exists(os.path.join(part, "PURGE_VOLUMES")):
                     logger.info("Skipping volume purge in '%s'; PURGE_VOLUMES file not found.", part)
                 else:
                     logger.info("Purging volume data in '%s'.", part)
-                    for vol in glob.glob(os.path.join(part, "*.vol")):
-                        os.remove(vol)
+                    for entry in scan(part):
+                        if entry.name.endswith('.vol'):
+                            paths.append(entry.path)
                     afsidat = os.path.join(part, 'AFSIDat')
                     if os.path.exists(afsidat):
-                        shutil.rmtree(afsidat)
-
-    def _purge_cache(self):
-        if os.path.exists("/usr/vice/cache"):
-            logger.info("Removing cache item files.")
-            remove_file("/usr/vice/cache/CacheItems")
-            remove_file("/usr/vice/cache/CellItems")
-            remove_file("/usr/vice/cache/VolumeItems")
-            logger.info("Removing /usr/vice/cache/D* files.")
-            for d in os.listdir("/usr/vice/cache"):
-                if re.match(r'^D\d+$', d):
-                    remove_files("/usr/vice/cache/%s" % (d), quiet=(not self.verbose))
+                        paths.append(afsidat)
+                    paths.extend(stashed(afsidat)) # Left over from a previous purge.
+        return paths
+
+    def _cache_paths(self):
+        """Return the cache files to be purged."""
+        paths = []
+        cache = self.dirs['AFS_CACHE_DIR']
+        if os.path.exists(cache):
+            if not is_afs_path(cache + '/'):
+                raise AssertionError("Refusing to purge unrecognized directory %s" % (cache))
+            logger.info("Removing cache files in %s.", cache)
+            for entry in scan(cache):
+                if entry.name in ('CacheItems', 'CellItems', 'VolumeItems') or \
+                   re.match(r'^D\d+$', entry.name):
+                    paths.append(entry.path)
+        return paths
+
+    def purge_paths(self):
+        """Return the config, volumes, and cache files to be purged."""
+        paths = []
+        if self.do_server:
+            if os.path.exists("/usr/afs/"):
+                if not is_afs_path("/usr/afs/"):
+                    raise AssertionError("Refusing to remove unrecognized directory /usr/afs/")
+                paths.append("/usr/afs/")
+            paths.extend(self._volume_paths())
+        if self.do_client:
+            paths.extend(self._cache_paths())
+        return paths
+
+    def _tune_cache(self):
+        """Compute the cache size and afsd cache options.
+
+        The computed afsd options are added to the afsd options given by the
+        user; options given by the user are not changed."""
+        if self.cache_profile is None or self.cache_profile == 'none':
+            logger.info("Skipping cache tuning.")
+            return
+        afsd = self.options.get('afsd', '')
+        self.cache_tuning = CacheTuning(profile=self.cache_profile,
+                                        cachedir=self.dirs['AFS_CACHE_DIR'],
+                                        afsd_options=afsd)
+        self.cache_tuning.log()
+        self.options['afsd'] = self.cache_tuning.merge(afsd)
+        logger.info("afsd options are: %s", self.options['afsd'])
 
     def pre_install(self):
         """Pre installation steps."""
@@ -277,7 +331,7 @@ class Installer(object):
         if self.scripts['pre_install']:
             logger.info("Running pre-install script.")
             args = shlex.split(self.scripts['pre_install'])
-            sh(*args, output=False)
+            self.context.sh(*args, output=False)
         if self.cellhosts is None:
             if self.hostnames:
                 self.cellhosts = self._lookup_cellhosts(self.hostnames)
@@ -289,6 +343,7 @@ class Installer(object):
         if self.do_client:
             if self.csdb is not None:
                 file_should_exist(self.csdb)
+            self._tune_cache()
 
     def post_install(self):
         """Post installation steps."""
@@ -308,10 +363,14 @@ class Installer(object):
                 shutil.copyfile(self.csdb, dist)
             else:
                 touch(dist)
-            cat([local, dist], csdb)
+            merged,conflicts = merge(load_csdb(local), load_csdb(dist))
+            merged.write(csdb)
+            logger.info("Wrote %d cells to %s.", len(merged), csdb)
             # Set the cache info parameters.
-            # XXX: size should be calculated from partition, if mounted.
-            cache_size = 102000  # k blocks
+            if self.cache_tuning:
+                cache_size = self.cache_tuning.size  # k blocks
+            else:
+                cache_size = LEGACY_CACHE_SIZE
             self._set_cache_info(
                 self.dirs['AFS_DATA_DIR'],
                 self.dirs['AFS_MOUNT_DIR'],
@@ -320,7 +379,7 @@ class Installer(object):
         if self.scripts['post_install']:
             logger.info("Running post-install script.")
             args = shlex.split(self.scripts['post_install'])
-            sh(*args, output=False)
+            self.context.sh(*args, output=False)
 
     def pre_remove(self):
         """Pre remove steps."""
@@ -328,21 +387,21 @@ class Installer(object):
         if self.scripts['pre_remove']:
             logger.info("Running pre-remove script.")
             args = shlex.split(self.scripts['pre_remove'])
-            sh(*args, output=False)
+            self.context.sh(*args, output=False)
 
     def post_remove(self):
         """Post remove steps."""
         logger.debug("post_remove")
         if self.purge:
-            if self.do_server:
-                remove_files("/usr/afs/")
-                self._purge_volumes()
-            if self.do_client:
-                self._purge_cache()
+            # The config, volumes and cache are purged together, so the
+            # work is spread over all of the purge threads.
+            paths = self.purge_paths()
+            if paths:
+                purge(paths, workers=self.workers)
         if self.scripts['post_remove']:
             logger.info("Running post-remove script.")
             args = shlex.split(self.scripts['post_remove'])
-            sh(*args, output=False)
+            self.context.sh(*args, output=False)
 
 def installer(dist='transarc', **kwargs):
     from afsutil.transarc import TransarcInstaller
@@ -358,7 +417,11 @@ def installer(dist='transarc', **kwargs):
         raise ValueError("Unsupported 'dist' option: {0}".format(dist))
 
 def install(dist='transarc', **kwargs):
-    installer(dist, **kwargs).install()
+    i = installer(dist, **kwargs)
+    with i.context:
+        i.install()
 
 def remove(dist='transarc', **kwargs):
-    installer(dist, **kwargs).remove()
+    i = installer(dist, **kwargs)
+    with i.context:
+        i.remove()
@@ -0,0 +1,370 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Export the volumes and partitions of a cell to a sqlite database.
+
+The vldb entries, the volume headers of each fileserver (vos listvol -long)
+and the partition usage (vos partinfo) are loaded into indexed tables, so
+questions about a large cell can be answered with sql instead of many slow
+vos commands. The fileservers are read concurrently; the output of each
+command is parsed as it is read and written to the database in batches by a
+single writer, so memory use does not grow with the size of the cell.
+
+A refresh only reloads the fileservers given, or the ones not refreshed
+within a maximum age. Some common questions are available as named queries.
+"""
+
+from __future__ import print_function
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+try:
+    import queue # python3
+except ImportError:
+    import Queue as queue # python2
+
+from afsutil.cmd import stream, vos
+from afsutil.context import current
+from afsutil.system import CommandFailed
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+from afsutil.placement import parse_partinfo
+from afsutil.vldb import parse_vldb
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vldb (
+    name TEXT PRIMARY KEY,
+    rw INTEGER,
+    ro INTEGER,
+    bk INTEGER,
+    locked INTEGER
+);
+CREATE TABLE IF NOT EXISTS sites (
+    name TEXT,
+    server TEXT,
+    partition TEXT,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS sites_name ON sites (name);
+CREATE INDEX IF NOT EXISTS sites_server ON sites (server, partition);
+CREATE TABLE IF NOT EXISTS volumes (
+    id INTEGER,
+    name TEXT,
+    server TEXT,
+    partition TEXT,
+    type TEXT,
+    size INTEGER,
+    maxquota INTEGER,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS volumes_id ON volumes (id);
+CREATE INDEX IF NOT EXISTS volumes_name ON volumes (name);
+CREATE INDEX IF NOT EXISTS volumes_server ON volumes (server, partition);
+CREATE TABLE IF NOT EXISTS partitions (
+    server TEXT,
+    partition TEXT,
+    free INTEGER,
+    total INTEGER,
+    PRIMARY KEY (server, partition)
+);
+CREATE TABLE IF NOT EXISTS refreshed (
+    source TEXT PRIMARY KEY,
+    timestamp REAL
+);
+"""
+
+QUERIES = {
+    'full-partitions': (
+        "Partitions over 80% full",
+        "SELECT server, partition, total, free, "
+        "ROUND(100.0 * (total - free) / total, 1) AS used "
+        "FROM partitions WHERE total > 0 AND (total - free) * 100 > total * 80 "
+        "ORDER BY used DESC"),
+    'partitions': (
+        "Usage and number of volumes of each partition",
+        "SELECT p.server, p.partition, p.total, p.free, "
+        "ROUND(100.0 * (p.total - p.free) / p.total, 1) AS used, "
+        "(SELECT COUNT(*) FROM volumes v WHERE v.server = p.server AND v.partition = p.partition) AS volumes "
+        "FROM partitions p WHERE p.total > 0 ORDER BY p.server, p.partition"),
+    'no-replicas': (
+        "Volumes without a read-only site",
+        "SELECT v.name, s.server, s.partition FROM vldb v "
+        "JOIN sites s ON s.name = v.name AND s.type = 'RW' "
+        "WHERE NOT EXISTS (SELECT 1 FROM sites r WHERE r.name = v.name AND r.type = 'RO') "
+        "ORDER BY v.name"),
+    'locked': (
+        "Locked vldb entries",
+        "SELECT name, rw FROM vldb WHERE locked ORDER BY name"),
+    'offline': (
+        "Volumes which are not on-line",
+        "SELECT name, id, server, partition, status FROM volumes "
+        "WHERE status != 'On-line' ORDER BY server, partition, name"),
+    'largest': (
+        "The 50 largest volumes",
+        "SELECT name, id, server, partition, size, maxquota FROM volumes "
+        "WHERE type = 'RW' ORDER BY size DESC LIMIT 50"),
+    'over-quota': (
+        "Volumes over 90% of their quota",
+        "SELECT name, id, server, partition, size, maxquota FROM volumes "
+        "WHERE type = 'RW' AND maxquota > 0 AND size * 10 > maxquota * 9 ORDER BY name"),
+    'orphans': (
+        "Volumes on a fileserver without a vldb entry",
+        "SELECT v.name, v.id, v.server, v.partition FROM volumes v "
+        "WHERE v.type = 'RW' AND v.name IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM vldb e WHERE e.rw = v.id) "
+        "ORDER BY v.server, v.partition, v.name"),
+}
+
+def parse_listvol(lines, server):
+    """Generate volume rows from vos listvol -long output lines.
+
+    Rows are (id, name, server, partition, type, size, maxquota, status)."""
+    partition = None
+    row = None
+    for line in lines:
+        match = re.match(r'Total number of volumes on server \S+ partition (\S+):', line)
+        if match:
+            if row:
+                yield tuple(row)
+                row = None
+            partition = match.group(1)
+            continue
+        match = re.match(r'(\S+)\s+(\d+)\s+(RW|RO|BK)\s+(\d+) K\s+(\S+)', line)
+        if match:
+            if row:
+                yield tuple(row)
+            name, vid, kind, size, status = match.groups()
+            row = [int(vid), name, server, partition, kind, int(size), None, status]
+            continue
+        match = re.match(r'\*\*\*\* Volume (\d+) is busy', line)
+        if match:
+            if row:
+                yield tuple(row)
+                row = None
+            yield (int(match.group(1)), None, server, partition, None, None, None, 'busy')
+            continue
+        match = re.match(r'\*\*\*\* Could not attach volume (\d+)', line)
+        if match:
+            if row:
+                yield tuple(row)
+                row = None
+            yield (int(match.group(1)), None, server, partition, None, None, None, 'error')
+            continue
+        if row:
+            match = re.match(r'\s+MaxQuota\s+(\d+) K', line)
+            if match:
+                row[6] = int(match.group(1))
+    if row:
+        yield tuple(row)
+
+def fileservers():
+    """Return the fileservers registered in the vldb."""
+    return [line.strip() for line in vos('listaddrs', quiet=True).splitlines() if line.strip()]
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class Inventory(object):
+    """A sqlite database of the volumes and partitions of a cell."""
+
+    def __init__(self, path, workers=DEFAULT_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def refreshed(self, source):
+        """Return the time the source was last refreshed, or None."""
+        row = self.db.execute("SELECT timestamp FROM refreshed WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def stale(self, sources, max_age=None):
+        """Return the sources not refreshed within max_age seconds."""
+        if max_age is None:
+            return list(sources)
+        now = time.time()
+        return [s for s in sources if (self.refreshed(s) or 0) < now - max_age]
+
+    def _mark(self, source, timestamp):
+        self.db.execute("INSERT OR REPLACE INTO refreshed (source, timestamp) VALUES (?, ?)",
+                        (source, timestamp))
+
+    def load_vldb(self, lines):
+        """Replace the vldb and sites tables from vos listvldb output lines."""
+        start = time.time()
+        with self.db:
+            self.db.execute("DELETE FROM vldb")
+            self.db.execute("DELETE FROM sites")
+            count = 0
+            for batch in _batches(parse_vldb(lines), BATCH_SIZE):
+                self.db.executemany("INSERT OR REPLACE INTO vldb VALUES (?, ?, ?, ?, ?)",
+                    [(e.name, e.rw, e.ro, e.bk, int(e.locked)) for e in batch])
+                self.db.executemany("INSERT INTO sites VALUES (?, ?, ?, ?)",
+                    [(e.name,) + tuple(site) for e in batch for site in e.sites])
+                count += len(batch)
+            self._mark('vldb', start)
+        logger.info("Loaded %d vldb entries in %.1f seconds.", count, time.time() - start)
+        return count
+
+    def _produce(self, server, output):
+        """Read one fileserver and queue its rows in batches."""
+        start = time.time()
+        info = parse_partinfo(vos('partinfo', '-server', server, quiet=True))
+        output.put(('partitions', server, [(server, p, f, t) for p,(f,t) in info.items()]))
+        lines = stream('vos', 'listvol', '-server', server, '-long', quiet=True)
+        for batch in _batches(parse_listvol(lines, server)):
+            output.put(('volumes', server, batch))
+        output.put(('done', server, start))
+
+    def load_servers(self, servers):
+        """Reload the volumes and partitions of the fileservers concurrently.
+
+        Each fileserver is read by its own thread; the rows are written here
+        by the calling thread, since a sqlite connection may only be used by
+        the thread which created it. The rows are staged in temporary tables
+        and replace the old rows of a server only after the whole server has
+        been read.
+
+        returns: list of parallel.Result objects, one per server
+        """
+        rows = queue.Queue(maxsize=4 * max(1, self.workers)) # Bounded; keeps memory flat.
+        results = []
+        context = current()
+        def _producers():
+            try:
+                with context:
+                    results.extend(parallel(lambda s: self._produce(s, rows), servers,
+                                            workers=self.workers, raise_errors=False))
+            finally:
+                rows.put(None)
+        thread = threading.Thread(target=_producers)
+        thread.daemon = True
+        thread.start()
+        while True:
+            item = rows.get()
+            if item is None:
+                break
+            kind, server, data = item
+            table = self._staging(server)
+            if kind == 'partitions':
+                self.db.executemany("INSERT INTO %s_partitions VALUES (?, ?, ?, ?)" % table, data)
+            elif kind == 'volumes':
+                self.db.executemany("INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?, ?, ?)" % table, data)
+            else:
+                self._commit(server, data)
+        thread.join()
+        for r in results:
+            if not r.ok:
+                logger.error("Failed to read fileserver %s: %s", r.item, r.error)
+                self._drop(r.item)
+        return results
+
+    def _staging(self, server):
+        """Create the temporary tables for the rows read from a server."""
+        table = "staging_%s" % re.sub(r'\W', '_', server)
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS %s AS SELECT * FROM volumes WHERE 0" % table)
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS %s_partitions AS SELECT * FROM partitions WHERE 0" % table)
+        return table
+
+    def _drop(self, server):
+        table = self._staging(server)
+        self.db.execute("DROP TABLE %s" % table)
+        self.db.execute("DROP TABLE %s_partitions" % table)
+
+    def _commit(self, server, timestamp):
+        """Replace the rows of a server with the rows read."""
+        table = self._staging(server)
+        with self.db:
+            self.db.execute("DELETE FROM volumes WHERE server = ?", (server,))
+            self.db.execute("DELETE FROM partitions WHERE server = ?", (server,))
+            self.db.execute("INSERT INTO volumes SELECT * FROM %s" % table)
+            self.db.execute("INSERT INTO partitions SELECT * FROM %s_partitions" % table)
+            self._mark('server:%s' % server, timestamp)
+        self._drop(server)
+        count = self.db.execute("SELECT COUNT(*) FROM volumes WHERE server = ?", (server,)).fetchone()[0]
+        logger.info("Loaded %d volumes from %s in %.1f seconds.", count, server, time.time() - timestamp)
+
+    def refresh(self, servers=None, max_age=None, vldb=True):
+        """Refresh the inventory.
+
+        servers: fileservers to read; default is all fileservers in the vldb
+        max_age: skip the sources refreshed within this many seconds
+        vldb:    also refresh the vldb tables
+        """
+        if vldb and self.stale(['vldb'], max_age):
+            self.load_vldb(stream('vos', 'listvldb', '-quiet', '-nosort', quiet=True))
+        if servers is None:
+            servers = fileservers()
+        stale = self.stale(['server:%s' % s for s in servers], max_age)
+        servers = [s for s in servers if 'server:%s' % s in stale]
+        if servers:
+            return self.load_servers(servers)
+        return []
+
+    def query(self, name):
+        """Run a named query; returns (column names, row iterator)."""
+        if name not in QUERIES:
+            raise ValueError("Unknown query '%s'." % name)
+        cursor = self.db.execute(QUERIES[name][1])
+        return ([d[0] for d in cursor.description], cursor)
+
+def _print_rows(columns, rows, out=sys.stdout):
+    print("\t".join(columns), file=out)
+    for row in rows:
+        print("\t".join('' if v is None else str(v) for v in row), file=out)
+
+def inventory(**kwargs):
+    if kwargs.get('list_queries'):
+        for name in sorted(QUERIES):
+            print("%-16s %s" % (name, QUERIES[name][0]))
+        return 0
+    inv = Inventory(kwargs['db'], workers=kwargs.get('workers', DEFAULT_WORKERS))
+    try:
+        if not kwargs.get('no_refresh'):
+            servers = kwargs.get('server') or None
+            try:
+                results = inv.refresh(servers=servers, max_age=kwargs.get('max_age'))
+            except CommandFailed as e:
+                logger.error("Unable to refresh the inventory: %s", e.out.strip())
+                return 1
+            if any(not r.ok for r in results):
+                return 1
+        for name in kwargs.get('query') or []:
+            columns, rows = inv.query(name)
+            _print_rows(columns, rows)
+    finally:
+        inv.close()
+    return 0
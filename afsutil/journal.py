@@ -0,0 +1,117 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Record the progress of a multi-phase setup.
+
+The journal is a small json file which is rewritten after each completed
+phase, and after each completed host within a phase, so a setup which
+failed part way through can be resumed without repeating the work already
+done. The journal is keyed by the setup parameters; a journal written for
+a different setup is ignored.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class Journal(object):
+    """A persistent record of completed phases and items."""
+
+    def __init__(self, path, key):
+        """
+        path: journal file path
+        key:  json serializable description of the setup, e.g. the cell
+              name and hosts
+        """
+        self.path = path
+        self.key = key
+        self.phases = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Read the journal file, if present and for the same setup."""
+        self.phases = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            logger.warning("Ignoring unreadable journal %s: %s", self.path, e)
+            return
+        if data.get('key') != json.loads(json.dumps(self.key)):
+            logger.info("Ignoring journal %s; it is for a different setup.", self.path)
+            return
+        self.phases = data.get('phases', {})
+        logger.info("Resuming from journal %s.", self.path)
+
+    def save(self):
+        """Write the journal file atomically."""
+        data = {'key': self.key, 'updated': time.time(), 'phases': self.phases}
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.journal.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.rename(tmp, self.path)
+        except:
+            os.remove(tmp)
+            raise
+
+    def clear(self):
+        """Forget all progress and remove the journal file."""
+        with self._lock:
+            self.phases = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def completed(self, phase, item=None):
+        """Return true if the phase, or an item of the phase, was completed."""
+        with self._lock:
+            record = self.phases.get(phase)
+            if record is None:
+                return False
+            if item is None:
+                return record.get('completed', False)
+            return str(item) in record.get('items', {})
+
+    def complete(self, phase, elapsed, item=None):
+        """Record the completion of a phase, or of an item of the phase."""
+        with self._lock:
+            record = self.phases.setdefault(phase, {'completed': False, 'items': {}})
+            if item is None:
+                record['completed'] = True
+                record['elapsed'] = elapsed
+            else:
+                record['items'][str(item)] = elapsed
+            self.save()
+
+    def durations(self):
+        """Return a dict of phase name: elapsed seconds of the completed phases."""
+        with self._lock:
+            return dict((name, r['elapsed']) for name,r in self.phases.items() if r.get('completed'))
@@ -64,7 +64,8 @@ import urllib2
 import logging
 import shutil
 import glob
-from afsutil.system import sh, mkdirp, which, CommandFailed
+from afsutil.system import mkdirp, which, CommandFailed
+from afsutil.context import current
 from afsutil.misc import flatten, trim
 
 logger = logging.getLogger(__name__)
@@ -86,7 +87,7 @@ class RpmBuilder(object):
     def __init__(self, srcdir=None, pkgdir=None, topdir=None, dstdir=None,
                  version=None, arch=None, spec=None, csdb=None, srpm=None,
                  clobber=False, quiet=False, verbose=False,
-                 with_=None, without=None, **kwargs):
+                 with_=None, without=None, context=None, **kwargs):
         """Initialize the RpmBuilder object
 
         srcdir:  path of the checked out source tree (default: .)
@@ -102,6 +103,7 @@ class RpmBuilder(object):
         verbose: more output
         with_:   rpmbuild --with options
         without: rpmbuild --without options
+        context: context to run commands (default: the active context)
         """
         if srcdir is None:
             srcdir = os.getcwd()
@@ -130,6 +132,7 @@ class RpmBuilder(object):
         self.custom_csdb = csdb
         self.with_ = flatten(with_)
         self.without = flatten(without)
+        self.context = context or current()
         # state
         self.version = version
         self.arch = arch
@@ -156,7 +159,7 @@ class RpmBuilder(object):
 
     def rpmbuild(self, *args, **kwargs):
         """Run the rpmbuild commands."""
-        return sh(
+        return self.context.sh(
             'rpmbuild',
             '--define', '_topdir {0}'.format(self.topdir),
             *args, **kwargs)
@@ -172,7 +175,7 @@ class RpmBuilder(object):
         if gitdir:
             args.insert(1, "--git-dir")
             args.insert(2, gitdir)
-        return sh(*args, quiet=True)
+        return self.context.sh(*args, quiet=True)
 
     def get_version(self):
         """Get the version identifier for the packaging.
@@ -256,7 +259,7 @@ class RpmBuilder(object):
 
     def find_kversions(self):
         """Find the linux kernel versions of the kernel-devel packages."""
-        kversions = sh(
+        kversions = self.context.sh(
             'rpm', '-q', '-a',
             '--queryformat=%{VERSION}-%{RELEASE}\n', 'kernel-devel',
             quiet=True)
@@ -284,7 +287,7 @@ class RpmBuilder(object):
             if v == linux_pkgver and r.startswith(prefix):
                 return r.replace(prefix, '', 1).replace('_', '-')
             return None
-        kversions = sh(
+        kversions = self.context.sh(
             'rpm', '-q', '-p', '--queryformat=%{VERSION} %{RELEASE}\n',
             "{dstdir}/kmod-openafs*.rpm".format(dstdir=self.dstdir),
             sed=get_kversion)
@@ -499,18 +502,18 @@ class RpmBuilder(object):
                  '--prefix', 'openafs-{version}/'.format(**names),
                  '--output', tarfile,
                  'HEAD')
-        sh('tar', 'xf', tarfile, '-C', os.path.dirname(tarfile), output=False)
+        self.context.sh('tar', 'xf', tarfile, '-C', os.path.dirname(tarfile), output=False)
         os.remove(tarfile)
 
         logger.info("Generating source tree and documents.")
         # Note: Overwrite the extracted version string, if one.
         writefile('{topdir}/SOURCES/openafs-{version}/.version'.format(**names), version)
-        sh('/bin/sh', '-c',
+        self.context.sh('/bin/sh', '-c',
             'cd {topdir}/SOURCES/openafs-{version} && ./regen.sh'.format(**names),
             output=False)
 
         logger.info("Creating doc tarball openafs-{version}-doc.tar.bz2".format(**names))
-        sh('tar', 'cjf',
+        self.context.sh('tar', 'cjf',
            '{topdir}/SOURCES/openafs-{version}-doc.tar.bz2'.format(**names),
            '-C', '{topdir}/SOURCES'.format(**names),
            'openafs-{version}/doc'.format(**names),
@@ -518,7 +521,7 @@ class RpmBuilder(object):
         self.generated.append('{topdir}/SOURCES/openafs-{version}-doc.tar.bz2'.format(**names))
 
         logger.info("Creating src tarball openafs-{version}-src.tar.bz2".format(**names))
-        sh('tar', 'cjf',
+        self.context.sh('tar', 'cjf',
            '{topdir}/SOURCES/openafs-{version}-src.tar.bz2'.format(**names),
            '-C', '{topdir}/SOURCES'.format(**names),
            '--exclude', 'doc',
@@ -671,7 +674,7 @@ class RpmBuilder(object):
             if not createrepo:
                 logger.warning("createrepo is not installed.")
             else:
-                sh('createrepo', self.dstdir, output=False)
+                self.context.sh('createrepo', self.dstdir, output=False)
 
     def banner(self, lines):
         """Print a banner."""
@@ -710,7 +713,7 @@ class MockRpmBuilder(RpmBuilder):
         args = list(args)
         if self.verbose:
             args.append('--verbose')
-        return sh('mock', '--root', self.chroot, *args, **kwargs)
+        return self.context.sh('mock', '--root', self.chroot, *args, **kwargs)
 
     def init_chroot(self):
         """Initialize the chroot."""
@@ -0,0 +1,108 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Run tasks concurrently with a bounded pool of threads."""
+
+import logging
+import sys
+import threading
+import time
+try:
+    import queue # python3
+except ImportError:
+    import Queue as queue # python2
+
+from afsutil.context import current
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+
+class Result(object):
+    """The outcome of a single task."""
+
+    def __init__(self, item):
+        self.item = item
+        self.value = None
+        self.error = None
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+def _join(threads):
+    # Join with a timeout so the main thread still sees KeyboardInterrupt.
+    for t in threads:
+        while t.is_alive():
+            t.join(0.2)
+
+def parallel(function, items, workers=DEFAULT_WORKERS, raise_errors=True):
+    """Call function(item) for each item with at most workers threads.
+
+    function:     callable taking a single item
+    items:        sequence of items
+    workers:      maximum number of concurrent threads
+    raise_errors: raise the first task exception after all tasks finish
+
+    The tasks run with the active context of the caller; see afsutil.context.
+
+    returns: list of Result objects, in the same order as items
+    """
+    context = current()
+    results = [Result(item) for item in items]
+    tasks = queue.Queue()
+    for r in results:
+        tasks.put(r)
+
+    def worker():
+        with context:
+            _work()
+
+    def _work():
+        while True:
+            try:
+                r = tasks.get_nowait()
+            except queue.Empty:
+                return
+            start = time.time()
+            try:
+                r.value = function(r.item)
+            except Exception as e:
+                logger.debug("Task %s failed: %s", r.item, e, exc_info=sys.exc_info())
+                r.error = e
+            r.elapsed = time.time() - start
+
+    nthreads = max(1, min(int(workers), len(results)))
+    if nthreads == 1:
+        worker() # No need for threads.
+    else:
+        threads = []
+        for n in xrange(0, nthreads):
+            t = threading.Thread(target=worker)
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        _join(threads)
+    if raise_errors:
+        for r in results:
+            if r.error is not None:
+                raise r.error
+    return results
@@ -0,0 +1,166 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Choose the fileserver and partition for new volumes.
+
+The free space and number of volumes of each partition are gathered once
+with vos partinfo and vos listvol, then updated as volumes are placed, so
+a batch of new volumes is spread over the fileservers without querying
+the servers again for each volume.
+
+Policies:
+  most-free      partition with the most free space
+  fewest-volumes partition with the fewest volumes
+  round-robin    each partition in turn
+"""
+
+import logging
+import re
+import threading
+
+from afsutil.cmd import vos
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+from afsutil.resolver import addresses
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY = 'most-free'
+DEFAULT_VOLUME_SIZE = 5000 # Initial size of a new volume in kbytes.
+
+class Partition(object):
+    """A fileserver partition and its current usage."""
+
+    def __init__(self, server, name, free=0, total=0, volumes=0):
+        self.server = server
+        self.name = name
+        self.free = free
+        self.total = total
+        self.volumes = volumes
+
+    def __repr__(self):
+        return "Partition(%r, %r, free=%d, total=%d, volumes=%d)" % \
+            (self.server, self.name, self.free, self.total, self.volumes)
+
+def parse_partinfo(output):
+    """Parse vos partinfo output into a dict of name: (free, total) kbytes."""
+    info = {}
+    for line in output.splitlines():
+        match = re.match(r'Free space on partition (\S+): (\d+) K blocks out of total (\d+)', line)
+        if match:
+            info[match.group(1)] = (int(match.group(2)), int(match.group(3)))
+    return info
+
+def parse_listvol(output):
+    """Parse vos listvol output into a dict of name: number of volumes."""
+    counts = {}
+    for line in output.splitlines():
+        match = re.match(r'Total number of volumes on server \S+ partition (\S+): (\d+)', line)
+        if match:
+            counts[match.group(1)] = int(match.group(2))
+    return counts
+
+def partitions(server):
+    """Retrieve the partitions of a fileserver."""
+    info = parse_partinfo(vos('partinfo', '-server', server, quiet=True))
+    counts = parse_listvol(vos('listvol', '-server', server, '-fast', quiet=True))
+    return [Partition(server, name, free, total, counts.get(name, 0))
+            for name,(free,total) in sorted(info.items())]
+
+def most_free(candidates, state):
+    return max(candidates, key=lambda p: p.free)
+
+def fewest_volumes(candidates, state):
+    return min(candidates, key=lambda p: (p.volumes, -p.free))
+
+def round_robin(candidates, state):
+    n = state.get('next', 0)
+    state['next'] = n + 1
+    return candidates[n % len(candidates)]
+
+POLICIES = {
+    'most-free': most_free,
+    'fewest-volumes': fewest_volumes,
+    'round-robin': round_robin,
+}
+
+class Placement(object):
+    """Place volumes on the partitions of a set of fileservers."""
+
+    def __init__(self, servers, policy=DEFAULT_POLICY, size=DEFAULT_VOLUME_SIZE,
+                 workers=DEFAULT_WORKERS):
+        """
+        servers: fileserver hostnames
+        policy:  policy name, see POLICIES, or a callable taking the list
+                 of candidate partitions and a state dict
+        size:    expected size of a new volume in kbytes
+        workers: maximum number of servers queried concurrently
+        """
+        if not callable(policy):
+            if policy not in POLICIES:
+                raise ValueError("Unknown placement policy '%s'." % policy)
+            policy = POLICIES[policy]
+        self.servers = list(servers)
+        self.policy = policy
+        self.size = size
+        self.workers = workers
+        self.partitions = None
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Retrieve the current partition usage from the fileservers."""
+        results = parallel(partitions, self.servers, workers=self.workers)
+        self.partitions = []
+        for r in results:
+            self.partitions.extend(r.value)
+        for p in self.partitions:
+            logger.debug("Server %s partition %s: %d kbytes free, %d volumes.",
+                         p.server, p.name, p.free, p.volumes)
+
+    def choose(self, servers=None, exclude=None):
+        """Choose a partition for a new volume.
+
+        servers: optional list of servers to consider; default is all
+        exclude: optional list of servers to skip
+
+        The servers are compared by address, so they may be given as
+        hostnames in another form, or as addresses.
+
+        returns: (server, partition) tuple
+
+        The chosen partition is charged for the new volume, so the next
+        choice takes it into account.
+        """
+        with self._lock:
+            if self.partitions is None:
+                self.refresh()
+            if servers is not None:
+                servers = addresses(servers)
+            if exclude is not None:
+                exclude = addresses(exclude)
+            candidates = [p for p in self.partitions
+                          if (servers is None or addresses([p.server]) & servers) and
+                             (exclude is None or not addresses([p.server]) & exclude)]
+            if not candidates:
+                raise AssertionError("No fileserver partitions available for placement.")
+            p = self.policy(candidates, self._state)
+            p.free -= self.size
+            p.volumes += 1
+            return (p.server, p.name)
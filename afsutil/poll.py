@@ -0,0 +1,157 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Wait for conditions by polling.
+
+Conditions are checked often at first, then less often, up to a maximum
+interval, until an overall deadline. The time taken by each wait is logged.
+
+The StatusPoller shares the status of each host between all of the threads
+waiting on that host, so the status is fetched once per host per tick, no
+matter how many services are being waited on.
+"""
+
+import logging
+import threading
+import time
+
+from afsutil.parallel import parallel
+
+logger = logging.getLogger(__name__)
+
+class Backoff(object):
+    """Generate increasing delays between polls."""
+
+    def __init__(self, initial=0.5, maximum=10.0, factor=1.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = initial
+
+    def next(self):
+        """Return the next delay."""
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay
+
+def wait_until(predicate, description, timeout=300, initial=0.5, maximum=10.0, factor=1.5):
+    """Poll predicate until it returns true.
+
+    predicate:   callable with no arguments; return true when ready
+    description: what is being waited for, for log messages
+    timeout:     overall deadline in seconds
+    initial:     first delay between polls in seconds
+    maximum:     maximum delay between polls in seconds
+    factor:      delay growth factor
+
+    returns: the elapsed time in seconds
+
+    Raises an AssertionError if the deadline is reached.
+    """
+    logger.info("Waiting for %s.", description)
+    start = time.time()
+    deadline = start + timeout
+    backoff = Backoff(initial, maximum, factor)
+    checks = 0
+    while True:
+        checks += 1
+        if predicate():
+            elapsed = time.time() - start
+            logger.info("Waited %.1f seconds for %s (%d checks).", elapsed, description, checks)
+            return elapsed
+        now = time.time()
+        if now >= deadline:
+            break
+        time.sleep(min(backoff.next(), deadline - now))
+    elapsed = time.time() - start
+    raise AssertionError("Timed out after %.1f seconds waiting for %s." % (elapsed, description))
+
+class StatusPoller(object):
+    """Wait for service instances on one or more hosts to reach a state.
+
+    fetch is a callable which takes a hostname and returns a dictionary of
+    the instance status strings on that host, e.g. {'ptserver': 'running'}.
+    The most recent status of each host is cached, and is reused by any
+    waiter which started its check before the status was fetched.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._hostlocks = {}
+        self._cache = {} # hostname -> (timestamp, statuses)
+
+    def _hostlock(self, hostname):
+        with self._lock:
+            if hostname not in self._hostlocks:
+                self._hostlocks[hostname] = threading.Lock()
+            return self._hostlocks[hostname]
+
+    def status(self, hostname, since=0.0):
+        """Return the instance statuses of a host, fetched no earlier than since."""
+        with self._hostlock(hostname):
+            cached = self._cache.get(hostname)
+            if cached and cached[0] >= since:
+                return cached[1]
+            timestamp = time.time()
+            statuses = self.fetch(hostname)
+            with self._lock:
+                self.fetches += 1
+            self._cache[hostname] = (timestamp, statuses)
+            return statuses
+
+    def invalidate(self, hostname=None):
+        """Forget the cached status of a host, or of all hosts."""
+        with self._lock:
+            if hostname is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(hostname, None)
+
+    def wait(self, conditions, timeout=150, description=None):
+        """Wait until all of the conditions are met.
+
+        conditions:  sequence of (hostname, instance, target) tuples
+        timeout:     overall deadline in seconds
+        description: what is being waited for, for log messages
+
+        returns: the elapsed time in seconds
+
+        Raises an AssertionError if the deadline is reached.
+        """
+        pending = set(conditions)
+        if not pending:
+            return 0.0
+        if description is None:
+            description = ", ".join(sorted("%s on %s to reach %s" % (i, h, t) for h,i,t in pending))
+
+        def _check():
+            since = time.time()
+            hostnames = sorted(set(h for h,_,_ in pending))
+            results = parallel(lambda h: self.status(h, since), hostnames, workers=len(hostnames))
+            statuses = dict((r.item, r.value) for r in results)
+            for condition in list(pending):
+                hostname, instance, target = condition
+                if statuses[hostname].get(instance) == target:
+                    pending.discard(condition)
+            return not pending
+
+        return wait_until(_check, description, timeout=timeout)
@@ -0,0 +1,266 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Create pts users, groups and memberships in bulk.
+
+The entries are read from a CSV file with a header line, or from a file with
+one JSON object per line. Each record has a type (user, group or member), a
+name and the optional fields id, owner and group:
+
+    type,name,id,owner,group
+    user,alice,1000,,
+    group,staff,,admin,
+    member,alice,,,staff
+
+The records are compared with a single pts listentries snapshot of the
+database so only the missing entries are created. The pts commands are given
+many names at once and are run by a bounded pool of threads.
+"""
+
+import csv
+import json
+import logging
+import sys
+
+from afsutil.cmd import pts, stream
+from afsutil.system import CommandFailed
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100 # Names per pts command.
+FIELDS = ('type', 'name', 'id', 'owner', 'group')
+TYPES = ('user', 'group', 'member')
+
+def _chunks(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+def read_records(f, format=None):
+    """Generate the records of a CSV or JSON lines file as dicts.
+
+    f:      file object
+    format: 'csv' or 'json'; default is to guess from the file name
+    """
+    if format is None:
+        name = getattr(f, 'name', '')
+        format = 'json' if name.endswith('.json') or name.endswith('.jsonl') else 'csv'
+    if format == 'csv':
+        rows = csv.DictReader(f)
+        first = 2
+    elif format == 'json':
+        rows = (json.loads(line) for line in f if line.strip())
+        first = 1
+    else:
+        raise AssertionError("Unknown format '%s'." % format)
+    for number, row in enumerate(rows, first):
+        record = dict((k, (row.get(k) or None)) for k in FIELDS)
+        if record['id'] is not None:
+            record['id'] = str(record['id'])
+        if record['type'] not in TYPES:
+            raise AssertionError("Invalid type '%s' on line %d." % (record['type'], number))
+        if not record['name']:
+            raise AssertionError("Missing name on line %d." % number)
+        if record['type'] == 'member' and not record['group']:
+            raise AssertionError("Missing group on line %d." % number)
+        yield record
+
+def listentries():
+    """Return a dict of the names and ids of all pts users and groups."""
+    entries = {}
+    for line in stream('pts', 'listentries', '-users', '-groups', quiet=True):
+        fields = line.split()
+        if len(fields) < 2 or fields[0] == 'Name':
+            continue
+        entries[fields[0]] = int(fields[1])
+    return entries
+
+def membership(group):
+    """Return the set of members of a group."""
+    output = pts('membership', '-nameorid', group, quiet=True)
+    return set(line.strip() for line in output.splitlines()[1:] if line.strip())
+
+class Provision(object):
+    """The pts entries missing from the database."""
+
+    def __init__(self, entries, workers=DEFAULT_WORKERS):
+        """
+        entries: dict of the existing names and ids, see listentries()
+        workers: maximum number of pts commands to run concurrently
+        """
+        self.entries = entries
+        self.workers = workers
+        self.users = [] # (name, id) to be created
+        self.groups = [] # (name, id, owner) to be created
+        self.members = {} # group: list of users to be added
+        self.skipped = 0
+
+    def add(self, records):
+        """Add the records which are not already in the database."""
+        seen = set()
+        for r in records:
+            if r['type'] == 'member':
+                self.members.setdefault(r['group'], [])
+                if r['name'] not in self.members[r['group']]:
+                    self.members[r['group']].append(r['name'])
+            elif r['name'] in self.entries or r['name'] in seen:
+                self.skipped += 1
+            elif r['type'] == 'user':
+                self.users.append((r['name'], r['id']))
+                seen.add(r['name'])
+            else:
+                self.groups.append((r['name'], r['id'], r['owner']))
+                seen.add(r['name'])
+
+    def prune(self):
+        """Remove the memberships which already exist.
+
+        Only the groups named in the records are read, concurrently."""
+        existing = [g for g in self.members if g in self.entries]
+        results = parallel(membership, existing, workers=self.workers)
+        for r in results:
+            users = self.members[r.item]
+            self.members[r.item] = [u for u in users if u not in r.value]
+            self.skipped += len(users) - len(self.members[r.item])
+        self.members = dict((g, u) for g, u in self.members.items() if u)
+
+    def commands(self):
+        """Return the lists of pts commands to be run, in order.
+
+        The commands in each list may run concurrently; each list must be
+        complete before the next is started."""
+        steps = []
+        step = []
+        with_id = [u for u in self.users if u[1] is not None]
+        without_id = [u for u in self.users if u[1] is None]
+        for chunk in _chunks(with_id):
+            step.append(['createuser', '-name'] + [n for n,i in chunk] + ['-id'] + [i for n,i in chunk])
+        for chunk in _chunks(without_id):
+            step.append(['createuser', '-name'] + [n for n,i in chunk])
+        steps.append(step)
+        # Groups may be owned by the new groups, so create the owners first.
+        pending = list(self.groups)
+        while pending:
+            names = set(g[0] for g in pending)
+            ready = [g for g in pending if g[2] not in names or g[2] == g[0]]
+            if not ready:
+                raise AssertionError("Circular group owners: %s" % ", ".join(sorted(names)))
+            step = []
+            by_owner = {}
+            for group in ready:
+                by_owner.setdefault((group[2], group[1] is not None), []).append(group)
+            for (owner, has_id), groups in sorted(by_owner.items()):
+                for chunk in _chunks(groups):
+                    args = ['creategroup', '-name'] + [n for n,i,o in chunk]
+                    if has_id:
+                        args += ['-id'] + [i for n,i,o in chunk]
+                    if owner:
+                        args += ['-owner', owner]
+                    step.append(args)
+            steps.append(step)
+            pending = [g for g in pending if g not in ready]
+        step = []
+        for group, users in sorted(self.members.items()):
+            for chunk in _chunks(users):
+                step.append(['adduser', '-user'] + chunk + ['-group', group])
+        steps.append(step)
+        return [s for s in steps if s]
+
+    def run(self):
+        """Create the missing entries.
+
+        Returns the list of commands which failed."""
+        failed = []
+        for step in self.commands():
+            results = parallel(_pts, step, workers=self.workers, raise_errors=False)
+            failed.extend(r.item for r in results if not r.ok)
+        return failed
+
+def _split(args):
+    """Split a batch command into one command per name."""
+    if args[0] == 'adduser':
+        users = args[2:-2]
+        return [['adduser', '-user', u] + args[-2:] for u in users]
+    end = args.index('-id') if '-id' in args else \
+          args.index('-owner') if '-owner' in args else len(args)
+    names = args[2:end]
+    ids = args[end+1:end+1+len(names)] if '-id' in args else None
+    tail = args[args.index('-owner'):] if '-owner' in args else []
+    commands = []
+    for n, name in enumerate(names):
+        command = [args[0], '-name', name]
+        if ids:
+            command += ['-id', ids[n]]
+        commands.append(command + tail)
+    return commands
+
+def _exists(output):
+    return "already exists" in output
+
+def _pts(args):
+    """Run a batch pts command.
+
+    A pts command stops at the first name which fails, so when a batch
+    fails the names are run again one at a time and the entries which
+    already exist are not counted as failures."""
+    try:
+        pts(*args, quiet=True)
+        return
+    except CommandFailed as e:
+        if len(_split(args)) == 1:
+            if _exists(e.out):
+                return
+            raise
+        logger.info("Batch pts %s failed; retrying one at a time.", args[0])
+    errors = []
+    for command in _split(args):
+        try:
+            pts(*command, quiet=True)
+        except CommandFailed as e:
+            if not _exists(e.out):
+                logger.error("Failed: pts %s: %s", " ".join(command), e.out.strip())
+                errors.append(command)
+    if errors:
+        raise AssertionError("%d of %d pts %s commands failed." % (len(errors), len(_split(args)), args[0]))
+
+def provision(**kwargs):
+    path = kwargs['file']
+    workers = kwargs.get('workers', DEFAULT_WORKERS)
+    entries = listentries()
+    logger.info("Found %d existing pts entries.", len(entries))
+    p = Provision(entries, workers=workers)
+    if path == '-':
+        p.add(read_records(sys.stdin, kwargs.get('format') or 'csv'))
+    else:
+        with open(path) as f:
+            p.add(read_records(f, kwargs.get('format')))
+    p.prune()
+    logger.info("Creating %d users, %d groups and %d memberships; %d entries already exist.",
+                len(p.users), len(p.groups), sum(len(u) for u in p.members.values()), p.skipped)
+    if kwargs.get('dryrun'):
+        for step in p.commands():
+            for args in step:
+                sys.stdout.write("pts %s\n" % " ".join(args))
+        return 0
+    failed = p.run()
+    if failed:
+        logger.error("%d pts commands failed.", len(failed))
+        return 1
+    return 0
@@ -0,0 +1,210 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Remove large trees of files.
+
+The vice partitions of a fileserver and the cache directory of a client can
+hold millions of files. The Purger removes a set of trees by splitting them
+into subtrees and deleting the subtrees with a bounded pool of threads. A tree
+may be renamed aside first, so the original path is immediately available
+again, and the renamed tree removed in the background.
+"""
+
+import logging
+import os
+import stat
+import threading
+import time
+
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+
+try:
+    from os import scandir # python 3.5+
+except ImportError:
+    try:
+        from scandir import scandir # backport module
+    except ImportError:
+        scandir = None
+
+logger = logging.getLogger(__name__)
+
+STASH_SUFFIX = '.purge'
+
+class _DirEntry(object):
+    """Minimal stand-in for os.DirEntry when scandir is not available."""
+
+    def __init__(self, dirname, name):
+        self.name = name
+        self.path = os.path.join(dirname, name)
+        self._mode = None
+
+    def is_dir(self, follow_symlinks=False):
+        if self._mode is None:
+            self._mode = os.lstat(self.path).st_mode
+        return stat.S_ISDIR(self._mode)
+
+def scan(path):
+    """Return a list of the directory entries in path."""
+    if scandir is not None:
+        it = scandir(path)
+        try:
+            return list(it)
+        finally:
+            if hasattr(it, 'close'):
+                it.close()
+    return [_DirEntry(path, name) for name in os.listdir(path)]
+
+def stash(path):
+    """Rename path aside so it may be removed later.
+
+    The new name is in the same directory, so the rename does not cross
+    file systems. Returns the new path.
+    """
+    path = path.rstrip('/')
+    aside = "%s%s.%d.%d" % (path, STASH_SUFFIX, os.getpid(), int(time.time() * 1000))
+    logger.debug("Renaming %s to %s", path, aside)
+    os.rename(path, aside)
+    return aside
+
+def stashed(path):
+    """Return the paths previously stashed aside for path."""
+    path = path.rstrip('/')
+    dirname, basename = os.path.split(path)
+    prefix = basename + STASH_SUFFIX + '.'
+    if not os.path.isdir(dirname):
+        return []
+    return [e.path for e in scan(dirname) if e.name.startswith(prefix)]
+
+class Purger(object):
+    """Remove trees of files with a pool of threads and report progress."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, interval=10):
+        """
+        workers:  maximum number of concurrent threads
+        interval: seconds between progress messages
+        """
+        self.workers = workers
+        self.interval = interval
+        self.files = 0
+        self.dirs = 0
+        self.elapsed = 0.0
+        self.thread = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _count(self, files=0, dirs=0):
+        with self._lock:
+            self.files += files
+            self.dirs += dirs
+
+    def _remove_tree(self, path):
+        """Remove a tree depth first, without following symlinks."""
+        files = 0
+        for entry in scan(path):
+            if entry.is_dir(follow_symlinks=False):
+                self._remove_tree(entry.path)
+            else:
+                os.remove(entry.path)
+                files += 1
+                if files == 1000:
+                    self._count(files=files)
+                    files = 0
+        os.rmdir(path)
+        self._count(files=files, dirs=1)
+
+    def _remove(self, path):
+        if os.path.isdir(path) and not os.path.islink(path):
+            self._remove_tree(path)
+        elif os.path.lexists(path):
+            os.remove(path)
+            self._count(files=1)
+
+    def _split(self, paths):
+        """Split the trees into subtrees to spread the work over the threads.
+
+        Returns the list of subtrees and files to be removed and the list of
+        directories to be removed after the subtrees are gone."""
+        work = []
+        roots = []
+        for path in paths:
+            if os.path.isdir(path) and not os.path.islink(path):
+                roots.append(path)
+                work.extend([e.path for e in scan(path)])
+            elif os.path.lexists(path):
+                work.append(path)
+        return work, roots
+
+    def _report(self, start):
+        while not self._done.wait(self.interval):
+            elapsed = time.time() - start
+            logger.info("Purging: removed %d files in %.0f seconds (%.0f files/sec).",
+                        self.files, elapsed, self.files / elapsed)
+
+    def purge(self, paths, keep=False):
+        """Remove the given trees and files.
+
+        paths: list of directories and files to be removed
+        keep:  remove the contents of the directories but keep the
+               directories themselves
+        """
+        start = time.time()
+        self._done.clear()
+        reporter = threading.Thread(target=self._report, args=(start,))
+        reporter.daemon = True
+        reporter.start()
+        try:
+            work, roots = self._split(paths)
+            parallel(self._remove, work, workers=self.workers)
+            if not keep:
+                for path in roots:
+                    os.rmdir(path)
+                    self._count(dirs=1)
+        finally:
+            self._done.set()
+        self.elapsed = time.time() - start
+        rate = self.files / self.elapsed if self.elapsed > 0 else 0.0
+        logger.info("Purged %d files and %d directories in %.1f seconds (%.0f files/sec).",
+                    self.files, self.dirs, self.elapsed, rate)
+
+    def purge_in_background(self, paths):
+        """Rename the trees aside and remove them in a background thread.
+
+        The original paths are free to be reused as soon as this returns.
+        Call wait() to wait for the removal to finish."""
+        aside = [stash(p) for p in paths if os.path.lexists(p)]
+        self.thread = threading.Thread(target=self.purge, args=(aside,))
+        self.thread.start()
+        return aside
+
+    def wait(self):
+        """Wait for a background purge to finish."""
+        if self.thread:
+            while self.thread.is_alive():
+                self.thread.join(0.2)
+            self.thread = None
+
+def purge(paths, workers=DEFAULT_WORKERS, background=False):
+    """Remove trees of files with a pool of threads."""
+    purger = Purger(workers=workers)
+    if background:
+        purger.purge_in_background(paths)
+    else:
+        purger.purge(paths)
+    return purger
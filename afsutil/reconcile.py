@@ -0,0 +1,267 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Bring a cell to the state given in a cell spec file.
+
+The spec file is an ini style file which declares the cell:
+
+    [cell]
+    name = example.com
+    realm = EXAMPLE.COM
+    admins = admin
+    db = afs01 afs02 afs03
+    fs = afs01 afs02
+
+    [volumes]
+    top = proj.a proj.b
+    replicas = 2
+    placement = most-free
+
+    [options]
+    dafileserver = -L
+
+    [options afs02]
+    fsprofile = large
+
+The options in an "options <hostname>" section apply only to that host; they
+are the same as the '<hostname>.<name>' options given on the command line.
+
+The current state of the cell is gathered in one concurrent pass, then
+compared with the spec to make an ordered plan of only the changes needed. A
+cell which already matches the spec results in an empty plan, so nothing is
+restarted.
+"""
+
+import logging
+import os
+
+try:
+    from configparser import ConfigParser # python3
+except ImportError:
+    from ConfigParser import ConfigParser # python2
+
+from afsutil.cell import Cell, DBNAMES
+from afsutil.system import afs_mountpoint
+from afsutil.misc import lists2dict, uniq
+from afsutil.volumes import BulkVolumes
+
+logger = logging.getLogger(__name__)
+
+def load_spec(path):
+    """Read a cell spec file.
+
+    returns: (cell, volumes) where cell is a dict of Cell arguments and
+             volumes is the list of top level volume names
+    """
+    if not os.path.exists(path):
+        raise AssertionError("Cell spec file %s not found." % path)
+    parser = ConfigParser()
+    parser.optionxform = str # Keep the case of option names.
+    parser.read(path)
+    if not parser.has_option('cell', 'name'):
+        raise AssertionError("Cell spec file %s is missing the cell name." % path)
+    def get(section, option, default=None):
+        if parser.has_option(section, option):
+            return parser.get(section, option)
+        return default
+    cell = {'cell': get('cell', 'name')}
+    for option in ('realm', 'keytab', 'admin'):
+        if parser.has_option('cell', option):
+            cell[option] = get('cell', option)
+    for option in ('admins', 'db', 'fs'):
+        if parser.has_option('cell', option):
+            cell[option] = get('cell', option).split()
+    if parser.has_option('volumes', 'replicas'):
+        cell['replicas'] = int(get('volumes', 'replicas'))
+    if parser.has_option('volumes', 'placement'):
+        cell['placement'] = get('volumes', 'placement')
+    options = {}
+    for section in parser.sections():
+        words = section.split()
+        if words[0] == 'options' and len(words) == 1:
+            options.update(parser.items(section))
+        elif words[0] == 'options' and len(words) == 2:
+            options.update(("%s.%s" % (words[1], k), v) for k,v in parser.items(section))
+    cell['options'] = options
+    volumes = get('volumes', 'top', '').split()
+    return (cell, volumes)
+
+class Action(object):
+    """A single step of a plan."""
+
+    def __init__(self, description, function, *args):
+        self.description = description
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return self.description
+
+    def run(self):
+        logger.info("%s.", self.description)
+        return self.function(*self.args)
+
+class Reconciler(object):
+    """Plan and apply the changes to bring a cell to its spec."""
+
+    def __init__(self, cell, volumes=None):
+        """
+        cell:    Cell object made from the spec
+        volumes: top level volume names
+        """
+        self.cell = cell
+        self.volumes = volumes or []
+        self.state = None
+
+    def snapshot(self):
+        """Gather the current state of the cell in one pass.
+
+        The databases are only queried if the first db server is running
+        them."""
+        self.state = self.cell.snapshot(databases=False)
+        if not self._is_new_cell():
+            self.state = self.cell.snapshot(databases=True)
+        return self.state
+
+    def _is_new_cell(self):
+        db = self.cell.db[0]
+        return not all(name in self.state.statuses(db.hostname) for name in DBNAMES)
+
+    def plan(self):
+        """Return the ordered list of actions needed."""
+        if self.state is None:
+            self.snapshot()
+        unreachable = [s for s in self.state.hosts.values() if s.error is not None]
+        for s in unreachable:
+            logger.error("Unable to get the configuration of host %s: %s", s.hostname, s.error)
+        if unreachable:
+            raise AssertionError("Unable to reach host%s %s" % \
+                ('s' if len(unreachable) > 1 else '', ', '.join(sorted(s.hostname for s in unreachable))))
+
+        cell = self.cell
+        actions = []
+        if self._is_new_cell():
+            actions.append(Action("Setup new cell %s" % cell.cell, cell.newcell))
+            if self.volumes:
+                actions.append(self._volume_action(self.volumes, []))
+            return actions
+
+        dbhosts = set(h.hostname for h in cell.db)
+        restart = []
+        for host in uniq(cell.db + cell.fs):
+            state = self.state.host(host.hostname)
+            if state.cellname != cell.cell:
+                actions.append(Action("Set cell name on %s" % host, host.setcellname, cell.cell))
+            if state.cellhosts != dbhosts:
+                actions.append(Action("Set cell hosts on %s" % host, host.setcellhosts, cell.db))
+                running = [n for n in DBNAMES if state.statuses.get(n) == 'running']
+                if running and host in cell.db:
+                    restart.append((host, running))
+            for admin in cell.admins:
+                if admin not in state.users:
+                    actions.append(Action("Add superuser %s on %s" % (admin, host), host.adduser, admin))
+
+        # New database servers are started first, then the database servers
+        # which are already running are restarted one at a time so the
+        # database stays available. Running servers are restarted only if
+        # their cell hosts were changed.
+        dbchanged = bool(restart)
+        for host in cell.db:
+            statuses = self.state.statuses(host.hostname)
+            if any(statuses.get(name) != 'running' for name in DBNAMES):
+                actions.append(Action("Start database servers on %s" % host, cell._create_databases, host))
+                dbchanged = True
+        if restart:
+            hosts = [host for host,_ in restart]
+            actions.append(Action("Restart database servers on %s one at a time" % \
+                                  ', '.join(str(h) for h in hosts), cell.rolling_restart, hosts))
+        if dbchanged:
+            actions.append(Action("Wait for database quorum", cell._wait_for_db_quorum))
+
+        for host in cell.fs:
+            bnode = 'dafs' if host.dafs else 'fs'
+            if self.state.statuses(host.hostname).get(bnode) != 'running':
+                actions.append(Action("Start fileserver on %s" % host, host.create_fileserver))
+
+        if self.state.administrators is not None:
+            for admin in cell.admins:
+                if admin not in self.state.administrators:
+                    actions.append(Action("Create admin user %s" % admin, cell._create_admin, admin))
+
+        if self.state.vldb is not None:
+            vldb = self.state.vldb
+            create = [name for name in self.volumes if name not in vldb]
+            replicate = [name for name in self.volumes
+                         if name in vldb and len(vldb[name][1]) < cell.replicas]
+            if create or replicate:
+                actions.append(self._volume_action(create, replicate))
+        return actions
+
+    def _volume_action(self, create, replicate):
+        names = create + replicate
+        description = "Setup volume%s %s" % ('s' if len(names) > 1 else '', ', '.join(names))
+        return Action(description, self._setup_volumes, create, replicate)
+
+    def _setup_volumes(self, create, replicate):
+        cell = self.cell
+        specs = [(name,) + cell.placement.choose() for name in create]
+        specs += [(name, None, None) for name in replicate]
+        bulk = BulkVolumes(workers=cell.workers, per_server=cell.per_server,
+                           replicas=cell.replicas, placement=cell.placement,
+                           gate=cell.write_gate, vldb=cell.vldb)
+        failed = [r.item[0] for r in bulk.run(specs) if not r.ok]
+        if failed:
+            raise AssertionError("Failed to setup volume%s %s" % ('s' if len(failed) > 1 else '', ', '.join(failed)))
+        if create:
+            if afs_mountpoint() is None:
+                logger.warning("Skipping mount of new volumes; afs is not mounted.")
+            else:
+                cell.mount_volumes(create)
+
+    def run(self, actions=None):
+        """Run the planned actions in order."""
+        if actions is None:
+            actions = self.plan()
+        if not actions:
+            logger.info("Cell %s is up to date.", self.cell.cell)
+        for action in actions:
+            action.run()
+        if actions and self.cell.snapshot_path:
+            self.state = self.cell.snapshot(refresh=True) # Save the new state.
+        return actions
+
+def reconcile(**kwargs):
+    spec = kwargs.pop('spec')
+    planonly = kwargs.pop('plan', False)
+    cell, volumes = load_spec(spec)
+    options = cell.pop('options', {})
+    options.update(lists2dict(kwargs.pop('options', None)))
+    cell.update((k,v) for k,v in kwargs.items() if v not in (None, []))
+    cell['options'] = options
+    reconciler = Reconciler(Cell(**cell), volumes)
+    actions = reconciler.plan()
+    if planonly:
+        if not actions:
+            logger.info("Cell %s is up to date.", reconciler.cell.cell)
+        for n, action in enumerate(actions, 1):
+            logger.info("%2d. %s", n, action)
+        return 0
+    reconciler.run(actions)
+    return 0
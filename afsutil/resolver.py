@@ -0,0 +1,154 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Resolve host names to addresses.
+
+Names are resolved concurrently and the results are cached for a limited
+time, so the same names may be looked up by the installer, the cell setup,
+and the system checks without repeating slow resolver queries. All of the
+IPv4 addresses of a name are returned, in resolver order.
+
+An optional hosts file in /etc/hosts format is consulted before the system
+resolver.
+"""
+
+import logging
+import re
+import socket
+import threading
+import time
+
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300 # seconds
+
+def is_address(name):
+    """Returns true if name is a dotted quad IPv4 address."""
+    return re.match(r'^\d+\.\d+\.\d+\.\d+$', name) is not None
+
+def read_hosts_file(path):
+    """Read a hosts file into a dict of names to lists of IPv4 addresses."""
+    hosts = {}
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split('#', 1)[0].split()
+            if len(fields) < 2 or not is_address(fields[0]):
+                continue
+            for name in fields[1:]:
+                addrs = hosts.setdefault(name, [])
+                if fields[0] not in addrs:
+                    addrs.append(fields[0])
+    return hosts
+
+class Resolver(object):
+    """Concurrent host name resolver with a time limited cache."""
+
+    def __init__(self, ttl=DEFAULT_TTL, hostsfile=None, workers=DEFAULT_WORKERS):
+        """Initialize the resolver.
+
+        ttl:       seconds to keep results in the cache
+        hostsfile: optional hosts file to check before the system resolver
+        workers:   maximum number of concurrent lookups
+        """
+        self.ttl = ttl
+        self.workers = workers
+        self.hosts = {}
+        if hostsfile:
+            self.hosts = read_hosts_file(hostsfile)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, name):
+        """Lookup the addresses of a name without the cache."""
+        if is_address(name):
+            return [name]
+        if name in self.hosts:
+            return list(self.hosts[name])
+        addrs = []
+        for info in socket.getaddrinfo(name, None, socket.AF_INET, socket.SOCK_STREAM):
+            addr = info[4][0]
+            if addr not in addrs:
+                addrs.append(addr)
+        return addrs
+
+    def _cached(self, name):
+        with self._lock:
+            entry = self._cache.get(name)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+        return None
+
+    def resolve(self, name):
+        """Return the list of addresses of a name.
+
+        Raises socket.gaierror if the name cannot be resolved."""
+        addrs = self._cached(name)
+        if addrs is None:
+            start = time.time()
+            addrs = self._lookup(name)
+            logger.debug("Resolved %s to %s in %.3f seconds.", name, ",".join(addrs), time.time() - start)
+            with self._lock:
+                self._cache[name] = (time.time() + self.ttl, addrs)
+        return list(addrs)
+
+    def resolve_all(self, names, raise_errors=True):
+        """Resolve a list of names concurrently.
+
+        Returns a dict of names to lists of addresses. If raise_errors is
+        false, names which cannot be resolved are given an empty list."""
+        names = [n for n in set(names)]
+        results = parallel(self.resolve, names, workers=self.workers, raise_errors=raise_errors)
+        resolved = {}
+        for r in results:
+            resolved[r.item] = r.value if r.ok else []
+        return resolved
+
+    def clear(self):
+        """Discard the cached results."""
+        with self._lock:
+            self._cache.clear()
+
+# The resolver shared by the afsutil modules.
+resolver = Resolver()
+
+def resolve(name):
+    """Return the list of addresses of a name with the shared resolver."""
+    return resolver.resolve(name)
+
+def resolve_all(names, raise_errors=True):
+    """Resolve a list of names concurrently with the shared resolver."""
+    return resolver.resolve_all(names, raise_errors=raise_errors)
+
+def addresses(names):
+    """Return the set of addresses of a list of host names or addresses.
+
+    Use to compare hosts named in different forms, e.g. the configured
+    hostnames and the names reported by vos. A name which cannot be
+    resolved is kept as is, so it still matches the same name."""
+    addrs = set()
+    for name in names:
+        try:
+            found = resolve(name)
+        except socket.error:
+            found = []
+        addrs.update(found or [name])
+    return addrs
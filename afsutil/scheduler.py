@@ -0,0 +1,147 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Run setup steps in ordered phases.
+
+A phase is a set of independent tasks, typically one per host, which are run
+concurrently with a bounded pool of threads. Phases are run one after another,
+so a phase may depend on everything done by the phases before it. The elapsed
+time of each phase is kept. Progress may be recorded in a journal (see
+afsutil.journal) so a failed run can be resumed.
+"""
+
+import logging
+import time
+
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+class Phase(object):
+    """A named set of tasks which may run concurrently."""
+
+    def __init__(self, name, function, items=None, verify=None, checkpoint=True):
+        """
+        name:       phase name
+        function:   callable; called once with no arguments if items is None,
+                    otherwise called once for each item
+        items:      optional list of items, e.g., Host objects
+        verify:     optional callable to check a phase completed previously
+                    is still in effect; called with no arguments, or with
+                    an item, like function
+        checkpoint: record the completion of the phase in the journal
+        """
+        self.name = name
+        self.function = function
+        self.items = items
+        self.verify = verify
+        self.checkpoint = checkpoint
+        self.elapsed = None
+        self.skipped = False
+
+    def _done(self, journal, item=None):
+        """Return true if the journal shows this was done and it still holds."""
+        if journal is None or not self.checkpoint:
+            return False
+        if not journal.completed(self.name, item):
+            return False
+        if self.verify is None:
+            return True
+        args = () if item is None else (item,)
+        try:
+            return bool(self.verify(*args))
+        except Exception as e:
+            logger.debug("Verify of phase '%s' failed: %s", self.name, e)
+            return False
+
+    def run(self, workers=DEFAULT_WORKERS, journal=None):
+        start = time.time()
+        try:
+            if self._done(journal):
+                self.skipped = True
+                return
+            if self.items is None:
+                self.function()
+            else:
+                def _task(item):
+                    if self._done(journal, item):
+                        logger.info("Skipping %s for %s; already done.", self.name, item)
+                        return
+                    t = time.time()
+                    self.function(item)
+                    if journal is not None and self.checkpoint:
+                        journal.complete(self.name, time.time() - t, item)
+                results = parallel(_task, self.items, workers=workers, raise_errors=False)
+                failed = [r for r in results if not r.ok]
+                for r in failed:
+                    logger.error("Phase '%s' failed for %s: %s", self.name, r.item, r.error)
+                if failed:
+                    raise failed[0].error
+            if journal is not None and self.checkpoint:
+                journal.complete(self.name, time.time() - start)
+        finally:
+            self.elapsed = time.time() - start
+
+class Scheduler(object):
+    """Run phases in order, running the tasks within a phase concurrently.
+
+    If a journal is given, completed phases are recorded in it, and phases
+    recorded by an earlier run are skipped when their verify check passes.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, journal=None, changed=None):
+        """
+        workers: maximum number of tasks run at the same time
+        journal: optional Journal to record the completed phases
+        changed: optional callable, called with no arguments after each
+                 phase which was run, e.g., to discard cached state
+        """
+        self.workers = workers
+        self.journal = journal
+        self.changed = changed
+        self.phases = []
+
+    def add(self, name, function, items=None, verify=None, checkpoint=True):
+        """Add a phase. Returns the Phase object."""
+        phase = Phase(name, function, items, verify=verify, checkpoint=checkpoint)
+        self.phases.append(phase)
+        return phase
+
+    def run(self):
+        """Run the phases in the order added."""
+        start = time.time()
+        for phase in self.phases:
+            if phase.items is not None and len(phase.items) == 0:
+                continue
+            logger.info("Starting phase: %s.", phase.name)
+            try:
+                phase.run(workers=self.workers, journal=self.journal)
+            finally:
+                if self.changed is not None and not phase.skipped:
+                    self.changed()
+            if phase.skipped:
+                logger.info("Skipped phase: %s; completed by a previous run.", phase.name)
+            else:
+                logger.info("Finished phase: %s (%.1f seconds).", phase.name, phase.elapsed)
+        logger.info("Finished %d phases in %.1f seconds.", len(self.phases), time.time() - start)
+
+    def durations(self):
+        """Return a list of (phase name, elapsed seconds) for the phases run."""
+        return [(p.name, p.elapsed) for p in self.phases if p.elapsed is not None]
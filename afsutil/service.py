@@ -28,6 +28,11 @@ from afsutil.system import sh, is_afs_mounted, afs_umount, unload_module, get_ru
 logger = logging.getLogger(__name__)
 
 COMPONENTS = ['client', 'server']
+SERVERS = ('bosserver', 'upserver', 'upclient',
+           'buserver', 'bucoord', 'butc',
+           'vlserver', 'ptserver',
+           'fileserver', 'volserver',
+           'dafileserver', 'davolserver', 'salvageserver')
 
 def check_component_names(components):
     """Raises a value error if an unknown component name is given."""
@@ -89,12 +94,7 @@ def stop(**kwargs):
     if 'server' in components:
         if is_running('bosserver'):
             _rc('server', 'stop')
-        servers = ('bosserver', 'upserver', 'upclient',
-                   'buserver', 'bucoord', 'butc',
-                   'vlserver', 'ptserver',
-                   'fileserver', 'volserver',
-                   'dafileserver', 'davolserver', 'salvageserver')
-        still_running = get_running().intersection(servers)
+        still_running = get_running().intersection(SERVERS)
         if still_running:
             raise AssertionError("Servers still running! %s" % (" ".join(list(still_running))))
 
@@ -0,0 +1,303 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Gather the state of a cell in one pass.
+
+A CellSnapshot holds the bos status, cell name, cell hosts and superusers of
+every server host, the volume sites of the whole vldb, and the members of
+system:administrators. The hosts are queried concurrently, and the vldb and
+pts queries run alongside them. A snapshot can be saved to a compact json
+file and reused by later runs while it is fresh.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from afsutil.cmd import bos, pts
+from afsutil.system import CommandFailed
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+from afsutil.vldb import VLDB
+
+logger = logging.getLogger(__name__)
+
+def bos_status(hostname):
+    """Retrieve the status of each bnode instance on a host."""
+    output = bos('status', '-server', hostname, '-long')
+    statuses = {}
+    for line in output.splitlines():
+        match = re.match(r'Instance ([^,]+),', line)
+        if match:
+            bnode = match.group(1)
+            match = re.search(r'currently (\w+)', line)
+            if match:
+                statuses[bnode] = match.group(1)
+            else:
+                statuses[bnode] = 'unknown'
+    return statuses
+
+def bos_listhosts(hostname):
+    """Retrieve the cell name and cell hosts of a host."""
+    output = bos('listhosts', '-server', hostname)
+    cellname = None
+    cellhosts = set()
+    for line in output.splitlines():
+        match = re.match(r'Cell name is (\S+)', line)
+        if match:
+            cellname = match.group(1)
+        match = re.match(r'\s+Host \S+ is (\S+)', line)
+        if match:
+            cellhosts.add(match.group(1))
+    return (cellname, cellhosts)
+
+def bos_listusers(hostname):
+    """Retrieve the superusers of a host."""
+    output = bos('listusers', '-server', hostname)
+    return output.replace('SUsers are:', '').split()
+
+class HostState(object):
+    """The current configuration of a server host."""
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.error = None
+        self.statuses = {}
+        self.cellname = None
+        self.cellhosts = set()
+        self.users = []
+
+    def to_dict(self):
+        return {
+            'hostname': self.hostname,
+            'error': str(self.error) if self.error else None,
+            'statuses': self.statuses,
+            'cellname': self.cellname,
+            'cellhosts': sorted(self.cellhosts),
+            'users': self.users,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls(d['hostname'])
+        state.error = d.get('error')
+        state.statuses = d.get('statuses', {})
+        state.cellname = d.get('cellname')
+        state.cellhosts = set(d.get('cellhosts', []))
+        state.users = d.get('users', [])
+        return state
+
+def host_state(hostname):
+    """Gather the current configuration of a host."""
+    state = HostState(hostname)
+    try:
+        state.statuses = bos_status(hostname)
+        state.cellname, state.cellhosts = bos_listhosts(hostname)
+        state.users = bos_listusers(hostname)
+    except CommandFailed as e:
+        state.error = e
+    return state
+
+def _listvldb():
+    try:
+        return VLDB().load().as_sites()
+    except CommandFailed as e:
+        logger.warning("Unable to list the vldb: %s", e.out.strip())
+        return None
+
+def _administrators():
+    try:
+        output = pts('membership', 'system:administrators', quiet=True)
+    except CommandFailed as e:
+        logger.warning("Unable to list the administrators: %s", e.out.strip())
+        return None
+    return [line.strip() for line in output.splitlines()[1:]]
+
+class CellSnapshot(object):
+    """The state of the servers and databases of a cell at one time."""
+
+    def __init__(self, cell, hostnames):
+        """
+        cell:      cell name
+        hostnames: server hostnames
+        """
+        self.cell = cell
+        self.hostnames = list(hostnames)
+        self.timestamp = None
+        self.hosts = {}
+        self.databases = False
+        self.vldb = None
+        self.administrators = None
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    @property
+    def age(self):
+        """Seconds since the snapshot was taken."""
+        if self.timestamp is None:
+            return None
+        return time.time() - self.timestamp
+
+    def gather(self, databases=True, workers=DEFAULT_WORKERS):
+        """Query the hosts, and optionally the databases, concurrently.
+
+        The vldb and pts queries are skipped if databases is false, e.g.,
+        when the cell is new and the db servers are not running yet."""
+        start = time.time()
+        tasks = [('host', h) for h in self.hostnames]
+        if databases:
+            tasks += [('vldb', None), ('pts', None)]
+        def _query(task):
+            kind, hostname = task
+            if kind == 'host':
+                return host_state(hostname)
+            if kind == 'vldb':
+                return _listvldb()
+            return _administrators()
+        results = parallel(_query, tasks, workers=max(1, min(workers, len(tasks))))
+        self.hosts = {}
+        self._stale = set()
+        self.databases = databases
+        self.vldb = None
+        self.administrators = None
+        for r in results:
+            kind, hostname = r.item
+            if kind == 'host':
+                self.hosts[hostname] = r.value
+            elif kind == 'vldb':
+                self.vldb = r.value
+            else:
+                self.administrators = r.value
+        self.timestamp = start
+        logger.info("Gathered the state of %d hosts in %.1f seconds.",
+                    len(self.hostnames), time.time() - start)
+        return self
+
+    def gather_databases(self):
+        """Add the vldb and pts state to a snapshot gathered without them."""
+        results = parallel(lambda f: f(), [_listvldb, _administrators], workers=2)
+        self.vldb, self.administrators = [r.value for r in results]
+        self.databases = True
+        return self
+
+    def invalidate(self, hostname=None):
+        """Mark the state of a host, or of all of the hosts and the databases, out of date.
+
+        A host which is out of date is queried again the next time it is
+        looked up."""
+        with self._lock:
+            if hostname is None:
+                self._stale.update(self.hosts)
+                self.databases = False
+            else:
+                self._stale.add(hostname)
+
+    def host(self, hostname):
+        """Return the HostState of a host.
+
+        The host is queried if it is not in the snapshot or is out of date."""
+        with self._lock:
+            fetch = hostname in self._stale or hostname not in self.hosts
+            self._stale.discard(hostname)
+        if not fetch:
+            return self.hosts[hostname]
+        state = host_state(hostname)
+        with self._lock:
+            self.hosts[hostname] = state
+        return state
+
+    def statuses(self, hostname):
+        """Return the bnode instance statuses of a host."""
+        return self.host(hostname).statuses
+
+    def volume_exists(self, name):
+        return self.vldb is not None and name in self.vldb
+
+    def volume_sites(self, name):
+        """Return the (rw site, ro sites) of a volume, or None."""
+        if self.vldb is None:
+            return None
+        return self.vldb.get(name)
+
+    def to_dict(self):
+        return {
+            'cell': self.cell,
+            'timestamp': self.timestamp,
+            'hosts': [self.hosts[h].to_dict() for h in sorted(self.hosts)],
+            'databases': self.databases,
+            'vldb': None if self.vldb is None else
+                dict((k, [rw, ro]) for k,(rw,ro) in self.vldb.items()),
+            'administrators': self.administrators,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        hosts = [HostState.from_dict(h) for h in d.get('hosts', [])]
+        snapshot = cls(d['cell'], [h.hostname for h in hosts])
+        snapshot.timestamp = d.get('timestamp')
+        snapshot.hosts = dict((h.hostname, h) for h in hosts)
+        snapshot.databases = d.get('databases', False)
+        vldb = d.get('vldb')
+        if vldb is not None:
+            snapshot.vldb = dict((k, (tuple(rw) if rw else None, [tuple(s) for s in ro]))
+                                 for k,(rw,ro) in vldb.items())
+        snapshot.administrators = d.get('administrators')
+        return snapshot
+
+    def save(self, path):
+        """Write the snapshot to a json file atomically."""
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.snapshot.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'), sort_keys=True)
+            os.rename(tmp, path)
+        except:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path, cell=None, hostnames=None, max_age=None):
+        """Read a snapshot file.
+
+        returns: the snapshot, or None if the file is missing, unreadable,
+                 older than max_age seconds, or for a different cell or set
+                 of hosts
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                snapshot = cls.from_dict(json.load(f))
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+            return None
+        if cell is not None and snapshot.cell != cell:
+            return None
+        if hostnames is not None and set(hostnames) != set(snapshot.hosts):
+            return None
+        if max_age is not None and (snapshot.age is None or snapshot.age > max_age):
+            logger.info("Ignoring snapshot %s; %.0f seconds old.", path, snapshot.age or 0)
+            return None
+        logger.info("Using snapshot %s; %.0f seconds old.", path, snapshot.age)
+        return snapshot
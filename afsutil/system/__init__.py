@@ -25,7 +25,9 @@ mkdirp = _mod.mkdirp
 network_interfaces = _mod.network_interfaces
 nproc = _mod.nproc
 path_join = _mod.path_join
+physical_memory = _mod.physical_memory
 sh = _mod.sh
+sh_lines = _mod.sh_lines
 symlink = _mod.symlink
 tar = _mod.tar
 touch = _mod.touch
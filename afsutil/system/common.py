@@ -24,6 +24,8 @@ import logging
 import os
 import subprocess
 import sys
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +75,21 @@ class CommandFailed(Exception):
               (self.cmd, self.code, self.out.strip())
         return repr(msg)
 
+def _start_timer(p, timeout):
+    """Kill the process if it runs longer than timeout seconds."""
+    if not timeout:
+        return None
+    def _kill():
+        logger.error("Killing process %d; timed out after %d seconds.", p.pid, timeout)
+        try:
+            p.kill()
+        except OSError:
+            pass # Already exited.
+    timer = threading.Timer(timeout, _kill)
+    timer.daemon = True
+    timer.start()
+    return timer
+
 def sh(*args, **kwargs):
     """Execute the command line arguments.
 
@@ -87,6 +104,10 @@ def sh(*args, **kwargs):
     sed:      output line filter function (default: None)
     dryrun:   print the command instead of executing it (defualt: False)
     tailsize: number of lines to report when output=False (default:20)
+    env:      environment variables (default: os.environ)
+    cwd:      working directory of the command (default: current directory)
+    timeout:  seconds before the command is killed (default: None)
+    tracer:   function called with (cmdline, code, elapsed) (default: None)
     """
     output = kwargs.get('output', True)
     quiet = kwargs.get('quiet', False)
@@ -94,6 +115,10 @@ def sh(*args, **kwargs):
     sed = kwargs.get('sed', None)
     dryrun = kwargs.get('dryrun', False)
     tailsize = kwargs.get('tailsize', 20)
+    env = kwargs.get('env', None)
+    cwd = kwargs.get('cwd', None)
+    timeout = kwargs.get('timeout', None)
+    tracer = kwargs.get('tracer', None)
 
     # Fixup the argument list for Popen.
     # 1. Create a tuple if just one arg was given.
@@ -104,7 +129,7 @@ def sh(*args, **kwargs):
 
     # Be sure the first arg is actually a program, otherwise Popen
     # will fail with a cryptic exception.
-    args[0] = which(args[0], raise_errors=True)
+    args[0] = which(args[0], raise_errors=True, env=env)
     cmdline = subprocess.list2cmdline(args)
 
     # Dryrun mode: Just print what would be run.
@@ -128,11 +153,14 @@ def sh(*args, **kwargs):
             logger.info("%s: running: %s", prefix, cmdline)
         else:
             logger.info("running: %s", cmdline)
+    start = time.time()
     p = subprocess.Popen(args,
                         bufsize=1,
-                        env=os.environ,
+                        env=os.environ if env is None else env,
+                        cwd=cwd,
                         stdout=subprocess.PIPE,
                         stderr=subprocess.STDOUT) # Redirect stderr capture errors.
+    timer = _start_timer(p, timeout)
     with p.stdout:
         for line in iter(p.stdout.readline, ''):
             line = line.rstrip("\n")
@@ -149,6 +177,10 @@ def sh(*args, **kwargs):
                 if line:
                     lines.append(line)
     code = p.wait()
+    if timer:
+        timer.cancel()
+    if tracer:
+        tracer(cmdline, code, time.time() - start)
     if code != 0:
         if tail:
             lines = tail.get()
@@ -156,12 +188,63 @@ def sh(*args, **kwargs):
         raise CommandFailed(args, code, out)
     return lines
 
-def which(program, extra_paths=None, raise_errors=False):
+def sh_lines(*args, **kwargs):
+    """Execute the command line arguments and generate the output lines.
+
+    Like sh(), but the output lines are yielded as they are read, so
+    large outputs can be processed without holding all of the lines in
+    memory. Raises a CommandFailed exception after the last line if the
+    command exits with a non-zero code.
+
+    args:     command-line arguments
+    quiet:    do not log the command line (default: False)
+    tailsize: number of lines to report on failure (default:20)
+    env, cwd, timeout, tracer: see sh()
+    """
+    quiet = kwargs.get('quiet', False)
+    tailsize = kwargs.get('tailsize', 20)
+    env = kwargs.get('env', None)
+    cwd = kwargs.get('cwd', None)
+    timeout = kwargs.get('timeout', None)
+    tracer = kwargs.get('tracer', None)
+    args = [arg.__str__() for arg in args]
+    args[0] = which(args[0], raise_errors=True, env=env)
+    cmdline = subprocess.list2cmdline(args)
+    if quiet:
+        logger.debug("running: %s", cmdline)
+    else:
+        logger.info("running: %s", cmdline)
+    tail = RingBuffer(tailsize)
+    start = time.time()
+    p = subprocess.Popen(args,
+                        bufsize=1,
+                        env=os.environ if env is None else env,
+                        cwd=cwd,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT)
+    timer = _start_timer(p, timeout)
+    try:
+        with p.stdout:
+            for line in iter(p.stdout.readline, ''):
+                line = line.rstrip("\n")
+                tail.append(line)
+                yield line
+    finally:
+        code = p.wait()
+        if timer:
+            timer.cancel()
+    if tracer:
+        tracer(cmdline, code, time.time() - start)
+    if code != 0:
+        raise CommandFailed(args, code, "\n".join(tail.get()))
+
+def which(program, extra_paths=None, raise_errors=False, env=None):
     """Find a program in the PATH.
 
     program: program name or program full path
     extra_paths: list of paths to search in addition to PATH
     raise_errors: raise an exception if not found (default: False)
+    env: environment variables with the PATH (default: os.environ)
     """
     if not isinstance(program, basestring):
         raise ValueError("which() requires a string argument")
@@ -174,7 +257,9 @@ def which(program, extra_paths=None, raise_errors=False):
             raise CommandMissing("Program '%s' is not an executable file." % (program))
     else:
         # Just the basename was given; search the paths.
-        paths = os.environ['PATH'].split(os.pathsep)
+        if env is None:
+            env = os.environ
+        paths = env.get('PATH', '').split(os.pathsep)
         if extra_paths:
             paths = paths + extra_paths
         for path in paths:
@@ -222,6 +307,15 @@ def nproc():
         return 1  # default
     return int(sh('nproc')[0])
 
+def physical_memory():
+    """Return the size of the physical memory in kilobytes."""
+    try:
+        pages = os.sysconf('SC_PHYS_PAGES')
+        pagesize = os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 0 # unknown
+    return (pages * pagesize) // 1024
+
 def mkdirp(path):
     """Make a directory with parents."""
     # Do not raise an execption if the directory already exists.
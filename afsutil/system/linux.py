@@ -34,15 +34,34 @@ file_should_exist = _mod.file_should_exist
 mkdirp = _mod.mkdirp
 nproc = _mod.nproc
 path_join = _mod.path_join
+physical_memory = _mod.physical_memory
 sh = _mod.sh
+sh_lines = _mod.sh_lines
 symlink = _mod.symlink
 touch = _mod.touch
 which = _mod.which
 
 logger = logging.getLogger(__name__)
 
+def _get_running_proc():
+    """Get a set of running processes from /proc, without a fork."""
+    procs = set()
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/%s/cmdline' % pid, 'r') as f:
+                argv0 = f.read().split('\0')[0]
+        except IOError:
+            continue # Exited.
+        if argv0: # Kernel threads have no command line.
+            procs.add(os.path.basename(argv0.split()[0]))
+    return procs
+
 def get_running():
     """Get a set of running processes."""
+    if os.path.isdir('/proc/self'):
+        return _get_running_proc()
     ps = which('ps')
     lines = sh(ps, '-e', '-f', quiet=True)
     # The first line of the `ps' output is a header line which is
@@ -63,6 +82,13 @@ def is_running(program):
 
 def afs_mountpoint():
     mountpoint = None
+    if os.path.isfile('/proc/mounts'):
+        with open('/proc/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == 'afs':
+                    mountpoint = fields[1]
+        return mountpoint
     pattern = r'^AFS on (/.\S+)'
     mount = which('mount', extra_paths=['/bin', '/sbin', '/usr/sbin'])
     output = sh(mount, quiet=True)
@@ -125,6 +151,13 @@ def configure_dynamic_linker(path):
     sh('/sbin/ldconfig')
 
 def unload_module():
+    if os.path.isfile('/proc/modules'):
+        with open('/proc/modules', 'r') as f:
+            kmods = [line.split()[0] for line in f]
+        for kmod in kmods:
+            if kmod in ('libafs', 'openafs'):
+                sh('rmmod', kmod)
+        return
     output = sh('/sbin/lsmod')
     for line in output:
         kmods = re.findall(r'^(libafs|openafs)\s', line)
@@ -142,12 +175,4 @@ def tar(tarball, source_path, tar=None):
 def untar(tarball, chdir=None, tar=None):
     if tar is None:
         tar = 'tar'
-    savedir = None
-    if chdir:
-        savedir = os.getcwd()
-        os.chdir(chdir)
-    try:
-        sh(tar, 'xzf', tarball, quiet=True)
-    finally:
-        if savedir:
-            os.chdir(savedir)
+    sh(tar, 'xzf', os.path.abspath(tarball), quiet=True, cwd=chdir)
@@ -34,7 +34,9 @@ file_should_exist = _mod.file_should_exist
 mkdirp = _mod.mkdirp
 nproc = _mod.nproc
 path_join = _mod.path_join
+physical_memory = _mod.physical_memory
 sh = _mod.sh
+sh_lines = _mod.sh_lines
 symlink = _mod.symlink
 touch = _mod.touch
 which = _mod.which
@@ -127,15 +129,7 @@ def tar(tarball, source_path, tar=None):
 def untar(tarball, chdir=None, tar=None):
     if tar is None:
         tar = 'gtar'
-    savedir = None
-    if chdir:
-        savedir = os.getcwd()
-        os.chdir(chdir)
-    try:
-        sh(tar, 'xzf', tarball, quiet=True)
-    finally:
-        if savedir:
-            os.chdir(savedir)
+    sh(tar, 'xzf', os.path.abspath(tarball), quiet=True, cwd=chdir)
 
 def _so_symlinks(path):
     """Create shared lib symlinks."""
@@ -0,0 +1,145 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Teardown a test cell in one pass.
+
+The client and the servers are stopped concurrently, then the processes are
+waited for by reading /proc, the kernel module is unloaded, the binaries
+are removed, and the config, volumes and cache are purged together by the
+parallel purger. The time of each phase is reported, since tearing down
+cells is a large part of the time of a test run.
+"""
+
+import logging
+import time
+
+from afsutil.system import is_afs_mounted, afs_umount, unload_module, get_running
+from afsutil.service import check_component_names, SERVERS, _rc
+from afsutil.install import installer
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+from afsutil.purge import Purger
+from afsutil.poll import wait_until
+
+logger = logging.getLogger(__name__)
+
+class Teardown(object):
+    """Stop the services, remove the binaries and purge the cell data."""
+
+    def __init__(self, dist='transarc', components=None, purge=True,
+                 workers=DEFAULT_WORKERS, timeout=120, **kwargs):
+        """
+        dist:       distribution type to be removed
+        components: 'client' and/or 'server'; default is both
+        purge:      purge the config, volumes and cache
+        workers:    number of threads to purge files
+        timeout:    seconds to wait for the processes to exit
+        kwargs:     other installer arguments
+        """
+        self.components = check_component_names(components)
+        self.do_purge = purge
+        self.workers = workers
+        self.timeout = timeout
+        self.installer = installer(dist, components=self.components, purge=False,
+                                   workers=workers, **kwargs)
+        self.timings = [] # (phase, seconds)
+
+    def _phase(self, name, function):
+        start = time.time()
+        try:
+            return function()
+        finally:
+            self.timings.append((name, time.time() - start))
+
+    def _stop_client(self):
+        if is_afs_mounted():
+            _rc('client', 'stop')
+        if is_afs_mounted():
+            afs_umount()
+
+    def _stop_server(self):
+        if 'bosserver' in get_running():
+            _rc('server', 'stop')
+
+    def stop(self):
+        """Stop the client and the servers concurrently."""
+        stops = []
+        if 'client' in self.components:
+            stops.append(self._stop_client)
+        if 'server' in self.components:
+            stops.append(self._stop_server)
+        parallel(lambda f: f(), stops)
+
+    def wait(self):
+        """Wait for the afs processes to exit."""
+        programs = set()
+        if 'server' in self.components:
+            programs.update(SERVERS)
+        if 'client' in self.components:
+            programs.add('afsd')
+        def _exited():
+            return not get_running().intersection(programs)
+        wait_until(_exited, "afs processes to exit", timeout=self.timeout,
+                   initial=0.1, maximum=1.0)
+        if 'client' in self.components and is_afs_mounted():
+            raise AssertionError("Failed to unmount afs.")
+
+    def unload(self):
+        if 'client' in self.components:
+            unload_module()
+
+    def remove(self):
+        """Remove the binaries."""
+        self.installer.remove()
+
+    def purge(self):
+        """Purge the config, volumes and cache with one pool of threads."""
+        if self.do_purge:
+            paths = self.installer.purge_paths()
+            if paths:
+                Purger(workers=self.workers).purge(paths)
+
+    def run(self):
+        """Run all of the phases.
+
+        returns: list of (phase, seconds)
+        """
+        for name, function in (('stop', self.stop), ('wait', self.wait),
+                               ('unload', self.unload), ('remove', self.remove),
+                               ('purge', self.purge)):
+            self._phase(name, function)
+        return self.timings
+
+def format_timings(timings):
+    """Format a table of the phase timings."""
+    lines = ["%-8s  %8s" % ('phase', 'seconds')]
+    for name, seconds in timings:
+        lines.append("%-8s  %8.1f" % (name, seconds))
+    lines.append("%-8s  %8.1f" % ('total', sum(s for n, s in timings)))
+    return "\n".join(lines)
+
+def teardown(**kwargs):
+    kwargs['purge'] = not kwargs.pop('no_purge', False)
+    t = Teardown(**kwargs)
+    try:
+        t.run()
+    finally:
+        for line in format_timings(t.timings).splitlines():
+            logger.info(line)
+    return 0
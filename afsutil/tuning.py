@@ -0,0 +1,405 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Performance tuning for the OpenAFS cache manager and fileservers.
+
+Compute the cache size and the afsd cache options from the hardware of this
+system: the size of the cache partition, the amount of memory, and the number
+of processors. The values are scaled by a named profile. The reasons for each
+value are kept so they can be logged.
+
+Fileserver profiles give a consistent set of fileserver command line options
+for the bos create commands.
+"""
+
+import glob
+import logging
+import os
+import re
+import shlex
+import socket
+
+from afsutil.system import nproc, physical_memory
+
+logger = logging.getLogger(__name__)
+
+KB = 1
+MB = 1024 * KB
+GB = 1024 * MB
+
+LEGACY_CACHE_SIZE = 102000  # k blocks; used when tuning is disabled.
+MIN_CACHE_SIZE = 10 * MB
+
+#
+# Cache manager profiles. Sizes are in kilobytes. The chunksize is log2 of the
+# chunk size in bytes.
+#
+# max_size:  upper limit of the disk cache size
+# share:     fraction of the free space to use when the cache directory is not
+#            on a dedicated partition
+# chunksize: afsd -chunksize
+# stat:      afsd -stat, upper limit; reduced on systems with little memory
+# dcache:    upper limit of afsd -dcache
+# daemons:   afsd -daemons, upper limit; reduced on systems with few cpus
+# memcache:  use a memory cache when the system has at least this much memory
+#
+CACHE_PROFILES = {
+    'small': {
+        'max_size': 1 * GB,
+        'share': 0.50,
+        'chunksize': 17,
+        'stat': 4000,
+        'dcache': 10000,
+        'daemons': 2,
+        'memcache': None,
+    },
+    'large': {
+        'max_size': 64 * GB,
+        'share': 0.75,
+        'chunksize': 20,
+        'stat': 40000,
+        'dcache': 50000,
+        'daemons': 6,
+        'memcache': None,
+    },
+    'hpc': {
+        'max_size': 256 * GB,
+        'share': 0.85,
+        'chunksize': 20,
+        'stat': 100000,
+        'dcache': 100000,
+        'daemons': 16,
+        'memcache': 64 * GB,
+    },
+}
+CACHE_PROFILE_NAMES = sorted(CACHE_PROFILES.keys())
+
+# afsd options which take a value.
+AFSD_VALUE_OPTIONS = ('-blocks', '-chunksize', '-dcache', '-daemons', '-files', '-stat')
+
+#
+# Fileserver profiles. The values are the fileserver (and dafileserver)
+# command line options. The -L (large) and -S (small) options set the
+# defaults for the options not given.
+#
+FILESERVER_PROFILES = {
+    'small': [
+        ('-p', '32'),
+        ('-cb', '64000'),
+        ('-udpsize', '1048576'),
+        ('-vc', '400'),
+        ('-s', '1200'),
+        ('-rxpck', '400'),
+    ],
+    'large': [
+        ('-L', None),
+        ('-p', '128'),
+        ('-cb', '1000000'),
+        ('-udpsize', '4194304'),
+        ('-vc', '1000'),
+        ('-s', '10000'),
+        ('-rxpck', '800'),
+    ],
+    'huge': [
+        ('-L', None),
+        ('-p', '256'),
+        ('-cb', '4000000'),
+        ('-udpsize', '16777216'),
+        ('-vc', '5000'),
+        ('-s', '100000'),
+        ('-rxpck', '2000'),
+    ],
+}
+FILESERVER_PROFILE_NAMES = sorted(FILESERVER_PROFILES.keys())
+FILESERVER_PROGRAMS = ('fileserver', 'dafileserver')
+
+# fileserver options which take a value.
+FILESERVER_VALUE_OPTIONS = (
+    '-abortthreshold', '-auditlog', '-b', '-busyat', '-cb', '-config', '-d',
+    '-fs-state-verify', '-hr', '-implicit', '-k', '-l', '-logfile', '-m',
+    '-offline-timeout', '-p', '-rxmaxmtu', '-rxpck', '-s', '-spare', '-sync',
+    '-udpsize', '-vattachpar', '-vc', '-vhandle-initial-cachesize',
+    '-vhandle-max-cachesize', '-vhandle-setaside', '-vhashsize',
+    '-vlruinterval', '-vlrumax', '-vlruthresh',
+)
+
+def parse_flags(flags, value_options):
+    """Convert a command line string to a dict of option names to values.
+
+    Options without values are given the value True."""
+    parsed = {}
+    args = shlex.split(flags or '')
+    i = 0
+    while i < len(args):
+        name = args[i]
+        if name in value_options and i + 1 < len(args):
+            parsed[name] = args[i+1]
+            i += 2
+        else:
+            parsed[name] = True
+            i += 1
+    return parsed
+
+def merge_flags(flags, tuned, value_options):
+    """Add the tuned (name, value) options to the given command line string.
+
+    Options given explicitly take precedence over tuned ones."""
+    merged = shlex.split(flags or '')
+    explicit = parse_flags(flags, value_options)
+    for name,value in tuned:
+        if name in explicit:
+            continue
+        merged.append(name)
+        if value is not None:
+            merged.append(value)
+    return " ".join(merged)
+
+def vice_partitions():
+    """Return the list of vice partition paths on this system."""
+    parts = []
+    for path in sorted(glob.glob('/vicep*')):
+        if re.match(r'/vicep([a-z]|[a-h][a-z]|i[a-v])$', path) and os.path.isdir(path):
+            parts.append(path)
+    return parts
+
+def is_local_host(hostname):
+    """Returns true if hostname names this system."""
+    return hostname in ('localhost', socket.gethostname(), os.uname()[1])
+
+def nearest_existing(path):
+    """Return the path or the nearest parent directory which exists."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+def is_mount_point(path):
+    """Returns true if path is on a different device than its parent."""
+    if not os.path.isdir(path):
+        return False
+    parent = os.path.dirname(os.path.abspath(path).rstrip('/')) or '/'
+    return os.stat(path).st_dev != os.stat(parent).st_dev
+
+def parse_afsd_options(options):
+    """Convert an afsd option string to a dict of option names to values."""
+    return parse_flags(options, AFSD_VALUE_OPTIONS)
+
+class CacheTuning(object):
+    """Compute cache manager settings from the hardware and a profile."""
+
+    def __init__(self, profile='auto', cachedir='/usr/vice/cache', afsd_options='',
+                 memory=None, ncpus=None, statvfs=None, dedicated=None):
+        """Initialize the cache tuning.
+
+        profile:      profile name, or 'auto' to choose one from the hardware
+        cachedir:     path of the disk cache directory
+        afsd_options: the afsd options given by the user
+        memory:       physical memory in kilobytes (default: detect)
+        ncpus:        number of processors (default: detect)
+        statvfs:      statvfs result of the cache partition (default: detect)
+        dedicated:    the cache directory is a dedicated partition (default: detect)
+        """
+        if profile != 'auto' and profile not in CACHE_PROFILES:
+            raise ValueError("Unknown cache profile: %s" % (profile))
+        if memory is None:
+            memory = physical_memory()
+        if ncpus is None:
+            ncpus = nproc()
+        if statvfs is None:
+            statvfs = os.statvfs(nearest_existing(cachedir))
+        if dedicated is None:
+            dedicated = is_mount_point(cachedir)
+        self.cachedir = cachedir
+        self.explicit = parse_afsd_options(afsd_options)
+        self.memory = int(memory)
+        self.ncpus = int(ncpus)
+        self.total = (statvfs.f_blocks * statvfs.f_frsize) // 1024
+        self.free = (statvfs.f_bavail * statvfs.f_frsize) // 1024
+        self.dedicated = dedicated
+        self.reasons = []
+        self.profile = self._choose_profile(profile)
+        self._compute()
+
+    def _reason(self, fmt, *args):
+        self.reasons.append(fmt % args)
+
+    def _choose_profile(self, profile):
+        if profile != 'auto':
+            self._reason("Using the '%s' profile.", profile)
+            return profile
+        space = self.total if self.dedicated else self.free
+        if self.ncpus >= 16 and self.memory >= 64 * GB:
+            profile = 'hpc'
+        elif self.memory >= 4 * GB and space >= 10 * GB:
+            profile = 'large'
+        else:
+            profile = 'small'
+        self._reason("Chose the '%s' profile for %d cpus, %d MB of memory, and %d MB of cache space.",
+                     profile, self.ncpus, self.memory // MB, space // MB)
+        return profile
+
+    def _compute(self):
+        p = CACHE_PROFILES[self.profile]
+
+        # Memory or disk cache.
+        if '-memcache' in self.explicit:
+            self.memcache = True
+            self._reason("Memory cache requested by the afsd options.")
+        elif p['memcache'] and self.memory >= p['memcache']:
+            self.memcache = True
+            self._reason("Memory cache selected; %d MB of memory is at least %d MB.",
+                         self.memory // MB, p['memcache'] // MB)
+        else:
+            self.memcache = False
+
+        # Cache size.
+        if self.memcache:
+            self.size = min(self.memory // 4, p['max_size'])
+            self._reason("Cache size is %d MB; a quarter of memory, up to %d MB.",
+                         self.size // MB, p['max_size'] // MB)
+        else:
+            if self.dedicated:
+                usable = int(self.total * 0.85)
+                self._reason("Cache directory %s is a dedicated partition; using 85%% of %d MB.",
+                             self.cachedir, self.total // MB)
+            else:
+                usable = int(self.free * p['share'])
+                self._reason("Cache directory %s shares a partition; using %d%% of %d MB free.",
+                             self.cachedir, int(p['share'] * 100), self.free // MB)
+            self.size = min(usable, p['max_size'])
+            if self.size < MIN_CACHE_SIZE:
+                self._reason("Warning: cache size %d MB is less than the recommended minimum %d MB.",
+                             self.size // MB, MIN_CACHE_SIZE // MB)
+            self._reason("Cache size is %d MB (limit %d MB).", self.size // MB, p['max_size'] // MB)
+
+        # Chunk size; keep at least 1000 chunks in small caches.
+        chunksize = p['chunksize']
+        while chunksize > 13 and (1 << chunksize) // 1024 * 1000 > self.size:
+            chunksize -= 1
+        self.chunksize = chunksize
+        self._reason("Chunk size is %d KB.", (1 << chunksize) // 1024)
+
+        # Status cache entries; keep them within about 1% of memory.
+        limit = max(2000, self.memory // 100 * 2 // 3) if self.memory else p['stat']
+        self.stat = min(p['stat'], limit)
+        self._reason("Stat cache entries is %d.", self.stat)
+
+        # Data cache entries in memory; not used with a memory cache.
+        if self.memcache:
+            self.dcache = None
+        else:
+            chunks = self.size // ((1 << self.chunksize) // 1024)
+            self.dcache = max(2000, min(chunks // 2, p['dcache']))
+            self._reason("Data cache entries is %d for %d chunks.", self.dcache, chunks)
+
+        # Background daemons.
+        self.daemons = max(2, min(p['daemons'], self.ncpus * 2))
+        self._reason("Background daemons is %d for %d cpus.", self.daemons, self.ncpus)
+
+    def options(self):
+        """Return the list of computed afsd (name, value) options."""
+        options = []
+        if self.memcache:
+            options.append(('-memcache', None))
+        options.append(('-chunksize', str(self.chunksize)))
+        options.append(('-stat', str(self.stat)))
+        if self.dcache:
+            options.append(('-dcache', str(self.dcache)))
+        options.append(('-daemons', str(self.daemons)))
+        return options
+
+    def merge(self, afsd_options):
+        """Add the computed options to the given afsd options.
+
+        Options given explicitly take precedence over computed ones."""
+        return merge_flags(afsd_options, self.options(), AFSD_VALUE_OPTIONS)
+
+    def log(self):
+        """Log the reasons for the computed values."""
+        for reason in self.reasons:
+            logger.info("Cache tuning: %s", reason)
+
+class FileserverTuning(object):
+    """Select the fileserver options from a named profile."""
+
+    def __init__(self, profile='auto', hostname='localhost',
+                 memory=None, ncpus=None, partitions=None):
+        """Initialize the fileserver tuning.
+
+        profile:    profile name, or 'auto' to choose one from the hardware
+        hostname:   the fileserver host
+        memory:     physical memory in kilobytes (default: detect on the local host)
+        ncpus:      number of processors (default: detect on the local host)
+        partitions: number of vice partitions (default: detect on the local host)
+        """
+        if profile != 'auto' and profile not in FILESERVER_PROFILES:
+            raise ValueError("Unknown fileserver profile: %s" % (profile))
+        self.hostname = hostname
+        self.reasons = []
+        if profile == 'auto':
+            profile = self._choose_profile(memory, ncpus, partitions)
+        else:
+            self.reasons.append("Using the '%s' profile." % (profile))
+        self.profile = profile
+
+    def _choose_profile(self, memory, ncpus, partitions):
+        if memory is None or ncpus is None or partitions is None:
+            if not is_local_host(self.hostname):
+                self.reasons.append("Hardware of remote host %s is unknown; using the 'small' profile." %
+                                    (self.hostname))
+                return 'small'
+            if memory is None:
+                memory = physical_memory()
+            if ncpus is None:
+                ncpus = nproc()
+            if partitions is None:
+                partitions = len(vice_partitions())
+        # Many partitions lower the cpu and memory needed for the 'huge'
+        # profile, but do not remove the minimums.
+        if (ncpus >= 16 and memory >= 32 * GB) or \
+           (ncpus >= 8 and memory >= 16 * GB and partitions >= 8):
+            profile = 'huge'
+        elif ncpus >= 4 and memory >= 8 * GB:
+            profile = 'large'
+        else:
+            profile = 'small'
+        self.reasons.append("Chose the '%s' profile for %d cpus, %d MB of memory, and %d partitions." %
+                            (profile, ncpus, memory // MB, partitions))
+        return profile
+
+    def options(self):
+        """Return the list of fileserver (name, value) options."""
+        return list(FILESERVER_PROFILES[self.profile])
+
+    def merge(self, flags):
+        """Add the profile options to the given fileserver flags.
+
+        Options given explicitly take precedence over the profile. The -S
+        (small) option given explicitly replaces the -L option of a profile."""
+        explicit = parse_flags(flags, FILESERVER_VALUE_OPTIONS)
+        tuned = self.options()
+        if '-S' in explicit:
+            tuned = [o for o in tuned if o[0] != '-L']
+        return merge_flags(flags, tuned, FILESERVER_VALUE_OPTIONS)
+
+    def log(self):
+        """Log the reasons for the selected profile."""
+        for reason in self.reasons:
+            logger.info("Fileserver tuning for %s: %s", self.hostname, reason)
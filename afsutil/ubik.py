@@ -0,0 +1,191 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Track the ubik sync site of the cell databases.
+
+Writes to the protection and volume location databases fail with a quorum
+error while the database servers are electing a sync site, or while the
+new sync site is still recovering. The WriteGate holds writes until a sync
+site has been seen in a good recovery state on consecutive checks, so the
+writes are sent to a stable database instead of being retried blindly.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from afsutil.cmd import udebug
+from afsutil.system import CommandFailed
+from afsutil.parallel import parallel
+from afsutil.poll import wait_until
+
+logger = logging.getLogger(__name__)
+
+PORT = {
+    'ptserver': '7002',
+    'vlserver': '7003',
+}
+
+RECOVERED = ('1f', 'f')
+
+class UbikStatus(object):
+    """The ubik state of one database server, from udebug."""
+
+    def __init__(self, hostname, dbname):
+        self.hostname = hostname
+        self.dbname = dbname
+        self.reachable = False
+        self.is_sync = False
+        self.recovery = None
+        self.sync_host = None
+        self.clock_bad = False
+
+    @property
+    def recovered(self):
+        return self.is_sync and self.recovery in RECOVERED
+
+def parse_udebug(output, status):
+    """Parse udebug output into a UbikStatus."""
+    status.reachable = True
+    status.clock_bad = bool(re.search(r'clock may be bad', output))
+    if re.search(r'I am sync site', output):
+        status.is_sync = True
+        match = re.search(r'Recovery state (\S+)', output)
+        status.recovery = match.group(1) if match else '??'
+    match = re.search(r'Sync host (\S+)', output)
+    if match:
+        status.sync_host = match.group(1)
+    return status
+
+def ubik_status(hostname, dbname, retry=0):
+    """Query the ubik state of a database server."""
+    status = UbikStatus(hostname, dbname)
+    try:
+        output = udebug('-server', hostname, '-port', PORT[dbname], retry=retry, quiet=True)
+    except CommandFailed:
+        return status
+    logger.debug("udebug for %s %s: %s", hostname, dbname, output)
+    return parse_udebug(output, status)
+
+def sync_site(hostnames, dbname):
+    """Return the hostname of the recovered sync site, or None.
+
+    None is returned if no host, or more than one host, claims to be a
+    recovered sync site."""
+    results = parallel(lambda h: ubik_status(h, dbname), hostnames, workers=len(hostnames))
+    sites = [r.value.hostname for r in results if r.value.recovered]
+    if len(sites) == 1:
+        return sites[0]
+    return None
+
+class WriteGate(object):
+    """Hold database writes until the sync site is stable.
+
+    The sync site is stable when the same host has been seen as the
+    recovered sync site on consecutive checks. A stable sync site is
+    trusted for ttl seconds, or until invalidate() is called after a
+    failed write. Only one thread checks a database at a time; other
+    threads waiting on the same database use the result of its check.
+    """
+
+    def __init__(self, hostnames, checks=2, ttl=10.0, timeout=300, interval=1.0):
+        """
+        hostnames: database server hostnames
+        checks:    number of consecutive checks which must agree
+        ttl:       seconds to trust a stable sync site
+        timeout:   maximum seconds to wait for a stable sync site
+        interval:  initial seconds between checks
+        """
+        self.hostnames = [str(h) for h in hostnames]
+        self.checks = checks
+        self.ttl = ttl
+        self.timeout = timeout
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stable = {} # dbname -> (hostname, timestamp)
+        self._checking = {} # dbname -> lock held by the checking thread
+        self._failed = {} # dbname -> time of the last failed check
+
+    def sync_site(self, dbname):
+        """Return the last known stable sync site of a database, or None."""
+        with self._lock:
+            site = self._stable.get(dbname)
+            if site and time.time() - site[1] < self.ttl:
+                return site[0]
+            return None
+
+    def invalidate(self, dbname=None):
+        """Forget the stable sync site, e.g., after a write failed."""
+        with self._lock:
+            if dbname is None:
+                self._stable.clear()
+            else:
+                self._stable.pop(dbname, None)
+
+    def _checklock(self, dbname):
+        with self._lock:
+            if dbname not in self._checking:
+                self._checking[dbname] = threading.Lock()
+            return self._checking[dbname]
+
+    def wait(self, dbname):
+        """Wait until the database has a stable sync site; returns the hostname."""
+        site = self.sync_site(dbname)
+        if site:
+            return site
+        start = time.time()
+        with self._checklock(dbname):
+            # Another thread may have checked while this one was waiting.
+            site = self.sync_site(dbname)
+            if site:
+                return site
+            with self._lock:
+                failed = self._failed.get(dbname)
+            if failed is not None and failed >= start:
+                raise AssertionError("Timed out waiting for stable %s sync site." % dbname)
+            seen = []
+            def _stable():
+                seen.append(sync_site(self.hostnames, dbname))
+                last = seen[-self.checks:]
+                return len(last) == self.checks and last[0] is not None and last.count(last[0]) == self.checks
+            try:
+                wait_until(_stable, "stable %s sync site" % dbname, timeout=self.timeout,
+                           initial=self.interval, maximum=5.0)
+            except AssertionError:
+                with self._lock:
+                    self._failed[dbname] = time.time()
+                raise
+            site = seen[-1]
+            with self._lock:
+                self._stable[dbname] = (site, time.time())
+            logger.info("The %s sync site is %s.", dbname, site)
+            return site
+
+    def cleanup(self, dbname, *functions):
+        """Return a vos/pts retry cleanup function which waits for a stable sync site.
+
+        The given functions, e.g. a volume unlocker, are called first."""
+        def _cleanup():
+            for function in functions:
+                function()
+            self.invalidate(dbname)
+            self.wait(dbname)
+        return _cleanup
@@ -0,0 +1,231 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""An in-memory index of the volume location database.
+
+The output of a single vos listvldb is parsed as it is read and indexed by
+volume name and by volume id, so existence checks and site lookups for many
+volumes are dictionary lookups instead of one vos command per volume. The
+index may be refreshed for one server or partition at a time, and is
+updated in place as volumes are created and replicated.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from afsutil.cmd import stream, vos
+from afsutil.system import CommandFailed
+from afsutil.resolver import addresses
+
+logger = logging.getLogger(__name__)
+
+class VolumeEntry(object):
+    """A vldb entry."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rw = None # volume ids
+        self.ro = None
+        self.bk = None
+        self.sites = [] # (server, partition, type) tuples
+        self.locked = False
+
+    @property
+    def rw_site(self):
+        """The (server, partition) of the read-write volume, or None."""
+        for server, partition, kind in self.sites:
+            if kind == 'RW':
+                return (server, partition)
+        return None
+
+    @property
+    def ro_sites(self):
+        """The list of (server, partition) of the read-only volumes."""
+        return [(server, partition) for server, partition, kind in self.sites if kind == 'RO']
+
+    def ids(self):
+        return [i for i in (self.rw, self.ro, self.bk) if i is not None]
+
+def parse_vldb(lines):
+    """Generate VolumeEntry objects from vos listvldb output lines."""
+    entry = None
+    for line in lines:
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            if line.startswith('VLDB entries') or line.startswith('Total entries'):
+                continue
+            if entry is not None:
+                yield entry
+            entry = VolumeEntry(line.split()[0])
+            continue
+        if entry is None:
+            continue
+        match = re.match(r'\s+server (\S+) partition (\S+) (RW|RO|BK) Site', line)
+        if match:
+            entry.sites.append(match.groups())
+            continue
+        for kind, label in (('rw', 'RWrite'), ('ro', 'ROnly'), ('bk', 'Backup')):
+            match = re.search(r'%s: (\d+)' % label, line)
+            if match:
+                setattr(entry, kind, int(match.group(1)))
+        if re.search(r'Volume is currently LOCKED', line):
+            entry.locked = True
+    if entry is not None:
+        yield entry
+
+class VLDB(object):
+    """Volume location entries indexed by name and by id."""
+
+    def __init__(self):
+        self.by_name = {}
+        self.by_id = {}
+        self.timestamp = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __iter__(self):
+        return iter(list(self.by_name.values()))
+
+    def add(self, entry):
+        """Add or replace an entry."""
+        with self._lock:
+            self.remove(entry.name)
+            self.by_name[entry.name] = entry
+            for i in entry.ids():
+                self.by_id[i] = entry
+
+    def remove(self, name):
+        """Remove an entry by name, if present."""
+        with self._lock:
+            entry = self.by_name.pop(name, None)
+            if entry is not None:
+                for i in entry.ids():
+                    if self.by_id.get(i) is entry:
+                        del self.by_id[i]
+
+    def load(self, server=None, partition=None, quiet=True):
+        """Read the vldb, or the entries for one server or partition.
+
+        When a server (and optionally a partition) is given, only the
+        entries with a site there are read; entries previously indexed for
+        that server and partition which are no longer listed are removed,
+        and other entries are kept."""
+        args = ['listvldb', '-quiet', '-nosort']
+        if server:
+            args += ['-server', server]
+        if partition:
+            args += ['-partition', partition]
+        start = time.time()
+        seen = set()
+        count = 0
+        for entry in parse_vldb(stream('vos', *args, quiet=quiet)):
+            self.add(entry)
+            seen.add(entry.name)
+            count += 1
+        # The server may be given in another form than the names listed by
+        # vos, so the sites are matched by address.
+        hosts = addresses([server]) if server else None
+        with self._lock:
+            for entry in list(self.by_name.values()):
+                if entry.name in seen:
+                    continue
+                if server is None:
+                    self.remove(entry.name)
+                elif any(addresses([s]) & hosts and
+                         (partition is None or _same_partition(p, partition))
+                         for s,p,_ in entry.sites):
+                    self.remove(entry.name)
+        if server is None:
+            self.timestamp = start
+        logger.info("Indexed %d vldb entries in %.1f seconds.", count, time.time() - start)
+        return self
+
+    def refresh(self, name):
+        """Read the entry of one volume; returns the entry or None."""
+        try:
+            output = vos('listvldb', '-name', name, '-quiet', quiet=True)
+        except CommandFailed:
+            self.remove(self._name(name))
+            return None
+        for entry in parse_vldb(output.splitlines()):
+            self.add(entry)
+            return entry
+        return None
+
+    def _name(self, name):
+        entry = self.lookup(name)
+        return entry.name if entry else name
+
+    def lookup(self, name):
+        """Find an entry by volume name or id.
+
+        The .readonly and .backup suffixes and numeric ids of any of the
+        volume types are accepted."""
+        with self._lock:
+            if isinstance(name, (int, long)) or (isinstance(name, basestring) and name.isdigit()):
+                return self.by_id.get(int(name))
+            entry = self.by_name.get(name)
+            if entry is None:
+                for suffix in ('.readonly', '.backup'):
+                    if name.endswith(suffix):
+                        entry = self.by_name.get(name[:-len(suffix)])
+            return entry
+
+    def exists(self, name):
+        return self.lookup(name) is not None
+
+    def sites(self, name):
+        """Return (rw site, ro sites) of a volume, or None if not found."""
+        entry = self.lookup(name)
+        if entry is None:
+            return None
+        return (entry.rw_site, entry.ro_sites)
+
+    def created(self, name, server, partition):
+        """Record a new volume."""
+        entry = VolumeEntry(name)
+        entry.sites.append((server, partition, 'RW'))
+        self.add(entry)
+
+    def added_site(self, name, server, partition):
+        """Record a new read-only site of a volume."""
+        with self._lock:
+            entry = self.lookup(name)
+            if entry is not None:
+                entry.sites.append((server, partition, 'RO'))
+
+    def as_sites(self):
+        """Return a dict of name: (rw site, ro sites)."""
+        with self._lock:
+            return dict((e.name, (e.rw_site, e.ro_sites)) for e in self.by_name.values())
+
+def _same_partition(a, b):
+    """Compare partition names, e.g. 'a', 'vicepa', and '/vicepa'."""
+    def norm(p):
+        p = p.lstrip('/')
+        if p.startswith('vicep'):
+            p = p[len('vicep'):]
+        return p
+    return norm(a) == norm(b)
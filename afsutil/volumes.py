@@ -0,0 +1,235 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""Create and replicate volumes in bulk.
+
+The volumes are setup concurrently. Each volume is created, read-only
+sites are added, and the volume is released, in that order. The number of
+vos operations running at the same time on any one fileserver is limited,
+so a large batch of volumes does not swamp a single volserver.
+"""
+
+import logging
+import threading
+
+from afsutil.cmd import vos
+from afsutil.system import CommandFailed
+from afsutil.parallel import parallel, DEFAULT_WORKERS
+from afsutil.vldb import parse_vldb
+from afsutil.resolver import addresses
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PER_SERVER = 2
+
+class ServerLimiter(object):
+    """Limit the number of concurrent operations on each fileserver."""
+
+    def __init__(self, limit=DEFAULT_PER_SERVER):
+        self.limit = max(1, int(limit))
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def __call__(self, server):
+        """Return the semaphore for a server, for use in a with statement."""
+        with self._lock:
+            if server not in self._semaphores:
+                self._semaphores[server] = threading.BoundedSemaphore(self.limit)
+            return self._semaphores[server]
+
+def volume_exists(name):
+    """Return true if the volume is in the vldb."""
+    try:
+        vos('listvldb', '-name', name, '-quiet', '-noresolve', '-nosort')
+    except CommandFailed:
+        return False
+    else:
+        return True
+
+def volume_sites(name):
+    """Return the rw site and the list of ro sites of a volume.
+
+    Each site is a (server, partition) tuple. The rw site is None if
+    the volume does not have one."""
+    output = vos('listvldb', '-name', name, '-quiet')
+    for entry in parse_vldb(output.splitlines()):
+        return (entry.rw_site, entry.ro_sites)
+    return (None, [])
+
+def unlocker(name):
+    """Return a function to unlock a volume before a vos command is retried.
+
+    Due to a bug in some versions of OpenAFS, the db drops quorum the
+    first time we write to it after the first election. vos fails with a
+    uquorum error and and the volume is left locked."""
+    def _unlock():
+        try:
+            vos('unlock', '-id', name)
+        except:
+            pass
+    return _unlock
+
+def _retry(name, gate, retry, wait):
+    """Return the vos retry arguments for a vldb write.
+
+    With a ubik WriteGate, the write also waits for a stable vlserver sync
+    site before the first attempt and before each retry. The retry wait is
+    kept, since the write may fail for other reasons, e.g., the fileserver
+    is still starting."""
+    if gate is None:
+        return {'retry': retry, 'wait': wait, 'cleanup': unlocker(name)}
+    gate.wait('vlserver')
+    return {'retry': retry, 'wait': wait, 'cleanup': gate.cleanup('vlserver', unlocker(name))}
+
+def create_volume(name, server, partition='a', gate=None, vldb=None):
+    """Create a volume if it does not exist.
+
+    If a vldb.VLDB index is given, it is used to check if the volume exists
+    and is updated with the new volume."""
+    exists = vldb.exists(name) if vldb is not None else volume_exists(name)
+    if exists:
+        logger.info("Skipping create volume '%s'; already exists.", name)
+        return False
+    logger.info("Creating volume %s on host %s, partition %s.", name, server, partition)
+    vos('create', '-server', server, '-partition', partition, '-name', name,
+        **_retry(name, gate, 60, 10))
+    if vldb is not None:
+        vldb.created(name, server, partition)
+    return True
+
+def addsite(name, server, partition, gate=None, vldb=None):
+    """Add a read-only site for a volume."""
+    vos('addsite', '-server', server, '-partition', partition, '-id', name,
+        **_retry(name, gate, 20, 80))
+    if vldb is not None:
+        vldb.added_site(name, server, partition)
+
+def release(name, gate=None):
+    """Release a volume."""
+    vos('release', '-id', name, **_retry(name, gate, 20, 80))
+
+def replicate(name, replicas=1, placement=None, limiter=None, gate=None, vldb=None):
+    """Add read-only sites for a volume and release it.
+
+    name:      volume name or id
+    replicas:  number of read-only sites wanted
+    placement: Placement object to choose the servers of the read-only
+               sites after the first one; required if replicas > 1
+    limiter:   optional ServerLimiter
+    gate:      optional ubik.WriteGate to hold the vldb writes until the
+               vlserver sync site is stable
+    vldb:      optional vldb.VLDB index to look up and record the sites
+
+    The first read-only site is placed on the server and partition of the
+    read-write volume. The others are placed on distinct fileservers chosen
+    by the placement. Nothing is done if the volume already has enough
+    read-only sites. The volume is released once, after all of the sites
+    are added.
+
+    The sites of one volume are added one at a time, since vos addsite
+    locks the vldb entry of the volume.
+    """
+    sites = vldb.sites(name) if vldb is not None else None
+    if sites is None:
+        sites = volume_sites(name)
+    rw, ro = sites
+    if len(ro) >= replicas:
+        logger.info("Skipping replication of %s; already have %d read only site%s",
+                    name, len(ro), 's' if len(ro) > 1 else '')
+        return False
+    if rw is None:
+        raise AssertionError("Volume %s does not have a read-write site." % name)
+    # The vldb names are resolved by vos, and may differ from the configured
+    # names of the placement, so the servers are compared by address.
+    sites = []
+    used = addresses(server for server,_ in ro)
+    if not addresses([rw[0]]) & used:
+        sites.append(rw)
+        used.update(addresses([rw[0]]))
+    while len(ro) + len(sites) < replicas:
+        if placement is None:
+            raise AssertionError("A placement is required for more than one replica.")
+        try:
+            site = placement.choose(exclude=used)
+        except AssertionError:
+            logger.warning("Only %d fileservers available for %d read only sites of %s.",
+                           len(ro) + len(sites), replicas, name)
+            break
+        sites.append(site)
+        used.update(addresses([site[0]]))
+    for server, partition in sites:
+        logger.info("Adding read only site for %s on host %s, partition %s.", name, server, partition)
+        addsite(name, server, partition, gate=gate, vldb=vldb)
+    if limiter is None:
+        release(name, gate=gate)
+    else:
+        with limiter(rw[0]):
+            release(name, gate=gate)
+    return True
+
+class BulkVolumes(object):
+    """Create and replicate a batch of volumes concurrently."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, per_server=DEFAULT_PER_SERVER,
+                 replicas=1, placement=None, gate=None, vldb=None):
+        """
+        workers:    maximum number of volumes setup at the same time
+        per_server: maximum number of vos operations at the same time on
+                    any one fileserver
+        replicas:   number of read-only sites of each volume
+        placement:  Placement object for the read-only sites, see replicate()
+        gate:       optional ubik.WriteGate for the vldb writes
+        vldb:       optional vldb.VLDB index of the existing volumes
+        """
+        self.workers = workers
+        self.limiter = ServerLimiter(per_server)
+        self.replicas = replicas
+        self.placement = placement
+        self.gate = gate
+        self.vldb = vldb
+
+    def setup(self, volume):
+        """Create and replicate a single volume.
+
+        volume: (name, server, partition) tuple; the server and partition
+                are None if the volume already exists
+        """
+        name, server, partition = volume
+        if server is not None:
+            with self.limiter(server):
+                create_volume(name, server, partition, gate=self.gate, vldb=self.vldb)
+        replicate(name, replicas=self.replicas, placement=self.placement,
+                  limiter=self.limiter, gate=self.gate, vldb=self.vldb)
+        return name
+
+    def run(self, volumes):
+        """Create and replicate the volumes.
+
+        volumes: list of (name, server, partition) tuples
+
+        returns: list of parallel.Result objects, one per volume. Failures
+                 are logged and do not stop the remaining volumes.
+        """
+        logger.info("Setting up %d volumes.", len(volumes))
+        results = parallel(self.setup, volumes, workers=self.workers, raise_errors=False)
+        for r in results:
+            if not r.ok:
+                logger.error("Failed to setup volume %s: %s", r.item[0], r.error)
+        return results
@@ -3,14 +3,8 @@
 # afsutil-teardown - teardown a test cell
 #
 
-# Stopping clients
-/usr/bin/sudo -n afsutil stop client
-
-# Stopping servers
-/usr/bin/sudo -n afsutil stop server
-
-# Uninstalling
-/usr/bin/sudo -n afsutil remove --dist transarc --purge
+# Stopping services, uninstalling and purging
+/usr/bin/sudo -n afsutil teardown --dist transarc
 
 # Removing service key
 /usr/bin/sudo -n afsutil ktdestroy --keytab /tmp/afsrobot/fake.keytab --force
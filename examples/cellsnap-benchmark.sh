@@ -0,0 +1,40 @@
+#!/bin/sh
+#
+# cellsnap-benchmark - compare setting up a test cell with restoring a snapshot
+#
+# Runs the afsutil-setup.sh example to build a cell, saves a snapshot of it,
+# then restores the snapshot and reports the time of each. The servers are
+# running again when the script is done.
+#
+
+EXAMPLES=`dirname $0`
+SNAPSHOT=${SNAPSHOT:-/tmp/afsutil/cell.tar.gz}
+
+now() {
+    date +%s
+}
+
+set -e
+
+# Building the cell with newcell and mtroot
+$EXAMPLES/afsutil-teardown.sh || true
+start=`now`
+$EXAMPLES/afsutil-setup.sh
+setup=$((`now` - start))
+
+# Saving the snapshot
+/usr/bin/sudo -n afsutil stop client
+/usr/bin/sudo -n afsutil stop server
+mkdir -p `dirname $SNAPSHOT`
+/usr/bin/sudo -n afsutil cellsnap save $SNAPSHOT
+
+# Restoring the snapshot
+start=`now`
+/usr/bin/sudo -n afsutil cellsnap restore $SNAPSHOT --start
+restore=$((`now` - start))
+
+echo "setup:   $setup seconds"
+echo "restore: $restore seconds"
+if [ $restore -gt 0 ]; then
+    echo "speedup: $((setup / restore))x"
+fi
@@ -1,3 +1,23 @@
 from test.test_system import SystemTest
 from test.test_keytab import KeytabTest
 from test.test_package import PackageTest
+from test.test_purge import PurgeTest
+from test.test_tuning import TuningTest
+from test.test_resolver import ResolverTest
+from test.test_cellservdb import CellServDBTest
+from test.test_scheduler import SchedulerTest
+from test.test_poll import PollTest
+from test.test_cell import CellTest
+from test.test_volumes import VolumesTest
+from test.test_placement import PlacementTest
+from test.test_reconcile import ReconcileTest
+from test.test_journal import JournalTest
+from test.test_ubik import UbikTest
+from test.test_snapshot import SnapshotTest
+from test.test_vldb import VldbTest
+from test.test_inventory import InventoryTest
+from test.test_provision import ProvisionTest
+from test.test_farm import FarmTest
+from test.test_context import ContextTest
+from test.test_cellsnap import CellSnapTest
+from test.test_teardown import TeardownTest
@@ -0,0 +1,88 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+#-------------------------------------------------------------------------------
+#
+#   usage: python -m test.bench_cellservdb [<path-or-url>] [<iterations>]
+#
+#   Benchmark the CellServDB parser, merge, lookup, and write on the public
+#   CellServDB file (downloaded from grand.central.org by default), and compare
+#   with the previous whole-file concatenation.
+#
+
+from __future__ import print_function
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib2
+
+from afsutil.cellservdb import CellServDB, merge, load
+from afsutil.system import cat
+
+URL = "https://grand.central.org/dl/cellservdb/CellServDB"
+
+def fetch(src, dst):
+    if src.startswith('http://') or src.startswith('https://'):
+        with open(dst, 'w') as f:
+            f.write(urllib2.urlopen(src).read())
+    else:
+        shutil.copyfile(src, dst)
+
+def timeit(label, function, iterations):
+    start = time.time()
+    for i in xrange(0, iterations):
+        result = function()
+    elapsed = time.time() - start
+    print("{0:30} {1:10.3f} ms".format(label, elapsed * 1000.0 / iterations))
+    return result
+
+def main():
+    src = sys.argv[1] if len(sys.argv) > 1 else URL
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    logging.basicConfig(level=logging.ERROR)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        dist = os.path.join(tmpdir, "CellServDB.dist")
+        local = os.path.join(tmpdir, "CellServDB.local")
+        out = os.path.join(tmpdir, "CellServDB")
+        fetch(src, dist)
+        csdb = CellServDB()
+        csdb.add("example.com", "Cell name", [("192.0.2.10", "afs1.example.com")])
+        csdb.write(local)
+
+        d = timeit("parse dist", lambda: load(dist), iterations)
+        hosts = sum([len(e.hosts) for e in d])
+        print("{0} cells, {1} hosts, {2} bytes".format(len(d), hosts, os.path.getsize(dist)))
+        l = load(local)
+        merged,conflicts = timeit("merge local over dist", lambda: merge(l, d), iterations)
+        names = merged.cells()
+        timeit("lookup every cell", lambda: [merged.lookup(n) for n in names], iterations)
+        timeit("write merged (atomic)", lambda: merged.write(out), iterations)
+        timeit("parse+merge+write", lambda: merge(load(local), load(dist))[0].write(out), iterations)
+        timeit("cat (previous)", lambda: cat([local, dist], out), iterations)
+    finally:
+        shutil.rmtree(tmpdir)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,17 @@
+[cell]
+name = example.com
+admins = admin jdoe.admin
+db = afs01 afs02
+fs = afs01 afs03
+
+[volumes]
+top = proj.a proj.b
+replicas = 2
+placement = round-robin
+
+[options]
+dafileserver = -L
+
+[options afs03]
+fsprofile = large
+dafileserver = -p 64
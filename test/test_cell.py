@@ -0,0 +1,331 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import afsutil.cell
+import afsutil.snapshot
+from afsutil.cell import Cell, MountBatch, read_hostnames, format_results, status_poller, \
+                         client_cellhosts
+from afsutil.context import Context, current
+from afsutil.placement import Partition
+from afsutil.snapshot import HostState
+from afsutil.system import CommandFailed
+
+class CellTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.journal = os.path.join(self.tmpdir, 'newcell.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_hostnames(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, "# fileservers\nfs1 fs2\n\nfs3  # spare\n")
+        os.close(fd)
+        try:
+            self.assertEqual(read_hostnames(path), ['fs1', 'fs2', 'fs3'])
+        finally:
+            os.remove(path)
+
+    def test_addfs_hosts(self):
+        cell = Cell(db=['db1'], fs=['fs1'], workers=4)
+        def addfs(host):
+            if host.hostname == 'fs3':
+                raise AssertionError("Unable to contact file server at fs3.")
+        cell.addfs = addfs
+        results = cell.addfs_hosts(['fs2', 'fs3', 'fs4', 'fs2'])
+        self.assertEqual([str(r.item) for r in results], ['fs2', 'fs3', 'fs4'])
+        self.assertEqual([r.ok for r in results], [True, False, True])
+        table = format_results(results).splitlines()
+        self.assertEqual(len(table), 4)
+        self.assertTrue(table[2].startswith('fs3'))
+        self.assertTrue('failed' in table[2])
+        self.assertTrue('Unable to contact' in table[2])
+
+    def test_rolling_restart(self):
+        cell = Cell(db=['db1', 'db2', 'db3'], fs=['fs1'])
+        events = []
+        class FakeHost(object):
+            def __init__(self, name):
+                self.name = name
+            def __str__(self):
+                return self.name
+            def restart(self, dbname):
+                events.append(('restart', self.name, dbname))
+        hosts = [FakeHost(n) for n in ('db1', 'db2', 'db3')]
+        cell._sync_sites = lambda hosts: set([hosts[0]])
+        cell.wait_for_status = lambda conditions: None
+        cell._wait_for_quorum = lambda dbname, members: events.append(('quorum', dbname))
+        cell.rolling_restart(hosts, members=hosts)
+        restarted = [e[1] for e in events if e[0] == 'restart']
+        self.assertEqual(restarted, ['db2', 'db2', 'db3', 'db3', 'db1', 'db1'])
+        # Quorum is checked after each host, before the next is restarted.
+        self.assertEqual(events[2:4], [('quorum', 'ptserver'), ('quorum', 'vlserver')])
+
+    def test_mount_batch(self):
+        afs = tempfile.mkdtemp()
+        os.mkdir(os.path.join(afs, 'example.com'))
+        calls = []
+        def fs(*args):
+            calls.append(args)
+            if args[0] == 'mkmount':
+                os.mkdir(args[2])
+        saved = afsutil.cell.fs
+        afsutil.cell.fs = fs
+        try:
+            batch = MountBatch(workers=2)
+            batch.mount(afs + '/.example.com/.afs', 'root.afs', '-rw')
+            batch.mount(afs + '/example.com', 'root.cell', '-cell', 'example.com')
+            batch.mount(afs + '/.example.com', 'root.cell', '-cell', 'example.com', '-rw')
+            batch.mount(afs + '/.example.com', 'root.cell', '-cell', 'example.com', '-rw')
+            batch.setacl(afs, 'system:anyuser', 'read')
+            batch.setacl(afs, 'system:anyuser', 'read')
+            mounted = batch.run()
+        finally:
+            afsutil.cell.fs = saved
+            shutil.rmtree(afs)
+        self.assertEqual(mounted, [afs + '/.example.com', afs + '/.example.com/.afs'])
+        self.assertEqual([c[0] for c in calls], ['mkmount', 'mkmount', 'setacl'])
+
+    def test_create_volume(self):
+        cell = Cell(db=['afs01'], fs=['afs01'])
+        cell.placement.partitions = [Partition('afs01', '/vicepa', free=1000),
+                                     Partition('afs01', '/vicepb', free=5000)]
+        calls = []
+        def vos(*args, **kwargs):
+            calls.append(args[0])
+            if args[0] == 'listvldb':
+                raise CommandFailed(['vos'] + list(args), 1, 'VLDB: no such entry')
+            return ''
+        saved = afsutil.volumes.vos
+        afsutil.volumes.vos = vos
+        try:
+            host = cell.fs[0]
+            host.create_volume('root.afs', placement=cell.placement)
+            host.create_volume('root.cell', placement=cell.placement)
+        finally:
+            afsutil.volumes.vos = saved
+        # One existence check per volume, and no partition queries.
+        self.assertEqual(calls, ['listvldb', 'create', 'listvldb', 'create'])
+
+    def test_host_reads_snapshot(self):
+        servers = FakeServers(['afs01', 'afs02'])
+        queried = []
+        def host_state(hostname):
+            queried.append(hostname)
+            return servers.host_state(hostname)
+        cell = Cell(cell='example.com', db=['afs01'], fs=['afs02'])
+        saved = (afsutil.cell.bos, afsutil.snapshot.host_state)
+        afsutil.cell.bos = servers.bos
+        afsutil.snapshot.host_state = host_state
+        try:
+            host = cell.fs[0]
+            self.assertEqual(host.services(), {})
+            self.assertEqual(host.listusers(), [])
+            self.assertEqual(sorted(queried), ['afs01', 'afs02']) # gathered once
+            host.setcellname('example.com')
+            host.setcellhosts(['afs01'])
+            host.adduser('admin')
+            self.assertEqual(host.cellinfo(), ('example.com', ('afs01',)))
+            self.assertEqual(host.listusers(), ['admin'])
+        finally:
+            afsutil.cell.bos, afsutil.snapshot.host_state = saved
+        self.assertFalse('afs01' in queried[2:])
+
+    def test_mtroot_cellhosts(self):
+        saved = afsutil.cell.AFS_DATA_DIR
+        afsutil.cell.AFS_DATA_DIR = self.tmpdir
+        try:
+            self.assertEqual(client_cellhosts('example.com'), [])
+            shutil.copy(os.path.join(os.path.dirname(__file__), 'data', 'CellServDB.dist'),
+                        os.path.join(self.tmpdir, 'CellServDB'))
+            self.assertEqual(client_cellhosts('example.com'), ['db1.example.com'])
+            self.assertEqual(client_cellhosts('other.com'), [])
+        finally:
+            afsutil.cell.AFS_DATA_DIR = saved
+        cell = Cell(cell='example.com', db=['db1.example.com', 'db2.example.com'])
+        self.assertEqual(cell.write_gate.hostnames, ['db1.example.com', 'db2.example.com'])
+        self.assertEqual(Cell(cell='example.com', gate=False).write_gate, None)
+
+    def test_cell_paths(self):
+        default = current()
+        saved = dict(default.paths)
+        a = Cell(paths={'vos': '/opt/a/vos'})
+        b = Cell(paths={'vos': '/opt/b/vos'})
+        self.assertEqual(a.context.paths['vos'], '/opt/a/vos')
+        self.assertEqual(b.context.paths['vos'], '/opt/b/vos')
+        self.assertEqual(default.paths, saved)
+        context = Context(paths={'bos': '/opt/c/bos'})
+        c = Cell(paths={'vos': '/opt/c/vos'}, context=context)
+        self.assertEqual(c.context.paths, {'bos': '/opt/c/bos', 'vos': '/opt/c/vos'})
+        self.assertEqual(context.paths, {'bos': '/opt/c/bos'})
+
+    def test_status_poller_per_context(self):
+        a = Cell()
+        b = Cell()
+        self.assertTrue(status_poller(a.context) is status_poller(a.context))
+        self.assertFalse(status_poller(a.context) is status_poller(b.context))
+        with a.context:
+            self.assertTrue(status_poller() is status_poller(a.context))
+
+    def _fake_newcell(self, cell, calls, fail=None):
+        def step(name):
+            def f(*args):
+                if name == fail:
+                    raise AssertionError("%s failed" % name)
+                calls.append(name)
+            return f
+        for name in ('ping_hosts', '_shutdown_host', '_setup_first_db_server',
+                     '_setup_first_fs_server', '_shutdown_first_db_server',
+                     '_set_db_cellhosts', '_restart_first_db_server',
+                     '_create_databases', '_wait_for_db_quorum'):
+            setattr(cell, name, step(name))
+        for name in ('_verify_first_db_server', '_verify_first_fs_server',
+                     '_verify_db_cellhosts', '_verify_databases'):
+            setattr(cell, name, lambda *args: True)
+
+    def test_newcell_twice(self):
+        tmpdir = tempfile.mkdtemp()
+        journal = os.path.join(tmpdir, 'newcell.journal')
+        try:
+            cell = Cell(db=['db1', 'db2'], fs=['db1'], journal=journal)
+            first = []
+            self._fake_newcell(cell, first)
+            cell.newcell()
+            self.assertFalse(os.path.exists(journal))
+            second = []
+            self._fake_newcell(cell, second)
+            cell.newcell()
+            self.assertEqual(second, first)
+            self.assertTrue('_restart_first_db_server' in second)
+            self.assertTrue('_wait_for_db_quorum' in second)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_newcell_resume(self):
+        # The first run fails waiting for quorum, after the first db server
+        # was restarted with the new cell hosts.
+        servers = FakeServers(['db1', 'db2'])
+        cell = Cell(db=['db1', 'db2'], fs=['db1'], journal=self.journal)
+        failures = ['quorum']
+        def wait_for_db_quorum():
+            if failures:
+                raise AssertionError("Timed out waiting for %s." % failures.pop())
+        cell._wait_for_db_quorum = wait_for_db_quorum
+        with servers.active(cell):
+            self.assertRaises(AssertionError, cell.newcell)
+            del servers.commands[:]
+            cell.newcell()
+        self.assertFalse(('shutdown', 'db1', 'dafs') in servers.commands)
+        self.assertEqual(servers.statuses['db1'],
+                         {'ptserver': 'running', 'vlserver': 'running', 'dafs': 'running'})
+        self.assertEqual(servers.statuses['db2'], {'ptserver': 'running', 'vlserver': 'running'})
+        self.assertEqual(servers.cellhosts['db1'], set(['db1', 'db2']))
+        self.assertFalse(os.path.exists(self.journal))
+
+    def test_newcell_resume_single_db(self):
+        # The first run fails adding the second fileserver.
+        servers = FakeServers(['db1', 'fs2'])
+        cell = Cell(db=['db1'], fs=['db1', 'fs2'], journal=self.journal)
+        failures = ['fs2']
+        def addfs(host):
+            if failures:
+                raise AssertionError("Unable to contact file server at %s." % failures.pop())
+            Cell.addfs(cell, host)
+        cell.addfs = addfs
+        with servers.active(cell):
+            self.assertRaises(AssertionError, cell.newcell)
+            del servers.commands[:]
+            cell.newcell()
+        self.assertEqual([c for c in servers.commands if c[0] == 'shutdown'], [])
+        self.assertEqual(servers.statuses['db1'],
+                         {'ptserver': 'running', 'vlserver': 'running', 'dafs': 'running'})
+        self.assertEqual(servers.statuses['fs2'], {'dafs': 'running'})
+
+class FakeServers(object):
+    """The bos configuration of a set of hosts, changed by a fake bos command."""
+
+    def __init__(self, hostnames):
+        self.statuses = dict((h, {}) for h in hostnames)
+        self.cellname = dict((h, None) for h in hostnames)
+        self.cellhosts = dict((h, set()) for h in hostnames)
+        self.users = dict((h, []) for h in hostnames)
+        self.commands = []
+
+    def bos(self, command, *args, **kwargs):
+        opts = dict(zip(args[0::2], args[1::2]))
+        host = opts['-server']
+        instance = opts.get('-instance')
+        self.commands.append((command, host, instance))
+        if command == 'setcellname':
+            self.cellname[host] = opts['-name']
+        elif command == 'addhost':
+            self.cellhosts[host].add(opts['-host'])
+        elif command == 'removehost':
+            self.cellhosts[host].discard(opts['-host'])
+        elif command == 'adduser':
+            self.users[host].append(opts['-user'])
+        elif command in ('create', 'restart'):
+            self.statuses[host][instance] = 'running'
+        elif command == 'shutdown':
+            self.statuses[host][instance] = 'shutdown'
+        return ''
+
+    def host_state(self, hostname):
+        state = HostState(hostname)
+        state.statuses = dict(self.statuses[hostname])
+        state.cellname = self.cellname[hostname]
+        state.cellhosts = set(self.cellhosts[hostname])
+        state.users = list(self.users[hostname])
+        return state
+
+    def wait_for_status(self, conditions, timeout=150):
+        for host, name, target in conditions:
+            if self.statuses[str(host)].get(name) != target:
+                raise AssertionError("%s on %s is not %s" % (name, host, target))
+
+    @contextlib.contextmanager
+    def active(self, cell):
+        """Run the servers setup of a cell with the fake bos."""
+        for name in ('ping_hosts', '_wait_for_ptserver', '_wait_for_vlserver', '_create_admin'):
+            setattr(cell, name, lambda *args: None)
+        cell._wait_for_quorum = lambda name, hosts: None
+        cell.wait_for_status = self.wait_for_status
+        for host in cell.hosts:
+            host.wait_for_status = lambda name, target='running': None
+            host.create_volume = lambda *args, **kwargs: None
+        saved = (afsutil.cell.bos, afsutil.cell.rxdebug, afsutil.snapshot.host_state)
+        afsutil.cell.bos = self.bos
+        afsutil.cell.rxdebug = lambda *args, **kwargs: ''
+        afsutil.snapshot.host_state = self.host_state
+        try:
+            yield
+        finally:
+            afsutil.cell.bos, afsutil.cell.rxdebug, afsutil.snapshot.host_state = saved
+
+if __name__ == "__main__":
+     unittest.main()
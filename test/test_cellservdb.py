@@ -0,0 +1,71 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import unittest
+import tempfile
+import shutil
+
+from afsutil.cellservdb import CellServDB, CellServDBError, merge, load
+
+DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "CellServDB.dist")
+
+class CellServDBTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir)
+
+    def test_load(self):
+        csdb = load(DIST)
+        self.assertEqual(csdb.cells(), ['grand.central.org', 'example.com', 'cern.ch'])
+        self.assertEqual(csdb.hosts('example.com'), [('192.0.2.20', 'db1.example.com')])
+        self.assertEqual(len(csdb.hosts('cern.ch')), 3)
+        self.assertEqual(csdb.lookup('cern.ch').comment,
+                         'European Laboratory for Particle Physics, Geneva')
+        self.assertEqual(csdb.cells_for_address('18.9.48.14'), ['grand.central.org'])
+        self.assertIsNone(csdb.lookup('bogus.example.com'))
+
+    def test_invalid(self):
+        self.assertRaises(CellServDBError, CellServDB().parse, ["192.0.2.1 #orphan\n"])
+        self.assertRaises(CellServDBError, CellServDB().parse, [">example.com\n", "bogus #host\n"])
+
+    def test_merge(self):
+        local = CellServDB()
+        local.add('example.com', 'Cell name', [('192.0.2.10', 'afs1.example.com')])
+        merged,conflicts = merge(local, load(DIST))
+        self.assertEqual(conflicts, ['example.com'])
+        self.assertEqual(merged.cells()[0], 'example.com')
+        self.assertEqual(merged.hosts('example.com'), [('192.0.2.10', 'afs1.example.com')])
+        self.assertEqual(len(merged), 3)
+        self.assertEqual(merged.cells_for_address('192.0.2.20'), [])
+
+    def test_write(self):
+        path = os.path.join(self.tdir, "CellServDB")
+        load(DIST).write(path)
+        self.assertEqual(os.listdir(self.tdir), ["CellServDB"])
+        csdb = load(path)
+        self.assertEqual(csdb.cells(), ['grand.central.org', 'example.com', 'cern.ch'])
+        self.assertEqual(csdb.hosts('cern.ch'), load(DIST).hosts('cern.ch'))
+
+if __name__ == "__main__":
+     unittest.main()
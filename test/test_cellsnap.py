@@ -0,0 +1,118 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from afsutil.cellsnap import save, restore, sources, duplicates
+
+CSDB = """\
+>example.com    #Example cell
+192.168.1.10         #afs01.example.com
+"""
+
+class CellSnapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'src')
+        self.dst = os.path.join(self.dir, 'dst')
+        self.snap = os.path.join(self.dir, 'cell.tar.gz')
+        self.write('usr/afs/etc/ThisCell', 'example.com\n')
+        self.write('usr/afs/etc/CellServDB', CSDB)
+        self.write('usr/afs/etc/KeyFileExt', 'key')
+        self.write('usr/afs/db/prdb.DB0', 'prdb')
+        self.write('usr/afs/db/vldb.DB0', 'vldb')
+        self.write('usr/afs/local/BosConfig', 'bnode')
+        self.write('usr/afs/local/FileLog', 'not saved')
+        self.write('usr/vice/etc/ThisCell', 'example.com\n')
+        self.write('usr/vice/etc/CellServDB.local', CSDB)
+        self.write('usr/vice/etc/afsd', 'binary')
+        self.write('vicepa/AFSIDat/a/data', 'same contents')
+        self.write('vicepa/AFSIDat/b/data', 'same contents')
+        self.write('vicepa/AFSIDat/c/data', 'other contents')
+        os.link(os.path.join(self.src, 'vicepa/AFSIDat/c/data'),
+                os.path.join(self.src, 'vicepa/AFSIDat/c/clone'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text, root=None):
+        path = os.path.join(root or self.src, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read(self, name):
+        with open(os.path.join(self.dst, name)) as f:
+            return f.read()
+
+    def test_sources(self):
+        names = sources(self.src)
+        self.assertIn('usr/afs/db/prdb.DB0', names)
+        self.assertIn('usr/afs/local/BosConfig', names)
+        self.assertIn('vicepa/AFSIDat/c/clone', names)
+        self.assertNotIn('usr/afs/local/FileLog', names)
+        self.assertNotIn('usr/vice/etc/afsd', names)
+
+    def test_duplicates(self):
+        dups = duplicates(self.src, sources(self.src))
+        self.assertEqual(dups['vicepa/AFSIDat/b/data'], 'vicepa/AFSIDat/a/data')
+        self.assertEqual(dups['usr/vice/etc/ThisCell'], 'usr/afs/etc/ThisCell')
+        self.assertNotIn('vicepa/AFSIDat/c/clone', dups)
+
+    def test_save_and_restore(self):
+        manifest = save(self.snap, root=self.src)
+        self.assertEqual(manifest['cell'], 'example.com')
+        self.assertEqual(manifest['partitions'], ['vicepa'])
+        self.write('vicepa/stale', 'removed on restore', root=self.dst)
+        restore(self.snap, root=self.dst)
+        self.assertEqual(self.read('usr/afs/db/vldb.DB0'), 'vldb')
+        self.assertEqual(self.read('vicepa/AFSIDat/b/data'), 'same contents')
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'vicepa/stale')))
+        a = os.stat(os.path.join(self.dst, 'vicepa/AFSIDat/a/data'))
+        b = os.stat(os.path.join(self.dst, 'vicepa/AFSIDat/b/data'))
+        self.assertNotEqual(a.st_ino, b.st_ino) # Copied, not linked.
+        c = os.stat(os.path.join(self.dst, 'vicepa/AFSIDat/c/data'))
+        clone = os.stat(os.path.join(self.dst, 'vicepa/AFSIDat/c/clone'))
+        self.assertEqual(c.st_ino, clone.st_ino) # Hard links are kept.
+
+    def test_restore_renamed(self):
+        save(self.snap, root=self.src)
+        restore(self.snap, root=self.dst, cell='test.example.com',
+                hostname='afs99.example.com', address='10.0.0.99')
+        self.assertEqual(self.read('usr/afs/etc/ThisCell'), 'test.example.com\n')
+        self.assertEqual(self.read('usr/vice/etc/ThisCell'), 'test.example.com\n')
+        for name in ('usr/afs/etc/CellServDB', 'usr/vice/etc/CellServDB.local'):
+            csdb = self.read(name)
+            self.assertIn('>test.example.com', csdb)
+            self.assertIn('10.0.0.99', csdb)
+            self.assertNotIn('192.168.1.10', csdb)
+
+    def test_not_a_snapshot(self):
+        with open(self.snap, 'w') as f:
+            f.write('')
+        self.assertRaises(Exception, restore, self.snap, root=self.dst)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import afsutil.cmd
+from afsutil.context import Context, current, DEFAULT
+from afsutil.parallel import parallel
+from afsutil.system import CommandFailed
+
+class ContextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def script(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write("#!/bin/sh\n" + text)
+        os.chmod(path, 0o755)
+        return path
+
+    def test_default(self):
+        self.assertTrue(current() is DEFAULT)
+        context = Context()
+        with context:
+            self.assertTrue(current() is context)
+        self.assertTrue(current() is DEFAULT)
+
+    def test_paths(self):
+        self.script('fake-vos', 'echo "vos $@"\n')
+        context = Context(paths={'vos': os.path.join(self.dir, 'fake-vos')}, localauth=True)
+        self.assertEqual(afsutil.cmd.vos('listvldb', context=context), "vos listvldb -localauth")
+        with context:
+            self.assertEqual(afsutil.cmd.vos('listvldb'), "vos listvldb -localauth")
+        context.localauth = False
+        self.assertEqual(list(afsutil.cmd.stream('vos', 'listaddrs', context=context)), ["vos listaddrs"])
+        self.assertNotIn('vos', DEFAULT.paths)
+
+    def test_env_and_cwd(self):
+        self.script('showenv', 'echo "$AFSUTIL_TEST `pwd`"\n')
+        context = Context(env={'PATH': self.dir}, cwd=self.dir, extra_paths=[])
+        context.setenv('AFSUTIL_TEST', 'yes')
+        self.assertEqual(context.sh('showenv'), ["yes %s" % os.path.realpath(self.dir)])
+        self.assertEqual(os.getenv('AFSUTIL_TEST'), None)
+
+    def test_retry_and_tracer(self):
+        counter = os.path.join(self.dir, 'count')
+        self.script('flaky', 'echo x >> %s; [ `wc -l < %s` -ge 3 ]\n' % (counter, counter))
+        traced = []
+        context = Context(paths={'flaky': os.path.join(self.dir, 'flaky')}, retry=2, wait=0,
+                          tracer=lambda cmdline, code, elapsed: traced.append(code))
+        context.run('flaky')
+        self.assertEqual(traced, [1, 1, 0])
+        os.remove(counter)
+        self.assertRaises(CommandFailed, context.run, 'flaky', retry=0)
+
+    def test_timeout(self):
+        self.script('slow', 'exec sleep 5\n')
+        context = Context(paths={'slow': os.path.join(self.dir, 'slow')}, timeout=0.2)
+        self.assertRaises(CommandFailed, context.run, 'slow')
+
+    def test_parallel_threads_use_callers_context(self):
+        contexts = [Context(paths={'x': str(n)}) for n in range(4)]
+        seen = {}
+        lock = threading.Lock()
+        def task(n):
+            with lock:
+                seen[n] = current()
+        def run(context):
+            with context:
+                parallel(lambda n: task((context.paths['x'], n)), range(3), workers=3)
+        threads = [threading.Thread(target=run, args=(c,)) for c in contexts]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for (x, n), context in seen.items():
+            self.assertEqual(context.paths['x'], x)
+        self.assertEqual(len(seen), 12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import afsutil.farm
+from afsutil.farm import Farm, FarmCell, format_timings
+
+SPEC = """\
+[cell]
+name = %(name)s
+realm = EXAMPLE.COM
+admins = afsadmin
+db = %(host)s
+fs = %(host)s
+
+[volumes]
+top = test
+
+[options]
+afsd = -dynroot -fakestat
+dafileserver = -L
+
+[farm]
+command = ssh %(host)s sudo -n afsutil
+paths = fs=/usr/afs/bin/fs
+install = --dist transarc --force
+"""
+
+class FarmTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.sh = afsutil.farm.sh
+
+    def tearDown(self):
+        afsutil.farm.sh = self.sh
+        shutil.rmtree(self.dir)
+
+    def spec(self, name, host, extra=""):
+        path = os.path.join(self.dir, name + '.spec')
+        with open(path, 'w') as f:
+            f.write(SPEC % locals() + extra)
+        return path
+
+    def test_args(self):
+        cell = FarmCell(self.spec('a.example.com', 'afs01'))
+        self.assertEqual(cell.command, ['ssh', 'afs01', 'sudo', '-n', 'afsutil'])
+        self.assertEqual(cell.args('install'),
+            ['install', '--components', 'server', 'client', '--cell', 'a.example.com',
+             '--realm', 'EXAMPLE.COM', '--hosts', 'afs01', '-o', 'afsd=-dynroot -fakestat',
+             '--dist', 'transarc', '--force'])
+        self.assertEqual(cell.args('newcell'),
+            ['newcell', '--cell', 'a.example.com', '--realm', 'EXAMPLE.COM', '--admin', 'afsadmin',
+             '--db', 'afs01', '--fs', 'afs01', '-o', 'dafileserver=-L', '-p', 'fs=/usr/afs/bin/fs'])
+        self.assertIn('--top', cell.args('mtroot'))
+        self.assertEqual(cell.keytab, '/tmp/afsutil/a.example.com.keytab')
+
+    def test_bad_step(self):
+        path = self.spec('a.example.com', 'afs01', "steps = install reboot\n")
+        self.assertRaises(AssertionError, FarmCell, path)
+
+    def test_duplicate_cells(self):
+        paths = [self.spec('a.example.com', 'afs01'), self.spec('a.example.com', 'afs02')]
+        self.assertRaises(AssertionError, Farm, paths)
+
+    def test_setup_concurrently(self):
+        running = set()
+        overlap = []
+        lock = threading.Lock()
+        def sh(*args, **kwargs):
+            prefix = kwargs['prefix']
+            with lock:
+                running.add(prefix)
+                if len(running) > 1:
+                    overlap.append(prefix)
+            time.sleep(0.01)
+            with lock:
+                running.discard(prefix)
+            if prefix == 'b.example.com' and 'newcell' in args:
+                raise AssertionError("newcell failed")
+        afsutil.farm.sh = sh
+        farm = Farm([self.spec('a.example.com', 'afs01'), self.spec('b.example.com', 'afs02')])
+        results = farm.setup()
+        self.assertTrue(overlap)
+        self.assertTrue(results[0].ok)
+        self.assertEqual([s for s,t in results[0].value], list(afsutil.farm.STEPS))
+        self.assertFalse(results[1].ok)
+        table = format_timings(results)
+        self.assertIn('failed: newcell failed', table)
+
+if __name__ == '__main__':
+    unittest.main()
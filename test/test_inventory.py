@@ -0,0 +1,164 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import unittest
+
+import afsutil.inventory
+from afsutil.inventory import Inventory, parse_listvol, QUERIES
+
+LISTVLDB = """\
+VLDB entries for all servers
+
+root.afs
+    RWrite: 536870912     ROnly: 536870913
+    number of sites -> 2
+       server afs01 partition /vicepa RW Site
+       server afs01 partition /vicepa RO Site
+
+proj.a
+    RWrite: 536870918
+    number of sites -> 1
+       server afs02 partition /vicepa RW Site
+    Volume is currently LOCKED
+
+Total entries: 2
+"""
+
+LISTVOL = {
+'afs01': """\
+Total number of volumes on server afs01 partition /vicepa: 2
+root.afs                          536870912 RW          2 K On-line
+    afs01 /vicepa
+    RWrite  536870912 ROnly  536870913 Backup          0
+    MaxQuota       5000 K
+    Creation    Mon Oct 12 10:00:00 2026
+    Last Update Mon Oct 12 10:00:00 2026
+    0 accesses in the past day (i.e., vnode references)
+
+root.afs.readonly                 536870913 RO          2 K On-line
+    afs01 /vicepa
+    RWrite  536870912 ROnly  536870913 Backup          0
+    MaxQuota       5000 K
+    0 accesses in the past day (i.e., vnode references)
+
+Total volumes onLine 2 ; Total volumes offLine 0 ; Total busy 0
+""",
+'afs02': """\
+Total number of volumes on server afs02 partition /vicepa: 3
+proj.a                            536870918 RW       9500 K On-line
+    afs02 /vicepa
+    MaxQuota      10000 K
+
+stray                             536870930 RW         10 K Off-line
+    afs02 /vicepa
+    MaxQuota          0 K
+
+**** Volume 536870940 is busy ****
+
+Total volumes onLine 1 ; Total volumes offLine 1 ; Total busy 1
+""",
+}
+
+PARTINFO = {
+    'afs01': "Free space on partition /vicepa: 900 K blocks out of total 1000\n",
+    'afs02': "Free space on partition /vicepa: 100 K blocks out of total 1000\n",
+}
+
+class InventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.vos = afsutil.inventory.vos
+        self.stream = afsutil.inventory.stream
+        def vos(*args, **kwargs):
+            self.calls.append(args)
+            if args[0] == 'partinfo':
+                return PARTINFO[args[2]]
+            if args[0] == 'listaddrs':
+                return "afs01\nafs02\n"
+            raise AssertionError("unexpected vos %s" % (args,))
+        def stream(*args, **kwargs):
+            self.calls.append(args[1:])
+            if args[1] == 'listvldb':
+                return iter(LISTVLDB.splitlines())
+            if args[1] == 'listvol':
+                return iter(LISTVOL[args[3]].splitlines())
+            raise AssertionError("unexpected stream %s" % (args,))
+        afsutil.inventory.vos = vos
+        afsutil.inventory.stream = stream
+        self.inv = Inventory(':memory:', workers=2)
+
+    def tearDown(self):
+        self.inv.close()
+        afsutil.inventory.vos = self.vos
+        afsutil.inventory.stream = self.stream
+
+    def rows(self, name):
+        columns, rows = self.inv.query(name)
+        return [tuple(r) for r in rows]
+
+    def test_parse_listvol(self):
+        rows = list(parse_listvol(LISTVOL['afs02'].splitlines(), 'afs02'))
+        self.assertEqual(rows, [
+            (536870918, 'proj.a', 'afs02', '/vicepa', 'RW', 9500, 10000, 'On-line'),
+            (536870930, 'stray', 'afs02', '/vicepa', 'RW', 10, 0, 'Off-line'),
+            (536870940, None, 'afs02', '/vicepa', None, None, None, 'busy'),
+        ])
+
+    def test_refresh(self):
+        results = self.inv.refresh()
+        self.assertTrue(all(r.ok for r in results))
+        count = self.inv.db.execute("SELECT COUNT(*) FROM volumes").fetchone()[0]
+        self.assertEqual(count, 5)
+        self.assertEqual(self.rows('full-partitions'), [('afs02', '/vicepa', 1000, 100, 90.0)])
+        self.assertEqual(self.rows('no-replicas'), [('proj.a', 'afs02', '/vicepa')])
+        self.assertEqual(self.rows('locked'), [('proj.a', 536870918)])
+        self.assertEqual(self.rows('over-quota'), [('proj.a', 536870918, 'afs02', '/vicepa', 9500, 10000)])
+        self.assertEqual([r[0] for r in self.rows('orphans')], ['stray'])
+        self.assertEqual(sorted(r[0] for r in self.rows('offline')), [None, 'stray'])
+
+    def test_incremental(self):
+        self.inv.refresh()
+        self.calls = []
+        self.inv.refresh(max_age=3600)
+        self.assertEqual(self.calls, [('listaddrs',)])
+        self.inv.refresh(servers=['afs02'], vldb=False)
+        self.assertNotIn(('listvol', '-server', 'afs01', '-long'), self.calls)
+        count = self.inv.db.execute("SELECT COUNT(*) FROM volumes").fetchone()[0]
+        self.assertEqual(count, 5) # afs02 rows replaced, not duplicated
+
+    def test_failed_server_keeps_rows(self):
+        self.inv.refresh()
+        def fail(*args, **kwargs):
+            raise AssertionError("fileserver down")
+        afsutil.inventory.stream = fail
+        results = self.inv.refresh(servers=['afs01'], vldb=False)
+        self.assertFalse(results[0].ok)
+        count = self.inv.db.execute("SELECT COUNT(*) FROM volumes WHERE server = 'afs01'").fetchone()[0]
+        self.assertEqual(count, 2)
+
+    def test_queries(self):
+        self.inv.refresh()
+        for name in QUERIES:
+            self.inv.query(name)
+        self.assertRaises(ValueError, self.inv.query, 'bogus')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from afsutil.journal import Journal
+from afsutil.scheduler import Scheduler
+
+KEY = {'cell': 'example.com', 'db': ['afs01'], 'fs': ['afs01', 'afs02']}
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'newcell.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_persist(self):
+        j = Journal(self.path, KEY)
+        j.complete('setup', 1.5)
+        j.complete('hosts', 0.5, item='afs01')
+        j = Journal(self.path, KEY)
+        self.assertTrue(j.completed('setup'))
+        self.assertTrue(j.completed('hosts', 'afs01'))
+        self.assertFalse(j.completed('hosts', 'afs02'))
+        self.assertFalse(j.completed('hosts'))
+        self.assertEqual(j.durations(), {'setup': 1.5})
+
+    def test_different_key(self):
+        Journal(self.path, KEY).complete('setup', 1.0)
+        j = Journal(self.path, dict(KEY, cell='other.com'))
+        self.assertFalse(j.completed('setup'))
+
+    def test_resume(self):
+        calls = []
+        def build(fail_on=None):
+            s = Scheduler(workers=2, journal=Journal(self.path, KEY))
+            s.add("check", lambda: calls.append('check'), checkpoint=False)
+            s.add("first", lambda: calls.append('first'))
+            def host(h):
+                if h == fail_on:
+                    raise AssertionError("failed %s" % h)
+                calls.append(h)
+            s.add("hosts", host, ['afs01', 'afs02'])
+            s.add("verified", lambda: calls.append('verified'), verify=lambda: False)
+            return s
+        self.assertRaises(AssertionError, build(fail_on='afs02').run)
+        self.assertEqual(sorted(calls), ['afs01', 'check', 'first'])
+        del calls[:]
+        s = build()
+        s.run()
+        self.assertEqual(calls, ['check', 'afs02', 'verified'])
+        self.assertTrue(s.phases[1].skipped)
+        del calls[:]
+        build().run()
+        self.assertEqual(calls, ['check', 'verified'])
+
+if __name__ == "__main__":
+     unittest.main()
@@ -0,0 +1,81 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import unittest
+
+from afsutil.placement import Placement, Partition, parse_partinfo, parse_listvol
+import afsutil.placement
+
+PARTINFO = """\
+Free space on partition /vicepa: 1000 K blocks out of total 5000
+Free space on partition /vicepb: 3000 K blocks out of total 5000
+"""
+
+LISTVOL = """\
+Total number of volumes on server fs1 partition /vicepa: 4
+536870912
+536870915
+Total number of volumes on server fs1 partition /vicepb: 1
+536870918
+"""
+
+class PlacementTest(unittest.TestCase):
+
+    def setUp(self):
+        self.partitions = afsutil.placement.partitions
+        afsutil.placement.partitions = lambda server: [
+            Partition(server, '/vicepa', free=1000, volumes=4),
+            Partition(server, '/vicepb', free=3000, volumes=1),
+        ]
+
+    def tearDown(self):
+        afsutil.placement.partitions = self.partitions
+
+    def test_parse(self):
+        self.assertEqual(parse_partinfo(PARTINFO), {'/vicepa': (1000, 5000), '/vicepb': (3000, 5000)})
+        self.assertEqual(parse_listvol(LISTVOL), {'/vicepa': 4, '/vicepb': 1})
+
+    def test_most_free(self):
+        p = Placement(['fs1'], policy='most-free', size=1500)
+        self.assertEqual(p.choose(), ('fs1', '/vicepb'))
+        self.assertEqual(p.choose(), ('fs1', '/vicepb'))
+        self.assertEqual(p.choose(), ('fs1', '/vicepa'))
+
+    def test_fewest_volumes(self):
+        p = Placement(['fs1', 'fs2'], policy='fewest-volumes')
+        chosen = [p.choose() for n in xrange(0, 4)]
+        self.assertEqual(sorted(chosen), [('fs1', '/vicepb'), ('fs1', '/vicepb'),
+                                          ('fs2', '/vicepb'), ('fs2', '/vicepb')])
+
+    def test_round_robin(self):
+        p = Placement(['fs1', 'fs2'], policy='round-robin')
+        chosen = [p.choose() for n in xrange(0, 4)]
+        self.assertEqual(len(set(chosen)), 4)
+
+    def test_exclude(self):
+        p = Placement(['fs1', 'fs2'])
+        self.assertEqual(p.choose(exclude=['fs1'])[0], 'fs2')
+        self.assertRaises(AssertionError, p.choose, servers=['fs3'])
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, Placement, ['fs1'], policy='bogus')
+
+if __name__ == "__main__":
+     unittest.main()
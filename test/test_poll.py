@@ -0,0 +1,79 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import threading
+import unittest
+
+from afsutil.poll import Backoff, wait_until, StatusPoller
+
+class PollTest(unittest.TestCase):
+
+    def test_backoff(self):
+        b = Backoff(initial=1.0, maximum=4.0, factor=2.0)
+        self.assertEqual([b.next() for i in xrange(0, 5)], [1.0, 2.0, 4.0, 4.0, 4.0])
+
+    def test_wait_until(self):
+        calls = []
+        def ready():
+            calls.append(True)
+            return len(calls) == 3
+        elapsed = wait_until(ready, "test", timeout=5, initial=0.01, maximum=0.02)
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(elapsed < 1.0)
+
+    def test_wait_until_timeout(self):
+        self.assertRaises(AssertionError, wait_until, lambda: False, "test",
+                          timeout=0.1, initial=0.01, maximum=0.02)
+
+    def test_status_poller(self):
+        fetched = []
+        lock = threading.Lock()
+        def fetch(hostname):
+            with lock:
+                fetched.append(hostname)
+                n = fetched.count(hostname)
+            if n < 3:
+                return {'ptserver': 'starting', 'vlserver': 'running'}
+            return {'ptserver': 'running', 'vlserver': 'running'}
+        poller = StatusPoller(fetch)
+        conditions = []
+        for hostname in ('a', 'b'):
+            for instance in ('ptserver', 'vlserver'):
+                conditions.append((hostname, instance, 'running'))
+        poller.wait(conditions, timeout=5)
+        # One fetch per host per tick, not one per service.
+        self.assertEqual(sorted(fetched), ['a', 'a', 'a', 'b', 'b', 'b'])
+        self.assertEqual(poller.fetches, 6)
+
+    def test_status_poller_shared(self):
+        poller = StatusPoller(lambda h: {'fs': 'running'})
+        poller.status('a')
+        poller.status('a', since=0.0)
+        self.assertEqual(poller.fetches, 1)
+        poller.invalidate('a')
+        poller.status('a')
+        self.assertEqual(poller.fetches, 2)
+
+    def test_status_poller_timeout(self):
+        poller = StatusPoller(lambda h: {'fs': 'shutdown'})
+        self.assertRaises(AssertionError, poller.wait, [('a', 'fs', 'running')], timeout=0.1)
+
+if __name__ == "__main__":
+     unittest.main()
@@ -0,0 +1,121 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import unittest
+from io import StringIO
+
+import afsutil.provision
+from afsutil.provision import Provision, read_records, listentries
+from afsutil.system import CommandFailed
+
+LISTENTRIES = """\
+Name                          ID  Owner Creator
+admin                          1   -204    32766
+alice                       1000   -204        1
+system:administrators       -204   -204     -204
+staff                       -206      1        1
+"""
+
+CSV = u"""\
+type,name,id,owner,group
+user,alice,1000,,
+user,bob,1001,,
+user,carol,,,
+group,staff,,admin,
+group,admin:devs,,admin,
+group,admin:ops,,admin:devs,
+member,alice,,,staff
+member,bob,,,staff
+member,carol,,,admin:devs
+"""
+
+class ProvisionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.pts = afsutil.provision.pts
+        self.stream = afsutil.provision.stream
+        def pts(*args, **kwargs):
+            self.calls.append(list(args))
+            if args[0] == 'membership':
+                return "Members of staff (id: -206) are:\n  alice\n"
+            if 'bad' in args:
+                raise CommandFailed(['pts'] + list(args), 1, "pts: Badly formed name")
+            if 'dup' in args:
+                raise CommandFailed(['pts'] + list(args), 1, "pts: Entry for name already exists")
+            return ""
+        afsutil.provision.pts = pts
+        afsutil.provision.stream = lambda *args, **kwargs: iter(LISTENTRIES.splitlines())
+
+    def tearDown(self):
+        afsutil.provision.pts = self.pts
+        afsutil.provision.stream = self.stream
+
+    def test_read_records(self):
+        records = list(read_records(StringIO(CSV), 'csv'))
+        self.assertEqual(len(records), 9)
+        self.assertEqual(records[2], {'type': 'user', 'name': 'carol', 'id': None, 'owner': None, 'group': None})
+        json = StringIO(u'{"type": "user", "name": "dave", "id": 1002}\n\n{"type": "member", "name": "dave", "group": "staff"}\n')
+        records = list(read_records(json, 'json'))
+        self.assertEqual(records[0]['id'], '1002')
+        self.assertEqual(records[1]['group'], 'staff')
+
+    def test_invalid_records(self):
+        self.assertRaises(AssertionError, list, read_records(StringIO(u"type,name\nhost,x\n"), 'csv'))
+        self.assertRaises(AssertionError, list, read_records(StringIO(u"type,name\nmember,x\n"), 'csv'))
+
+    def test_listentries(self):
+        entries = listentries()
+        self.assertEqual(entries['alice'], 1000)
+        self.assertEqual(entries['system:administrators'], -204)
+        self.assertNotIn('Name', entries)
+
+    def test_commands(self):
+        p = Provision(listentries(), workers=2)
+        p.add(read_records(StringIO(CSV), 'csv'))
+        p.prune()
+        self.assertEqual(p.skipped, 3) # alice, staff, alice in staff
+        self.assertEqual(p.commands(), [
+            [['createuser', '-name', 'bob', '-id', '1001'],
+             ['createuser', '-name', 'carol']],
+            [['creategroup', '-name', 'admin:devs', '-owner', 'admin']],
+            [['creategroup', '-name', 'admin:ops', '-owner', 'admin:devs']],
+            [['adduser', '-user', 'carol', '-group', 'admin:devs'],
+             ['adduser', '-user', 'bob', '-group', 'staff']],
+        ])
+
+    def test_batches(self):
+        names = ['user%d' % i for i in range(250)]
+        p = Provision({}, workers=2)
+        p.add({'type': 'user', 'name': n, 'id': None, 'owner': None, 'group': None} for n in names)
+        commands = p.commands()[0]
+        self.assertEqual([len(c) - 2 for c in commands], [100, 100, 50])
+
+    def test_run_retries_failed_batch(self):
+        p = Provision({}, workers=2)
+        p.add({'type': 'user', 'name': n, 'id': None, 'owner': None, 'group': None} for n in ('a', 'dup', 'b'))
+        self.assertEqual(p.run(), [])
+        self.assertIn(['createuser', '-name', 'b'], self.calls)
+        p = Provision({}, workers=2)
+        p.add({'type': 'user', 'name': n, 'id': None, 'owner': None, 'group': None} for n in ('a', 'bad'))
+        self.assertEqual(p.run(), [['createuser', '-name', 'a', 'bad']])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import unittest
+import tempfile
+import shutil
+
+from afsutil.purge import Purger, purge, scan, stash, stashed
+
+def make_tree(top, dirs=4, files=10, depth=2):
+    """Create a tree of small files, returns the number of files."""
+    count = 0
+    for d in xrange(0, dirs):
+        path = os.path.join(top, "D%d" % d)
+        os.mkdir(path)
+        for f in xrange(0, files):
+            with open(os.path.join(path, "V%d" % f), 'w') as fh:
+                fh.write("x")
+            count += 1
+        if depth > 1:
+            count += make_tree(path, dirs=2, files=files, depth=depth-1)
+    return count
+
+class PurgeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir)
+
+    def test_scan(self):
+        make_tree(self.tdir, dirs=2, files=0, depth=1)
+        names = sorted([e.name for e in scan(self.tdir)])
+        self.assertEqual(names, ['D0', 'D1'])
+        self.assertTrue(all([e.is_dir(follow_symlinks=False) for e in scan(self.tdir)]))
+
+    def test_purge(self):
+        top = os.path.join(self.tdir, "AFSIDat")
+        os.mkdir(top)
+        count = make_tree(top)
+        purger = Purger(workers=4)
+        purger.purge([top])
+        self.assertFalse(os.path.exists(top))
+        self.assertEqual(purger.files, count)
+
+    def test_purge_keep(self):
+        count = make_tree(self.tdir)
+        purger = Purger(workers=2)
+        purger.purge([self.tdir], keep=True)
+        self.assertTrue(os.path.isdir(self.tdir))
+        self.assertEqual(len(scan(self.tdir)), 0)
+        self.assertEqual(purger.files, count)
+
+    def test_purge_symlink(self):
+        target = os.path.join(self.tdir, "target")
+        os.mkdir(target)
+        make_tree(target, dirs=1, files=2, depth=1)
+        top = os.path.join(self.tdir, "top")
+        os.mkdir(top)
+        os.symlink(target, os.path.join(top, "link"))
+        purge([top])
+        self.assertFalse(os.path.exists(top))
+        self.assertEqual(len(scan(os.path.join(target, "D0"))), 2)
+
+    def test_purge_in_background(self):
+        top = os.path.join(self.tdir, "cache")
+        os.mkdir(top)
+        make_tree(top)
+        purger = Purger(workers=4)
+        aside = purger.purge_in_background([top])
+        self.assertFalse(os.path.exists(top))
+        self.assertEqual(stashed(top), aside)
+        purger.wait()
+        self.assertEqual(stashed(top), [])
+
+    def test_stash(self):
+        top = os.path.join(self.tdir, "AFSIDat")
+        os.mkdir(top)
+        aside = stash(top)
+        self.assertFalse(os.path.exists(top))
+        self.assertTrue(os.path.isdir(aside))
+        self.assertEqual(stashed(top), [aside])
+
+if __name__ == "__main__":
+     unittest.main()
@@ -0,0 +1,159 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import unittest
+
+import afsutil.cell
+import afsutil.reconcile
+import afsutil.snapshot
+from afsutil.cell import Cell
+from afsutil.parallel import Result
+from afsutil.placement import Partition
+from afsutil.vldb import VLDB
+from afsutil.reconcile import load_spec, Reconciler
+from afsutil.snapshot import CellSnapshot, HostState
+
+SPEC = os.path.join(os.path.dirname(__file__), 'data', 'cell.spec')
+
+def state(hostname, statuses, cellname='example.com', cellhosts=('afs01', 'afs02'),
+          users=('admin', 'jdoe.admin')):
+    s = HostState(hostname)
+    s.statuses = dict((name, 'running') for name in statuses)
+    s.cellname = cellname
+    s.cellhosts = set(cellhosts)
+    s.users = list(users)
+    return s
+
+class ReconcileTest(unittest.TestCase):
+
+    def setUp(self):
+        cell, volumes = load_spec(SPEC)
+        self.reconciler = Reconciler(Cell(**cell), volumes)
+        snapshot = CellSnapshot('example.com', ['afs01', 'afs02', 'afs03'])
+        snapshot.hosts = {
+            'afs01': state('afs01', ['ptserver', 'vlserver', 'dafs']),
+            'afs02': state('afs02', ['ptserver', 'vlserver']),
+            'afs03': state('afs03', ['dafs']),
+        }
+        snapshot.databases = True
+        snapshot.administrators = ['admin', 'jdoe.admin']
+        snapshot.vldb = {
+            'proj.a': (('afs01', '/vicepa'), [('afs01', '/vicepa'), ('afs03', '/vicepa')]),
+            'proj.b': (('afs03', '/vicepa'), [('afs03', '/vicepa'), ('afs01', '/vicepa')]),
+        }
+        self.reconciler.state = snapshot
+
+    def test_load_spec(self):
+        cell, volumes = load_spec(SPEC)
+        self.assertEqual(cell['cell'], 'example.com')
+        self.assertEqual(cell['db'], ['afs01', 'afs02'])
+        self.assertEqual(cell['admins'], ['admin', 'jdoe.admin'])
+        self.assertEqual(cell['replicas'], 2)
+        self.assertEqual(cell['options']['afs03.fsprofile'], 'large')
+        self.assertEqual(Cell(**cell).fs[1].fsprofile, 'large')
+        self.assertEqual(volumes, ['proj.a', 'proj.b'])
+
+    def test_host_options(self):
+        cell, volumes = load_spec(SPEC)
+        cell = Cell(**cell)
+        commands = []
+        def bos(*args, **kwargs):
+            commands.append(args)
+            return ''
+        saved = (afsutil.cell.bos, afsutil.cell.rxdebug, afsutil.snapshot.host_state)
+        afsutil.cell.bos = bos
+        afsutil.cell.rxdebug = lambda *args, **kwargs: ''
+        afsutil.snapshot.host_state = HostState
+        try:
+            cell.fs[0].create_fileserver()
+            cell.fs[1].create_fileserver()
+        finally:
+            afsutil.cell.bos, afsutil.cell.rxdebug, afsutil.snapshot.host_state = saved
+        def fileserver(args):
+            return [a for a in args if a.endswith('/dafileserver') or '/dafileserver ' in a][0].split()[1:]
+        self.assertEqual(fileserver(commands[0]), ['-L'])
+        flags = fileserver(commands[1])
+        self.assertEqual(flags[0:2], ['-p', '64'])
+        self.assertEqual(flags.count('-p'), 1)
+
+    def test_up_to_date(self):
+        self.assertEqual(self.reconciler.plan(), [])
+
+    def test_new_db_server(self):
+        hosts = self.reconciler.state.hosts
+        hosts['afs01'].cellhosts = set(['afs01'])
+        hosts['afs02'] = state('afs02', [], cellname='localcell', cellhosts=['afs02'], users=[])
+        hosts['afs03'].cellhosts = set(['afs01'])
+        plan = [str(a) for a in self.reconciler.plan()]
+        self.assertEqual(plan, [
+            'Set cell hosts on afs01',
+            'Set cell name on afs02',
+            'Set cell hosts on afs02',
+            'Add superuser admin on afs02',
+            'Add superuser jdoe.admin on afs02',
+            'Set cell hosts on afs03',
+            'Start database servers on afs02',
+            'Restart database servers on afs01 one at a time',
+            'Wait for database quorum',
+        ])
+
+    def test_volumes(self):
+        del self.reconciler.state.vldb['proj.b']
+        self.reconciler.state.vldb['proj.a'][1].pop()
+        plan = [str(a) for a in self.reconciler.plan()]
+        self.assertEqual(plan, ['Setup volumes proj.b, proj.a'])
+
+    def test_new_cell(self):
+        self.reconciler.state.hosts['afs01'].statuses = {}
+        plan = [str(a) for a in self.reconciler.plan()]
+        self.assertEqual(plan, ['Setup new cell example.com', 'Setup volumes proj.a, proj.b'])
+
+    def test_setup_volumes(self):
+        cell = self.reconciler.cell
+        cell._vldb = VLDB()
+        cell.placement.partitions = [Partition('afs01', '/vicepa', free=1000)]
+        calls = []
+        class FakeBulk(object):
+            def __init__(self, **kwargs):
+                pass
+            def run(self, specs):
+                calls.append(('bulk', specs))
+                return [Result(spec) for spec in specs]
+        def mtroot(volumes):
+            raise AssertionError("mtroot should not be run")
+        cell.mtroot = mtroot
+        cell.mount_volumes = lambda volumes: calls.append(('mount', volumes))
+        saved = (afsutil.reconcile.BulkVolumes, afsutil.reconcile.afs_mountpoint)
+        afsutil.reconcile.BulkVolumes = FakeBulk
+        afsutil.reconcile.afs_mountpoint = lambda: '/afs'
+        try:
+            self.reconciler._setup_volumes(['proj.c'], ['proj.a'])
+        finally:
+            afsutil.reconcile.BulkVolumes, afsutil.reconcile.afs_mountpoint = saved
+        self.assertEqual(calls, [('bulk', [('proj.c', 'afs01', '/vicepa'), ('proj.a', None, None)]),
+                                 ('mount', ['proj.c'])])
+
+    def test_unreachable(self):
+        self.reconciler.state.hosts['afs03'].error = AssertionError("unreachable")
+        self.assertRaises(AssertionError, self.reconciler.plan)
+
+if __name__ == "__main__":
+     unittest.main()
@@ -0,0 +1,103 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import socket
+import unittest
+
+import afsutil.resolver
+from afsutil.resolver import Resolver, read_hosts_file, is_address, addresses
+
+HOSTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hosts")
+
+class CountingResolver(Resolver):
+    """Count the uncached lookups."""
+    def __init__(self, **kwargs):
+        Resolver.__init__(self, **kwargs)
+        self.lookups = 0
+
+    def _lookup(self, name):
+        self.lookups += 1
+        return Resolver._lookup(self, name)
+
+class ResolverTest(unittest.TestCase):
+
+    def test_is_address(self):
+        self.assertTrue(is_address('192.0.2.1'))
+        self.assertFalse(is_address('afs1.example.com'))
+
+    def test_read_hosts_file(self):
+        hosts = read_hosts_file(HOSTS)
+        self.assertEqual(hosts['afs1'], ['192.0.2.10'])
+        self.assertEqual(hosts['afs2.example.com'], ['192.0.2.11'])
+        self.assertEqual(hosts['afs3.example.com'], ['192.0.2.12', '198.51.100.12'])
+        self.assertNotIn('second', hosts)
+
+    def test_resolve(self):
+        r = Resolver(hostsfile=HOSTS)
+        self.assertEqual(r.resolve('afs1.example.com'), ['192.0.2.10'])
+        self.assertEqual(r.resolve('afs3.example.com'), ['192.0.2.12', '198.51.100.12'])
+        self.assertEqual(r.resolve('192.0.2.99'), ['192.0.2.99'])
+
+    def test_resolve_all(self):
+        r = Resolver(hostsfile=HOSTS, workers=4)
+        names = ['afs1.example.com', 'afs2.example.com', 'afs3.example.com', 'afs1.example.com']
+        resolved = r.resolve_all(names)
+        self.assertEqual(len(resolved), 3)
+        self.assertEqual(resolved['afs2.example.com'], ['192.0.2.11'])
+
+    def test_resolve_all_errors(self):
+        r = Resolver(hostsfile=HOSTS)
+        names = ['afs1.example.com', 'bogus.invalid']
+        self.assertRaises(socket.gaierror, r.resolve_all, names)
+        resolved = r.resolve_all(names, raise_errors=False)
+        self.assertEqual(resolved['bogus.invalid'], [])
+
+    def test_cache(self):
+        r = CountingResolver(hostsfile=HOSTS)
+        r.resolve('afs1.example.com')
+        r.resolve_all(['afs1.example.com', 'afs2.example.com'])
+        self.assertEqual(r.lookups, 2)
+        r.clear()
+        r.resolve('afs1.example.com')
+        self.assertEqual(r.lookups, 3)
+
+    def test_ttl(self):
+        r = CountingResolver(hostsfile=HOSTS, ttl=0)
+        r.resolve('afs1.example.com')
+        r.resolve('afs1.example.com')
+        self.assertEqual(r.lookups, 2)
+
+    def test_addresses(self):
+        resolver = afsutil.resolver.resolver
+        saved = resolver.hosts
+        resolver.hosts = read_hosts_file(HOSTS)
+        resolver.clear()
+        try:
+            self.assertEqual(addresses(['afs1']), addresses(['afs1.example.com']))
+            self.assertEqual(addresses(['afs3.example.com', '192.0.2.10']),
+                             set(['192.0.2.10', '192.0.2.12', '198.51.100.12']))
+            self.assertEqual(addresses(['bogus.invalid']), set(['bogus.invalid']))
+        finally:
+            resolver.hosts = saved
+            resolver.clear()
+
+if __name__ == "__main__":
+     unittest.main()
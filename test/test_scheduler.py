@@ -0,0 +1,78 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import threading
+import time
+import unittest
+
+from afsutil.scheduler import Scheduler
+from afsutil.parallel import parallel
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_parallel(self):
+        results = parallel(lambda x: x * 2, [1, 2, 3, 4], workers=2)
+        self.assertEqual([r.value for r in results], [2, 4, 6, 8])
+
+    def test_parallel_errors(self):
+        def f(x):
+            if x == 2:
+                raise ValueError("two")
+            return x
+        self.assertRaises(ValueError, parallel, f, [1, 2, 3])
+        results = parallel(f, [1, 2, 3], raise_errors=False)
+        self.assertEqual([r.ok for r in results], [True, False, True])
+
+    def test_phases_in_order(self):
+        events = []
+        lock = threading.Lock()
+        def record(x):
+            with lock:
+                events.append(x)
+        s = Scheduler(workers=4)
+        s.add("first", lambda: record('first'))
+        s.add("hosts", record, ['a', 'b', 'c'])
+        s.add("last", lambda: record('last'))
+        s.run()
+        self.assertEqual(events[0], 'first')
+        self.assertEqual(sorted(events[1:4]), ['a', 'b', 'c'])
+        self.assertEqual(events[4], 'last')
+        self.assertEqual([name for name,_ in s.durations()], ['first', 'hosts', 'last'])
+
+    def test_concurrent_tasks(self):
+        hosts = ['h%d' % n for n in xrange(0, 8)]
+        s = Scheduler(workers=8)
+        s.add("sleep", lambda h: time.sleep(0.2), hosts)
+        start = time.time()
+        s.run()
+        self.assertTrue(time.time() - start < 0.2 * len(hosts) / 2)
+
+    def test_failure_stops_phases(self):
+        ran = []
+        def fail(x):
+            raise AssertionError("failed %s" % x)
+        s = Scheduler()
+        s.add("fail", fail, ['a'])
+        s.add("after", lambda: ran.append(True))
+        self.assertRaises(AssertionError, s.run)
+        self.assertEqual(ran, [])
+
+if __name__ == "__main__":
+     unittest.main()
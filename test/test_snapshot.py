@@ -0,0 +1,122 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import afsutil.snapshot
+from afsutil.snapshot import CellSnapshot, HostState
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cell.snapshot')
+        self.host_state = afsutil.snapshot.host_state
+        self.listvldb = afsutil.snapshot._listvldb
+        self.administrators = afsutil.snapshot._administrators
+
+    def tearDown(self):
+        afsutil.snapshot.host_state = self.host_state
+        afsutil.snapshot._listvldb = self.listvldb
+        afsutil.snapshot._administrators = self.administrators
+        shutil.rmtree(self.tmpdir)
+
+    def fake(self):
+        def host_state(hostname):
+            state = HostState(hostname)
+            state.statuses = {'dafs': 'running'}
+            state.cellname = 'example.com'
+            state.cellhosts = set(['afs01'])
+            state.users = ['admin']
+            return state
+        afsutil.snapshot.host_state = host_state
+        afsutil.snapshot._listvldb = lambda: {'root.cell': (('afs01', '/vicepa'), [('afs01', '/vicepa')])}
+        afsutil.snapshot._administrators = lambda: ['admin']
+
+    def test_gather_and_save(self):
+        self.fake()
+        snap = CellSnapshot('example.com', ['afs01', 'afs02']).gather()
+        self.assertEqual(snap.statuses('afs02'), {'dafs': 'running'})
+        self.assertTrue(snap.volume_exists('root.cell'))
+        self.assertFalse(snap.volume_exists('root.afs'))
+        snap.save(self.path)
+        loaded = CellSnapshot.load(self.path, cell='example.com', hostnames=['afs02', 'afs01'], max_age=60)
+        self.assertEqual(loaded.to_dict(), snap.to_dict())
+        self.assertEqual(loaded.volume_sites('root.cell'), (('afs01', '/vicepa'), [('afs01', '/vicepa')]))
+        self.assertEqual(loaded.host('afs01').cellhosts, set(['afs01']))
+
+    def test_stale_or_different(self):
+        self.fake()
+        snap = CellSnapshot('example.com', ['afs01']).gather(databases=False)
+        self.assertEqual(snap.vldb, None)
+        snap.timestamp = time.time() - 120
+        snap.save(self.path)
+        self.assertEqual(CellSnapshot.load(self.path, max_age=60), None)
+        self.assertEqual(CellSnapshot.load(self.path, cell='other.com'), None)
+        self.assertEqual(CellSnapshot.load(self.path, hostnames=['afs02']), None)
+        self.assertNotEqual(CellSnapshot.load(self.path), None)
+
+    def test_invalidate(self):
+        self.fake()
+        queried = []
+        fake_state = afsutil.snapshot.host_state
+        def host_state(hostname):
+            queried.append(hostname)
+            return fake_state(hostname)
+        afsutil.snapshot.host_state = host_state
+        snap = CellSnapshot('example.com', ['afs01', 'afs02']).gather(databases=False)
+        del queried[:]
+        snap.host('afs01')
+        self.assertEqual(queried, [])
+        snap.invalidate('afs01')
+        snap.host('afs01')
+        snap.host('afs01')
+        snap.statuses('afs03') # not in the snapshot
+        self.assertEqual(queried, ['afs01', 'afs03'])
+        snap.invalidate()
+        snap.host('afs02')
+        self.assertEqual(queried[2:], ['afs02'])
+
+    def test_gather_workers(self):
+        self.fake()
+        fake_state = afsutil.snapshot.host_state
+        lock = threading.Lock()
+        count = {'active': 0, 'peak': 0}
+        def host_state(hostname):
+            with lock:
+                count['active'] += 1
+                count['peak'] = max(count['peak'], count['active'])
+            time.sleep(0.05)
+            with lock:
+                count['active'] -= 1
+            return fake_state(hostname)
+        afsutil.snapshot.host_state = host_state
+        hostnames = ['afs%02d' % i for i in range(0, 8)]
+        snap = CellSnapshot('example.com', hostnames).gather(databases=False, workers=2)
+        self.assertEqual(len(snap.hosts), 8)
+        self.assertEqual(count['peak'], 2)
+
+if __name__ == "__main__":
+     unittest.main()
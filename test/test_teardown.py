@@ -0,0 +1,95 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import threading
+import time
+import unittest
+
+import afsutil.teardown
+from afsutil.teardown import Teardown, format_timings
+
+class FakeInstaller(object):
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def remove(self):
+        self.calls.append('remove')
+
+    def purge_paths(self):
+        self.calls.append('purge_paths')
+        return []
+
+class TeardownTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = dict((name, getattr(afsutil.teardown, name)) for name in
+                          ('installer', '_rc', 'get_running', 'is_afs_mounted', 'afs_umount', 'unload_module'))
+        self.calls = []
+        self.running = set(['bosserver', 'fileserver', 'afsd', 'python'])
+        self.mounted = [True]
+        self.stopping = []
+        lock = threading.Lock()
+        def _rc(component, action):
+            with lock:
+                self.stopping.append(component)
+            time.sleep(0.05)
+            with lock:
+                self.calls.append('%s %s' % (action, component))
+                if component == 'client':
+                    self.mounted[0] = False
+                    self.running.discard('afsd')
+                else:
+                    self.running.difference_update(['bosserver', 'fileserver'])
+        afsutil.teardown.installer = lambda dist, **kwargs: FakeInstaller(self.calls)
+        afsutil.teardown._rc = _rc
+        afsutil.teardown.get_running = lambda: set(self.running)
+        afsutil.teardown.is_afs_mounted = lambda: self.mounted[0]
+        afsutil.teardown.afs_umount = lambda: self.calls.append('umount')
+        afsutil.teardown.unload_module = lambda: self.calls.append('unload')
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(afsutil.teardown, name, value)
+
+    def test_run(self):
+        t = Teardown(components=['client', 'server'])
+        start = time.time()
+        timings = t.run()
+        self.assertLess(time.time() - start, 0.09) # The stops ran concurrently.
+        self.assertEqual([name for name, seconds in timings], ['stop', 'wait', 'unload', 'remove', 'purge'])
+        self.assertEqual(sorted(self.calls[:2]), ['stop client', 'stop server'])
+        self.assertEqual(self.calls[2:], ['unload', 'remove', 'purge_paths'])
+        self.assertIn('total', format_timings(timings))
+
+    def test_server_only(self):
+        t = Teardown(components=['server'], purge=False)
+        t.run()
+        self.assertEqual(self.calls, ['stop server', 'remove'])
+        self.assertIn('afsd', self.running)
+
+    def test_wait_timeout(self):
+        afsutil.teardown._rc = lambda component, action: None
+        t = Teardown(components=['server'], timeout=0.3)
+        self.assertRaises(AssertionError, t.run)
+        self.assertEqual([name for name, seconds in t.timings], ['stop', 'wait'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import unittest
+
+from afsutil.tuning import CacheTuning, FileserverTuning, parse_afsd_options, GB, MB
+
+class FakeStatvfs(object):
+    def __init__(self, total, free, frsize=4096):
+        self.f_frsize = frsize
+        self.f_blocks = total * 1024 // frsize
+        self.f_bavail = free * 1024 // frsize
+
+class TuningTest(unittest.TestCase):
+
+    def tune(self, profile='auto', memory=2*GB, ncpus=2, total=20*GB, free=10*GB,
+             dedicated=False, afsd=''):
+        return CacheTuning(profile=profile, cachedir='/usr/vice/cache',
+                           afsd_options=afsd, memory=memory, ncpus=ncpus,
+                           statvfs=FakeStatvfs(total, free), dedicated=dedicated)
+
+    def test_parse_afsd_options(self):
+        o = parse_afsd_options("-dynroot -fakestat -stat 2000 -afsdb")
+        self.assertEqual(o['-stat'], '2000')
+        self.assertTrue(o['-dynroot'])
+        self.assertTrue(o['-afsdb'])
+
+    def test_auto_small(self):
+        t = self.tune()
+        self.assertEqual(t.profile, 'small')
+        self.assertFalse(t.memcache)
+        self.assertEqual(t.size, 1 * GB)
+        self.assertTrue(len(t.reasons) > 0)
+
+    def test_auto_large(self):
+        t = self.tune(memory=16*GB, ncpus=8, total=100*GB, free=100*GB, dedicated=True)
+        self.assertEqual(t.profile, 'large')
+        self.assertEqual(t.size, 64 * GB)
+        self.assertEqual(t.chunksize, 20)
+        self.assertEqual(t.daemons, 6)
+
+    def test_auto_hpc(self):
+        t = self.tune(memory=128*GB, ncpus=32)
+        self.assertEqual(t.profile, 'hpc')
+        self.assertTrue(t.memcache)
+        self.assertEqual(t.size, 32 * GB)
+        self.assertIsNone(t.dcache)
+        self.assertIn(('-memcache', None), t.options())
+
+    def test_shared_partition(self):
+        t = self.tune(profile='large', memory=8*GB, total=40*GB, free=8*GB)
+        self.assertEqual(t.size, 6 * GB)
+
+    def test_small_partition(self):
+        t = self.tune(profile='large', free=100*MB)
+        self.assertEqual(t.size, 75 * MB)
+        self.assertTrue(t.size // ((1 << t.chunksize) // 1024) >= 1000)
+
+    def test_explicit_memcache(self):
+        t = self.tune(memory=4*GB, afsd='-memcache')
+        self.assertTrue(t.memcache)
+        self.assertEqual(t.size, 1 * GB)
+
+    def test_merge(self):
+        t = self.tune(profile='small')
+        merged = t.merge("-dynroot -fakestat -stat 500").split()
+        self.assertEqual(merged[:4], ['-dynroot', '-fakestat', '-stat', '500'])
+        self.assertEqual(merged.count('-stat'), 1)
+        self.assertIn('-chunksize', merged)
+        self.assertIn('-daemons', merged)
+
+    def test_unknown_profile(self):
+        self.assertRaises(ValueError, self.tune, profile='bogus')
+
+    def test_fileserver_profile(self):
+        t = FileserverTuning('large', hostname='fs1.example.com')
+        flags = t.merge('').split()
+        self.assertIn('-L', flags)
+        self.assertEqual(flags[flags.index('-p') + 1], '128')
+
+    def test_fileserver_explicit(self):
+        t = FileserverTuning('huge', hostname='fs1.example.com')
+        flags = t.merge('-d 1 -p 64 -S').split()
+        self.assertEqual(flags[:5], ['-d', '1', '-p', '64', '-S'])
+        self.assertEqual(flags.count('-p'), 1)
+        self.assertNotIn('-L', flags)
+        self.assertIn('-cb', flags)
+
+    def test_fileserver_auto(self):
+        t = FileserverTuning('auto', hostname='fs1.example.com', memory=64*GB, ncpus=32, partitions=4)
+        self.assertEqual(t.profile, 'huge')
+        t = FileserverTuning('auto', hostname='fs1.example.com', memory=16*GB, ncpus=8, partitions=2)
+        self.assertEqual(t.profile, 'large')
+        t = FileserverTuning('auto', hostname='fs1.example.com', memory=2*GB, ncpus=2, partitions=1)
+        self.assertEqual(t.profile, 'small')
+
+    def test_fileserver_auto_partitions(self):
+        t = FileserverTuning('auto', hostname='fs1.example.com', memory=2*GB, ncpus=2, partitions=12)
+        self.assertEqual(t.profile, 'small')
+        t = FileserverTuning('auto', hostname='fs1.example.com', memory=8*GB, ncpus=4, partitions=8)
+        self.assertEqual(t.profile, 'large')
+        t = FileserverTuning('auto', hostname='fs1.example.com', memory=16*GB, ncpus=8, partitions=8)
+        self.assertEqual(t.profile, 'huge')
+
+    def test_fileserver_auto_remote(self):
+        t = FileserverTuning('auto', hostname='fs1.example.invalid')
+        self.assertEqual(t.profile, 'small')
+
+if __name__ == "__main__":
+     unittest.main()
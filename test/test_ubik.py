@@ -0,0 +1,109 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import threading
+import time
+import unittest
+
+import afsutil.ubik
+from afsutil.parallel import parallel
+from afsutil.ubik import UbikStatus, WriteGate, parse_udebug
+
+SYNC = """\
+Host's addresses are: 10.0.0.1
+Host's 10.0.0.1 time is Mon Oct 12 10:00:00 2026
+Local time is Mon Oct 12 10:00:00 2026 (time differential 0 secs)
+Last yes vote for 10.0.0.1 was 3 secs ago (sync site);
+Last vote started 3 secs ago (at Mon Oct 12 10:00:00 2026)
+Local db version is 1602496800.12
+I am sync site until 57 secs from now (at Mon Oct 12 10:01:00 2026) (3 servers)
+Recovery state 1f
+Sync site's db version is 1602496800.12
+"""
+
+NOT_SYNC = """\
+Host's addresses are: 10.0.0.2
+Local db version is 1602496800.12
+I am not sync site
+Lowest host 10.0.0.1 at Mon Oct 12 10:00:00 2026
+Sync host 10.0.0.1 at Mon Oct 12 10:00:00 2026
+Sync site's db version is 1602496800.12
+"""
+
+class UbikTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sync_site = afsutil.ubik.sync_site
+
+    def tearDown(self):
+        afsutil.ubik.sync_site = self.sync_site
+
+    def test_parse(self):
+        s = parse_udebug(SYNC, UbikStatus('afs01', 'ptserver'))
+        self.assertTrue(s.is_sync)
+        self.assertTrue(s.recovered)
+        s = parse_udebug(NOT_SYNC, UbikStatus('afs02', 'ptserver'))
+        self.assertFalse(s.is_sync)
+        self.assertFalse(s.recovered)
+        self.assertEqual(s.sync_host, '10.0.0.1')
+
+    def test_gate_waits_for_stable_site(self):
+        answers = [None, 'afs02', 'afs01', 'afs01', 'afs03']
+        afsutil.ubik.sync_site = lambda hostnames, dbname: answers.pop(0)
+        gate = WriteGate(['afs01', 'afs02', 'afs03'], checks=2, timeout=10, interval=0.01)
+        self.assertEqual(gate.wait('ptserver'), 'afs01')
+        # The stable site is trusted without another check.
+        self.assertEqual(gate.wait('ptserver'), 'afs01')
+        self.assertEqual(answers, ['afs03'])
+        gate.invalidate('ptserver')
+        self.assertEqual(gate.sync_site('ptserver'), None)
+
+    def test_gate_single_check(self):
+        lock = threading.Lock()
+        calls = []
+        def sync_site(hostnames, dbname):
+            with lock:
+                calls.append(dbname)
+            time.sleep(0.02)
+            return 'afs01'
+        afsutil.ubik.sync_site = sync_site
+        gate = WriteGate(['afs01', 'afs02'], checks=2, timeout=10, interval=0.01)
+        results = parallel(lambda n: gate.wait('vlserver'), range(0, 8), workers=8)
+        self.assertEqual([r.value for r in results], ['afs01'] * 8)
+        self.assertEqual(len(calls), 2)
+
+    def test_gate_failed_check(self):
+        calls = []
+        def sync_site(hostnames, dbname):
+            calls.append(dbname)
+            time.sleep(0.02)
+            return None
+        afsutil.ubik.sync_site = sync_site
+        gate = WriteGate(['afs01', 'afs02'], checks=2, timeout=0.1, interval=0.01)
+        results = parallel(lambda n: gate.wait('vlserver'), range(0, 4), workers=4, raise_errors=False)
+        self.assertEqual([r.ok for r in results], [False] * 4)
+        # The waiting threads fail with the checking thread.
+        count = len(calls)
+        self.assertTrue(count <= 10)
+        self.assertRaises(AssertionError, gate.wait, 'vlserver')
+        self.assertTrue(len(calls) > count)
+
+if __name__ == "__main__":
+     unittest.main()
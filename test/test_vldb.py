@@ -0,0 +1,131 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import unittest
+
+import afsutil.resolver
+import afsutil.vldb
+from afsutil.vldb import VLDB, parse_vldb
+
+LISTVLDB = """\
+VLDB entries for all servers
+
+root.afs
+    RWrite: 536870912     ROnly: 536870913
+    number of sites -> 2
+       server afs01 partition /vicepa RW Site
+       server afs01 partition /vicepa RO Site
+
+root.cell
+    RWrite: 536870915     ROnly: 536870916     Backup: 536870917
+    number of sites -> 3
+       server afs01 partition /vicepa RW Site
+       server afs01 partition /vicepa RO Site
+       server afs02 partition /vicepb RO Site
+    Volume is currently LOCKED
+
+proj.a
+    RWrite: 536870918
+    number of sites -> 1
+       server afs02 partition /vicepa RW Site
+
+Total entries: 3
+"""
+
+AFS02 = """\
+proj.a
+    RWrite: 536870918
+    number of sites -> 1
+       server afs02 partition /vicepa RW Site
+
+proj.b
+    RWrite: 536870921
+    number of sites -> 1
+       server afs02 partition /vicepb RW Site
+"""
+
+class VldbTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = afsutil.vldb.stream
+
+    def tearDown(self):
+        afsutil.vldb.stream = self.stream
+
+    def fake(self, output):
+        afsutil.vldb.stream = lambda cmd, *args, **kwargs: iter(output.splitlines())
+
+    def test_parse(self):
+        entries = list(parse_vldb(LISTVLDB.splitlines()))
+        self.assertEqual([e.name for e in entries], ['root.afs', 'root.cell', 'proj.a'])
+        cell = entries[1]
+        self.assertEqual((cell.rw, cell.ro, cell.bk), (536870915, 536870916, 536870917))
+        self.assertEqual(cell.rw_site, ('afs01', '/vicepa'))
+        self.assertEqual(cell.ro_sites, [('afs01', '/vicepa'), ('afs02', '/vicepb')])
+        self.assertTrue(cell.locked)
+        self.assertFalse(entries[0].locked)
+
+    def test_lookup(self):
+        self.fake(LISTVLDB)
+        vldb = VLDB().load()
+        self.assertEqual(len(vldb), 3)
+        self.assertTrue(vldb.exists('root.cell'))
+        self.assertTrue(vldb.exists('root.cell.readonly'))
+        self.assertEqual(vldb.lookup(536870913).name, 'root.afs')
+        self.assertEqual(vldb.lookup('536870917').name, 'root.cell')
+        self.assertFalse(vldb.exists('proj.b'))
+        self.assertEqual(vldb.sites('proj.a'), (('afs02', '/vicepa'), []))
+
+    def test_incremental_load(self):
+        self.fake(LISTVLDB)
+        vldb = VLDB().load()
+        vldb.created('proj.c', 'afs02', '/vicepa') # since removed
+        self.fake(AFS02) # root.cell no longer has a site on afs02
+        vldb.load(server='afs02')
+        self.assertEqual(sorted(e.name for e in vldb), ['proj.a', 'proj.b', 'root.afs'])
+
+    def test_incremental_load_other_name(self):
+        # The server is given by its configured name, while vos lists the
+        # short names.
+        resolver = afsutil.resolver.resolver
+        saved = resolver.hosts
+        resolver.hosts = {'afs02': ['10.0.0.2'], 'afs02.example.com': ['10.0.0.2'],
+                          'afs01': ['10.0.0.1']}
+        resolver.clear()
+        try:
+            self.fake(LISTVLDB)
+            vldb = VLDB().load()
+            self.fake(AFS02)
+            vldb.load(server='afs02.example.com')
+        finally:
+            resolver.hosts = saved
+            resolver.clear()
+        self.assertEqual(sorted(e.name for e in vldb), ['proj.a', 'proj.b', 'root.afs'])
+
+    def test_updates(self):
+        vldb = VLDB()
+        vldb.created('proj.a', 'afs01', '/vicepa')
+        vldb.added_site('proj.a', 'afs02', '/vicepa')
+        self.assertEqual(vldb.sites('proj.a'), (('afs01', '/vicepa'), [('afs02', '/vicepa')]))
+        vldb.remove('proj.a')
+        self.assertFalse(vldb.exists('proj.a'))
+
+if __name__ == "__main__":
+     unittest.main()
@@ -0,0 +1,136 @@
+# Copyright (c) 2019 Sine Nomine Associates
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import threading
+import time
+import unittest
+
+import afsutil.parallel
+import afsutil.resolver
+import afsutil.volumes
+from afsutil.volumes import ServerLimiter, BulkVolumes, volume_sites, replicate
+from afsutil.placement import Placement, Partition
+
+LISTVLDB = """
+root.cell
+    RWrite: 536870915     ROnly: 536870916
+    number of sites -> 3
+       server fs1.example.com partition /vicepa RW Site
+       server fs1.example.com partition /vicepa RO Site
+       server fs2.example.com partition /vicepb RO Site
+"""
+
+class VolumesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vos = afsutil.volumes.vos
+
+    def tearDown(self):
+        afsutil.volumes.vos = self.vos
+
+    def test_volume_sites(self):
+        afsutil.volumes.vos = lambda *args, **kwargs: LISTVLDB
+        rw, ro = volume_sites('root.cell')
+        self.assertEqual(rw, ('fs1.example.com', '/vicepa'))
+        self.assertEqual(ro, [('fs1.example.com', '/vicepa'), ('fs2.example.com', '/vicepb')])
+
+    def test_replicate(self):
+        calls = []
+        def vos(*args, **kwargs):
+            calls.append(args[0:1] + tuple(a for a in args[1:] if not a.startswith('-')))
+            return LISTVLDB if args[0] == 'listvldb' else ''
+        afsutil.volumes.vos = vos
+        placement = Placement(['fs1.example.com', 'fs2.example.com', 'fs3.example.com'])
+        placement.partitions = [Partition(s, '/vicepa', free=1000) for s in placement.servers]
+        self.assertTrue(replicate('root.cell', replicas=3, placement=placement))
+        self.assertEqual(calls[1:], [('addsite', 'fs3.example.com', '/vicepa', 'root.cell'),
+                                     ('release', 'root.cell')])
+        del calls[:]
+        self.assertFalse(replicate('root.cell', replicas=2, placement=placement))
+        self.assertEqual(len(calls), 1)
+
+    def test_replicate_resolved_names(self):
+        # vos lists the resolved name of the rw server, which differs from
+        # the configured name in the placement.
+        calls = []
+        def vos(*args, **kwargs):
+            calls.append(args[0:1] + tuple(a for a in args[1:] if not a.startswith('-')))
+            if args[0] == 'listvldb':
+                return "\n".join(LISTVLDB.splitlines()[0:5])
+            return ''
+        afsutil.volumes.vos = vos
+        resolver = afsutil.resolver.resolver
+        saved = resolver.hosts
+        resolver.hosts = {'fs1': ['10.0.0.1'], 'fs1.example.com': ['10.0.0.1'],
+                          'fs2': ['10.0.0.2']}
+        resolver.clear()
+        try:
+            placement = Placement(['fs1', 'fs2'])
+            placement.partitions = [Partition('fs1', '/vicepa', free=9000),
+                                    Partition('fs2', '/vicepa', free=1000)]
+            self.assertTrue(replicate('root.cell', replicas=2, placement=placement))
+        finally:
+            resolver.hosts = saved
+            resolver.clear()
+        self.assertEqual(calls[1:], [('addsite', 'fs1.example.com', '/vicepa', 'root.cell'),
+                                     ('addsite', 'fs2', '/vicepa', 'root.cell'),
+                                     ('release', 'root.cell')])
+
+    def test_retry_with_gate(self):
+        class Gate(object):
+            def __init__(self):
+                self.waits = 0
+            def wait(self, dbname):
+                self.waits += 1
+            def cleanup(self, dbname, *functions):
+                return lambda: None
+        gate = Gate()
+        kwargs = afsutil.volumes._retry('root.cell', gate, 60, 10)
+        self.assertEqual((kwargs['retry'], kwargs['wait']), (60, 10))
+        self.assertEqual(gate.waits, 1)
+
+    def test_limiter(self):
+        limiter = ServerLimiter(2)
+        lock = threading.Lock()
+        active = {'fs1': 0}
+        peak = {'fs1': 0}
+        def task(n):
+            with limiter('fs1'):
+                with lock:
+                    active['fs1'] += 1
+                    peak['fs1'] = max(peak['fs1'], active['fs1'])
+                time.sleep(0.05)
+                with lock:
+                    active['fs1'] -= 1
+        afsutil.parallel.parallel(task, range(0, 8), workers=8)
+        self.assertEqual(peak['fs1'], 2)
+
+    def test_bulk_continues_past_failures(self):
+        bulk = BulkVolumes(workers=4, per_server=1)
+        def setup(volume):
+            if volume[0] == 'bad':
+                raise AssertionError("failed")
+            return volume[0]
+        bulk.setup = setup
+        results = bulk.run([('a', 'fs1', 'a'), ('bad', 'fs1', 'a'), ('c', 'fs2', 'a')])
+        self.assertEqual([r.ok for r in results], [True, False, True])
+
+if __name__ == "__main__":
+     unittest.main()